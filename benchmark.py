@@ -0,0 +1,334 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import platform
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import migrate_ccm
+import json_codec
+import sql_rewriter
+
+# Benchmark settings
+default_sizes = [1000, 10000, 100000, 1000000]
+data_folder = 'bench_data'                  # generated corpora, one sub-folder per size
+results_file = 'benchmark_results.json'
+latency_sample = 10000                      # records timed individually for transform latency
+
+# Shapes drawn on by the synthetic corpus generator
+ENTITIES = ["Host", "Identity", "Vulnerability", "Cloud_Account", "Application", "Person", "Network_Interface"]
+EXCLUDED_FRAMEWORKS = ["nist_csf_v1", "scf_2023_2"]
+FRAMEWORKS = EXCLUDED_FRAMEWORKS + ["scf_2023_4"] + [
+    f"{name}_v{version}"
+    for name in ["iso_27001", "pci_dss", "hipaa", "soc2", "nist_800_53", "cis_controls", "gdpr", "fedramp", "cmmc", "nydfs"]
+    for version in range(1, 6)
+]
+FIELDS = ["os_family", "edr_status", "last_seen", "patch_level", "mfa_enabled", "owner", "criticality",
+          "internet_exposed", "encryption_status", "account_status", "cloud_provider", "region"]
+
+def synthetic_cei(index, rng):
+    """Build one Old CEI with realistic shapes: CASE WHEN conditions, multi-entity scopes,
+    large ui_config.mapping lists and many frameworks"""
+    cei_code = f"CEI-{index}"
+    entity_count = 1 if rng.random() < 0.6 else rng.randint(2, 3)
+    entities = rng.sample(ENTITIES, entity_count)
+    
+    conditions = [f"{field} = '{rng.choice(['Active', 'Yes', 'windows', 'High'])}'" for field in rng.sample(FIELDS, rng.randint(1, 4))]
+    condition = " AND ".join(conditions)
+    if rng.random() < 0.8:
+        cei_condition = f"CASE WHEN {condition} THEN true ELSE false END"
+    else:
+        cei_condition = condition
+    
+    columns = ", ".join(rng.sample(FIELDS, rng.randint(3, 8)))
+    sql_query = (
+        f"SELECT p_id, {columns}\n"
+        "FROM <%EI_PUBLISH_SCHEMA_NAME%>.sds_ei__publish_transformer__entity_inventory\n"
+        f"WHERE class IN ({', '.join(repr(entity) for entity in entities)})"
+    )
+    
+    mapping = [{"data_field": "cei_status", "data_label": "Status"}]
+    for field_index in range(rng.randint(5, 150)):
+        field = rng.choice(FIELDS)
+        mapping.append({"data_field": f"{field}_{field_index}", "data_label": f"{field.replace('_', ' ').title()} {field_index}"})
+    
+    framework_mapping = {}
+    for framework in rng.sample(FRAMEWORKS, rng.randint(5, 30)):
+        framework_mapping[framework] = [f"{framework[:3]}-{rng.randint(1, 30)}.{rng.randint(1, 20)}" for _ in range(rng.randint(1, 12))]
+    
+    return {
+        "cei_code": cei_code,
+        "cei_title": f"Synthetic control effectiveness indicator {index}",
+        "cei_description": f"Checks {condition} across {', '.join(entities)}",
+        "is_active": rng.random() < 0.9,
+        "entity": entities,
+        "sql_query": sql_query,
+        "cei_condition": cei_condition,
+        "cei_measure": "percentage",
+        "cei_type": "Control",
+        "scope_source": "entity_inventory",
+        "status_source": "entity_inventory",
+        "internal_control_category": rng.choice(["Endpoint", "Identity", "Cloud", "Vulnerability"]),
+        "ui_config": {"mapping": mapping},
+        "framework_mapping": framework_mapping
+    }
+
+def generate_corpus(folder, count, seed=0):
+    """Write count synthetic Old CEIs plus matching cei_titles.csv and detected_frameworks.csv
+    
+    Corpora are reused when folder already holds one generated with the same count and seed.
+    """
+    marker_file = os.path.join(folder, 'corpus.json')
+    marker = {"count": count, "seed": seed}
+    if os.path.exists(marker_file):
+        with open(marker_file, 'r', encoding='utf-8') as f:
+            if json.load(f) == marker:
+                return
+    
+    input_folder = os.path.join(folder, 'Old CEIs')
+    os.makedirs(input_folder, exist_ok=True)
+    rng = random.Random(seed)
+    detected_frameworks = set()
+    with open(os.path.join(folder, 'cei_titles.csv'), 'w', newline='', encoding='utf-8') as titles_f:
+        writer = csv.DictWriter(titles_f, fieldnames=["cei_id", "assessment_id", "title", "finding_title"])
+        writer.writeheader()
+        for index in range(count):
+            cei = synthetic_cei(index, rng)
+            detected_frameworks.update(cei["framework_mapping"])
+            with open(os.path.join(input_folder, f"{cei['cei_code']}.json"), 'w', encoding='utf-8') as f:
+                json.dump(cei, f, indent=2)
+            writer.writerow({
+                "cei_id": cei["cei_code"],
+                "assessment_id": f"TP-BM-{index:07d}",
+                "title": cei["cei_title"],
+                "finding_title": f"Finding for {cei['cei_code']}"
+            })
+    
+    with open(os.path.join(folder, 'detected_frameworks.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=["framework", "normalized_framework"])
+        writer.writeheader()
+        for framework in sorted(detected_frameworks):
+            normalized = "" if framework in EXCLUDED_FRAMEWORKS else framework.upper()
+            writer.writerow({"framework": framework, "normalized_framework": normalized})
+    
+    with open(marker_file, 'w', encoding='utf-8') as f:
+        json.dump(marker, f)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def bench_csv_loaders(folder):
+    """Time a cold parse and a cached reload of both mapping CSVs"""
+    titles_path = os.path.join(folder, 'cei_titles.csv')
+    frameworks_path = os.path.join(folder, 'detected_frameworks.csv')
+    migrate_ccm._csv_cache.clear()
+    
+    start = time.perf_counter()
+    migrate_ccm.MappingContext.load(titles_path, frameworks_path)
+    cold_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    migrate_ccm.MappingContext.load(titles_path, frameworks_path)
+    warm_seconds = time.perf_counter() - start
+    
+    return {"cold_seconds": cold_seconds, "cached_seconds": warm_seconds}
+
+def bench_transform(folder, sample_size):
+    """Time transform_json record by record over a sample of the corpus
+    
+    The sample is one pass on empty condition and scope query caches, as in a real migration;
+    a fresh plan brings its own empty rewriter cache.
+    """
+    context = migrate_ccm.MappingContext.load(
+        os.path.join(folder, 'cei_titles.csv'), os.path.join(folder, 'detected_frameworks.csv'))
+    plan = migrate_ccm.MigrationPlan(migrate_ccm.load_migration_plan().rules)
+    sql_rewriter.extract_case_condition.cache_clear()
+    input_folder = os.path.join(folder, 'Old CEIs')
+    filenames = sorted(filename for filename in os.listdir(input_folder) if filename.endswith(".json"))[:sample_size]
+    
+    latencies = []
+    for filename in filenames:
+        with open(os.path.join(input_folder, filename), 'r', encoding='utf-8') as f:
+            original_data = json.load(f)
+        start = time.perf_counter_ns()
+        migrate_ccm.transform_json(original_data, context=context, plan=plan)
+        latencies.append(time.perf_counter_ns() - start)
+    
+    latencies.sort()
+    return {
+        "records": len(latencies),
+        "mean_us": sum(latencies) / len(latencies) / 1000 if latencies else 0,
+        "p50_us": percentile(latencies, 0.50) / 1000,
+        "p95_us": percentile(latencies, 0.95) / 1000,
+        "p99_us": percentile(latencies, 0.99) / 1000,
+        "max_us": latencies[-1] / 1000 if latencies else 0
+    }
+
+def bench_codecs(folder, sample_size):
+    """Time parsing and pretty/compact serialization with every installed JSON codec
+    
+    Each codec runs over the same sample of raw files and transformed records, and its
+    output is checked against the stdlib codec's bytes.
+    """
+    context = migrate_ccm.MappingContext.load(
+        os.path.join(folder, 'cei_titles.csv'), os.path.join(folder, 'detected_frameworks.csv'))
+    input_folder = os.path.join(folder, 'Old CEIs')
+    filenames = sorted(filename for filename in os.listdir(input_folder) if filename.endswith(".json"))[:sample_size]
+    raw_files = []
+    for filename in filenames:
+        with open(os.path.join(input_folder, filename), 'rb') as f:
+            raw_files.append(f.read())
+    stdlib = json_codec.get_codec('stdlib')
+    records = [migrate_ccm.transform_json(stdlib.loads(raw), context=context) for raw in raw_files]
+    expected = [stdlib.dumps(record) for record in records]
+    
+    results = {}
+    for name in json_codec.CODECS:
+        codec = json_codec.get_codec(name)
+        start = time.perf_counter()
+        for raw in raw_files:
+            codec.loads(raw)
+        parse_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        pretty = [codec.dumps(record) for record in records]
+        pretty_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        compact = [codec.dumps(record, compact=True) for record in records]
+        compact_seconds = time.perf_counter() - start
+        
+        results[name] = {
+            "records": len(records),
+            "parse_seconds": parse_seconds,
+            "pretty_seconds": pretty_seconds,
+            "compact_seconds": compact_seconds,
+            "pretty_bytes": sum(len(output) for output in pretty),
+            "compact_bytes": sum(len(output) for output in compact),
+            "identical_to_stdlib": pretty == expected
+        }
+    return results
+
+def _peak_rss_bytes(who):
+    """Peak resident set size of this process or its children, in bytes"""
+    import resource
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _run_migration(folder, workers):
+    """Run a full migrate_ceis on a corpus; meant to run in a fresh process so peak memory is its own"""
+    os.chdir(folder)
+    migrate_ccm.input_folder = 'Old CEIs'
+    migrate_ccm.output_folder = 'New CEIs'
+    os.makedirs(migrate_ccm.output_folder, exist_ok=True)
+    
+    # Per-file lines would measure terminal speed, not the migration
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        migrate_ccm.migrate_ceis(workers=workers, incremental=False)
+        elapsed = time.perf_counter() - start
+    
+    import resource
+    return {
+        "seconds": elapsed,
+        "peak_rss_bytes": _peak_rss_bytes(resource.RUSAGE_SELF),
+        "peak_worker_rss_bytes": _peak_rss_bytes(resource.RUSAGE_CHILDREN)
+    }
+
+def bench_migrate(folder, count, workers):
+    """Measure end-to-end migrate_ceis throughput and peak memory in a fresh process"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        result = executor.submit(_run_migration, os.path.abspath(folder), workers).result()
+    result["records_per_second"] = count / result["seconds"] if result["seconds"] else 0
+    return result
+
+def run_benchmarks(sizes, workers=1, sample_size=None, label=None):
+    """Generate corpora for each size and benchmark the CSV loaders, transform_json, JSON codecs and migrate_ceis"""
+    sample_size = sample_size or latency_sample
+    results = {
+        "label": label,
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "workers": workers,
+        "sizes": {}
+    }
+    for count in sizes:
+        folder = os.path.join(data_folder, str(count))
+        print(f"\n[{count} records] generating corpus in '{folder}'...")
+        start = time.perf_counter()
+        generate_corpus(folder, count)
+        print(f"  corpus ready in {time.perf_counter() - start:.1f}s")
+        
+        size_results = {
+            "csv_loaders": bench_csv_loaders(folder),
+            "transform": bench_transform(folder, sample_size),
+            "codecs": bench_codecs(folder, sample_size),
+            "migrate": bench_migrate(folder, count, workers)
+        }
+        results["sizes"][str(count)] = size_results
+        
+        transform = size_results["transform"]
+        migrate = size_results["migrate"]
+        print(f"  CSV load: {size_results['csv_loaders']['cold_seconds'] * 1000:.1f} ms cold, "
+              f"{size_results['csv_loaders']['cached_seconds'] * 1000:.3f} ms cached")
+        print(f"  transform_json: mean {transform['mean_us']:.1f} us, p50 {transform['p50_us']:.1f} us, "
+              f"p99 {transform['p99_us']:.1f} us over {transform['records']} record(s)")
+        for name, codec in size_results["codecs"].items():
+            print(f"  codec {name}: parse {codec['parse_seconds'] * 1000:.1f} ms, "
+                  f"pretty {codec['pretty_seconds'] * 1000:.1f} ms, compact {codec['compact_seconds'] * 1000:.1f} ms "
+                  f"({codec['compact_bytes'] / codec['pretty_bytes'] * 100 if codec['pretty_bytes'] else 0:.0f}% of pretty size)"
+                  f"{'' if codec['identical_to_stdlib'] else ', OUTPUT DIFFERS FROM STDLIB'}")
+        print(f"  migrate_ceis: {migrate['seconds']:.2f}s, {migrate['records_per_second']:.0f} records/s, "
+              f"peak RSS {migrate['peak_rss_bytes'] / 2**20:.1f} MiB")
+    return results
+
+def compare_results(previous, current):
+    """Print the change in key metrics against an earlier results file"""
+    print(f"\nCompared with {previous.get('label') or previous.get('timestamp')}:")
+    for size, size_results in current["sizes"].items():
+        before = previous.get("sizes", {}).get(size)
+        if not before:
+            continue
+        for name, new_value, old_value in [
+            ("transform p50 us", size_results["transform"]["p50_us"], before["transform"]["p50_us"]),
+            ("migrate records/s", size_results["migrate"]["records_per_second"], before["migrate"]["records_per_second"]),
+            ("peak RSS MiB", size_results["migrate"]["peak_rss_bytes"] / 2**20, before["migrate"]["peak_rss_bytes"] / 2**20),
+        ]:
+            change = (new_value - old_value) / old_value * 100 if old_value else 0
+            print(f"  [{size}] {name}: {old_value:.1f} -> {new_value:.1f} ({change:+.1f}%)")
+
+def main(argv=None):
+    """Run the benchmark suite from the command line"""
+    parser = argparse.ArgumentParser(description="Benchmark the CEI migration on synthetic corpora")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in default_sizes),
+                        help="comma-separated corpus sizes (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for migrate_ceis")
+    parser.add_argument("--sample", type=int, default=latency_sample, help="records timed for transform latency")
+    parser.add_argument("--label", help="label stored with the results, e.g. a version number")
+    parser.add_argument("--output", default=results_file, help="results file (default: %(default)s)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+    
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results = run_benchmarks(sizes, args.workers, args.sample, args.label)
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to '{args.output}'")
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare_results(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
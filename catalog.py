@@ -0,0 +1,328 @@
+import os
+import json
+import sqlite3
+
+# Bumped whenever the schema changes; an older catalog is rebuilt from scratch
+SCHEMA_VERSION = 1
+
+# Control postings buffered before they are inserted together
+POSTINGS_BUFFER = 500000
+
+# Each (framework, control) pair is stored once and referenced by integer id. An assessment row
+# keeps its scope entities and control ids in order; the postings tables are the inverted index
+# from a control or entity to the assessments that have it, one key per pair and nothing else.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS assessments (
+    rowid INTEGER PRIMARY KEY,
+    source TEXT NOT NULL UNIQUE,
+    output TEXT NOT NULL,
+    id TEXT,
+    title TEXT,
+    finding_primary_key TEXT,
+    scope_entity TEXT NOT NULL,
+    controls TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assessments_by_id ON assessments (id);
+CREATE TABLE IF NOT EXISTS controls (id INTEGER PRIMARY KEY, framework TEXT NOT NULL, control TEXT NOT NULL,
+                                     UNIQUE (framework, control));
+CREATE INDEX IF NOT EXISTS controls_by_control ON controls (control);
+CREATE TABLE IF NOT EXISTS control_postings (control INTEGER NOT NULL, assessment INTEGER NOT NULL,
+                                             PRIMARY KEY (control, assessment)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entity_postings (entity TEXT NOT NULL COLLATE NOCASE, assessment INTEGER NOT NULL,
+                                            PRIMARY KEY (entity, assessment)) WITHOUT ROWID;
+"""
+
+def catalog_entry(transformed_data):
+    """The catalogued fields of a transformed CEI
+    
+    Returns a dict with the id, title, finding_primary_key, scope entities and a list of
+    (framework, control IDs) pairs. Fields that migration rules left out or gave an unexpected
+    type are skipped.
+    """
+    scope_entity = transformed_data.get("scope_entity")
+    control_mapping = transformed_data.get("control_mapping")
+    controls = []
+    if isinstance(control_mapping, dict):
+        for framework, values in control_mapping.items():
+            controls.append((framework, [control for control in (values if isinstance(values, list) else [values])
+                                         if isinstance(control, str)]))
+    return {
+        "id": transformed_data.get("id"),
+        "title": transformed_data.get("title"),
+        "finding_primary_key": transformed_data.get("finding_primary_key"),
+        "scope_entity": [entity for entity in scope_entity if isinstance(entity, str)] if isinstance(scope_entity, list) else [],
+        "controls": controls
+    }
+
+def _control_ids(text):
+    """Control ids stored in an assessment row"""
+    return [int(control_id) for control_id in text.split(",")] if text else []
+
+class MigrationCatalog:
+    """SQLite catalog of migrated CEIs, indexed by framework, control and scope entity
+    
+    One row per source file holds the output filename, id, title, finding_primary_key, scope
+    entities and control mappings of the CEI it produced, and inverted indexes map each
+    control and entity to those rows, so lookups never read the output folder. Control
+    postings are buffered and inserted in sorted chunks; nothing is visible to other
+    connections before commit().
+    
+    Args:
+        path: SQLite file; created when missing.
+        output_folder: Output folder the catalog describes. A catalog of another folder, or
+            with an older schema, is emptied.
+    """
+    
+    def __init__(self, path, output_folder=None):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        meta = {}
+        if self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'meta'").fetchone():
+            meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        if meta and meta.get("schema_version") != str(SCHEMA_VERSION):
+            self._drop_tables()
+            meta = {}
+        self.connection.executescript(SCHEMA)
+        # framework -> control -> id, filled as controls are looked up
+        self._control_ids = {}
+        # Assessment rowid -> control ids whose postings are not inserted yet
+        self._pending_postings = {}
+        self._pending_count = 0
+        
+        expected = {"schema_version": str(SCHEMA_VERSION)}
+        if output_folder is not None:
+            expected["output_folder"] = output_folder
+        if any(meta.get(key) != value for key, value in expected.items()):
+            self.clear()
+            self.connection.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", expected.items())
+            self.connection.commit()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _drop_tables(self):
+        """Drop every table, e.g. of a catalog with an older schema"""
+        tables = [name for (name,) in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+    
+    def clear(self):
+        """Remove every catalogued CEI"""
+        for table in ("assessments", "controls", "control_postings", "entity_postings"):
+            self.connection.execute(f"DELETE FROM {table}")
+        self._control_ids = {}
+        self._pending_postings = {}
+        self._pending_count = 0
+    
+    def _control_id(self, framework, control):
+        """Id of a (framework, control) pair not looked up before, adding it if it is new"""
+        key = (framework, control)
+        self.connection.execute("INSERT OR IGNORE INTO controls (framework, control) VALUES (?, ?)", key)
+        control_id = self.connection.execute("SELECT id FROM controls WHERE framework = ? AND control = ?", key).fetchone()[0]
+        self._control_ids.setdefault(framework, {})[control] = control_id
+        return control_id
+    
+    def add(self, source, output, entry):
+        """Catalog the CEI produced from source, replacing what it produced before
+        
+        Only what changed is written: an identical entry costs one lookup, and a changed one
+        updates its row and the postings it gained or lost.
+        """
+        control_ids = []
+        for framework, controls in entry["controls"]:
+            known_ids = self._control_ids.get(framework, {})
+            try:
+                control_ids.extend(list(map(known_ids.__getitem__, controls)))
+            except KeyError:
+                control_ids.extend([known_ids.get(control) or self._control_id(framework, control) for control in controls])
+        values = (output, entry["id"], entry["title"], entry["finding_primary_key"],
+                  json.dumps(entry["scope_entity"]), ",".join(map(str, control_ids)))
+        row = self.connection.execute(
+            "SELECT rowid, output, id, title, finding_primary_key, scope_entity, controls FROM assessments WHERE source = ?",
+            (source,)).fetchone()
+        if row is None:
+            assessment = self.connection.execute(
+                "INSERT INTO assessments (source, output, id, title, finding_primary_key, scope_entity, controls) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", (source, *values)).lastrowid
+            old_entities = set()
+            stored_ids = set()
+        else:
+            if row[1:] == values:
+                return
+            assessment = row[0]
+            self.connection.execute(
+                "UPDATE assessments SET output = ?, id = ?, title = ?, finding_primary_key = ?, scope_entity = ?, "
+                "controls = ? WHERE rowid = ?", (*values, assessment))
+            old_entities = set(json.loads(row[5]))
+            stored_ids = set(_control_ids(row[6])) - self._pending_postings.get(assessment, set())
+        
+        new_entities = set(entry["scope_entity"])
+        self.connection.executemany("DELETE FROM entity_postings WHERE entity = ? AND assessment = ?",
+                                    [(entity, assessment) for entity in old_entities - new_entities])
+        self.connection.executemany("INSERT OR IGNORE INTO entity_postings (entity, assessment) VALUES (?, ?)",
+                                    [(entity, assessment) for entity in new_entities - old_entities])
+        
+        new_ids = set(control_ids)
+        self.connection.executemany("DELETE FROM control_postings WHERE control = ? AND assessment = ?",
+                                    [(control_id, assessment) for control_id in stored_ids - new_ids])
+        pending = new_ids - stored_ids
+        if pending:
+            self._pending_postings[assessment] = pending
+            self._pending_count += len(pending)
+            if self._pending_count >= POSTINGS_BUFFER:
+                self._write_postings()
+        else:
+            self._pending_postings.pop(assessment, None)
+    
+    def remove(self, source):
+        """Drop the CEI produced from source, if catalogued"""
+        row = self.connection.execute("SELECT rowid, scope_entity, controls FROM assessments WHERE source = ?",
+                                      (source,)).fetchone()
+        if row is None:
+            return
+        assessment, scope_entity, controls = row
+        stored_ids = set(_control_ids(controls)) - self._pending_postings.pop(assessment, set())
+        self.connection.executemany("DELETE FROM control_postings WHERE control = ? AND assessment = ?",
+                                    [(control_id, assessment) for control_id in stored_ids])
+        self.connection.executemany("DELETE FROM entity_postings WHERE entity = ? AND assessment = ?",
+                                    [(entity, assessment) for entity in set(json.loads(scope_entity))])
+        self.connection.execute("DELETE FROM assessments WHERE rowid = ?", (assessment,))
+    
+    def _write_postings(self):
+        """Insert the buffered control postings"""
+        if self._pending_postings:
+            # Sorted rows land next to each other in the index, which makes the inserts much cheaper;
+            # packing each pair into one integer sorts and transfers far faster than tuples
+            keys = sorted(control_id << 32 | assessment for assessment, control_ids in self._pending_postings.items()
+                          for control_id in control_ids)
+            try:
+                self.connection.execute("INSERT INTO control_postings (control, assessment) "
+                                        "SELECT value >> 32, value & 4294967295 FROM json_each(?)", (json.dumps(keys),))
+            except sqlite3.OperationalError:
+                # SQLite built without the JSON functions
+                self.connection.executemany("INSERT INTO control_postings (control, assessment) VALUES (?, ?)",
+                                            ((key >> 32, key & 0xFFFFFFFF) for key in keys))
+        self._pending_postings = {}
+        self._pending_count = 0
+    
+    def contains(self, source, output):
+        """Check whether source is catalogued with this output filename"""
+        return self.connection.execute("SELECT 1 FROM assessments WHERE source = ? AND output = ?",
+                                       (source, output)).fetchone() is not None
+    
+    def retain(self, sources):
+        """Drop every catalogued CEI whose source is not in sources; returns the sources dropped"""
+        sources = set(sources)
+        dropped = [source for (source,) in self.connection.execute("SELECT source FROM assessments")
+                   if source not in sources]
+        for source in dropped:
+            self.remove(source)
+        return dropped
+    
+    def outputs(self):
+        """Map every catalogued output filename to the source it was produced from"""
+        return {output: source for source, output in self.connection.execute("SELECT source, output FROM assessments")}
+    
+    def entries(self):
+        """Yield (source, output, entry) for every catalogued CEI in source order, entry as catalog_entry returns it"""
+        self.commit()
+        names = {control_id: (framework, control) for control_id, framework, control
+                 in self.connection.execute("SELECT id, framework, control FROM controls")}
+        rows = self.connection.execute(
+            "SELECT source, output, id, title, finding_primary_key, scope_entity, controls FROM assessments ORDER BY source")
+        for source, output, new_id, title, finding_primary_key, scope_entity, controls in rows:
+            # Control ids are stored in control_mapping order, so each framework's controls are adjacent
+            pairs = []
+            for control_id in _control_ids(controls):
+                framework, control = names[control_id]
+                if pairs and pairs[-1][0] == framework:
+                    pairs[-1][1].append(control)
+                else:
+                    pairs.append((framework, [control]))
+            yield source, output, {"id": new_id, "title": title, "finding_primary_key": finding_primary_key,
+                                   "scope_entity": json.loads(scope_entity), "controls": pairs}
+    
+    def commit(self):
+        """Write the buffered control postings and every change since the last commit"""
+        self._write_postings()
+        self.connection.commit()
+    
+    def close(self):
+        """Commit pending changes and close the catalog"""
+        try:
+            self.commit()
+        finally:
+            self.connection.close()
+    
+    def query(self, framework=None, control=None, entity=None, assessment_id=None, with_controls=True):
+        """Find catalogued CEIs; every given filter must match
+        
+        Args:
+            framework: Normalized framework name, as in control_mapping.
+            control: Control ID, mapped under framework if one is given.
+            entity: Scope entity, compared case-insensitively.
+            assessment_id: New CEI id.
+            with_controls: Whether to list each match's (framework, control) pairs. With a
+                framework or control filter, only the matching pairs are listed.
+        
+        Returns a list of dicts ordered by id, each with the source, output, id, title,
+        finding_primary_key, scope entities and, if requested, controls.
+        """
+        self.commit()
+        conditions = []
+        parameters = []
+        control_conditions = []
+        control_parameters = []
+        if framework is not None:
+            control_conditions.append("framework = ?")
+            control_parameters.append(framework)
+        if control is not None:
+            control_conditions.append("control = ?")
+            control_parameters.append(control)
+        if control_conditions:
+            conditions.append("rowid IN (SELECT assessment FROM control_postings WHERE control IN "
+                              f"(SELECT id FROM controls WHERE {' AND '.join(control_conditions)}))")
+            parameters.extend(control_parameters)
+        if entity is not None:
+            conditions.append("rowid IN (SELECT assessment FROM entity_postings WHERE entity = ?)")
+            parameters.append(entity)
+        if assessment_id is not None:
+            conditions.append("id = ?")
+            parameters.append(assessment_id)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.connection.execute(
+            "SELECT source, output, id, title, finding_primary_key, scope_entity, controls "
+            f"FROM assessments{where} ORDER BY id, source", parameters).fetchall()
+        
+        names = {}
+        if with_controls and rows:
+            # Only the matching pairs are listed when filtering by framework or control
+            filter_sql = f" WHERE {' AND '.join(control_conditions)}" if control_conditions else ""
+            names = {control_id: (framework_name, control_name) for control_id, framework_name, control_name
+                     in self.connection.execute(f"SELECT id, framework, control FROM controls{filter_sql}", control_parameters)}
+        matches = []
+        for source, output, new_id, title, finding_primary_key, scope_entity, controls in rows:
+            match = {"source": source, "output": output, "id": new_id, "title": title,
+                     "finding_primary_key": finding_primary_key, "scope_entity": json.loads(scope_entity)}
+            if with_controls:
+                match["controls"] = [list(names[control_id]) for control_id in _control_ids(controls) if control_id in names]
+            matches.append(match)
+        return matches
+    
+    def frameworks(self):
+        """(framework, control count, CEI count) for every catalogued framework"""
+        self.commit()
+        return self.connection.execute(
+            "SELECT c.framework, COUNT(DISTINCT c.id), COUNT(DISTINCT p.assessment) FROM control_postings p "
+            "JOIN controls c ON c.id = p.control GROUP BY c.framework ORDER BY c.framework"
+        ).fetchall()
+
+def open_catalog(path):
+    """Open an existing catalog for queries, or return None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    return MigrationCatalog(path)
@@ -1,37 +1,180 @@
 import os
+import sys
 import json
 import csv
-from migrate_ccm import transform_json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from migrate_ccm import MappingContext, tenant_settings, iter_array_records, pool_chunks
+from json_codec import get_codec
+from sharding import shard_argument, select_shard, write_partial, read_partials
+from tenants import load_tenants, override_settings
 
 # Path settings
 input_folder = 'Old CEIs'     # folder with original JSON files
 
-def detect_frameworks():
-    """Detect all distinct frameworks from Old CEIs and save to CSV"""
+# Parsing settings
+json_codec = 'auto'           # JSON library for reading CEIs: 'auto' (fastest installed), 'orjson' or 'stdlib'
+
+# Parallel settings
+worker_count = 1              # worker processes used by scan_corpus (1 = serial)
+
+def scan_file(path):
+    """Pull the framework keys and title row out of a single Old CEI file
+    
+    Returns (frameworks, title_row), or None if the file is not a valid CEI JSON.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        original_data = get_codec(json_codec).loads(raw)
+    except json.JSONDecodeError:
+        return None
+    return scan_record(original_data)
+
+def scan_record(original_data):
+    """Pull the framework keys and title row out of a parsed Old CEI
+    
+    Only the fields the CSVs need are read; the CEI is not transformed.
+    Returns (frameworks, title_row), or None if original_data is not a CEI object.
+    """
+    if not isinstance(original_data, dict):
+        return None
+    
+    framework_mapping = original_data.get("framework_mapping", {})
+    frameworks = list(framework_mapping.keys()) if isinstance(framework_mapping, dict) else []
+    
+    # Same id and title transform_json would produce without CSV mappings
+    title_row = {
+        "cei_id": original_data.get("cei_code", ""),
+        "assessment_id": "",
+        "title": original_data.get("cei_title", ""),
+        "finding_title": ""
+    }
+    return frameworks, title_row
+
+def _scan_chunk(folder, filenames):
+    """Scan a chunk of files inside a worker process"""
+    return [(filename, scan_file(os.path.join(folder, filename))) for filename in filenames]
+
+def _scan(workers=None, shard=None, pool=None):
+    """Scan the Old CEI files, or only those of shard (index, count)
+    
+    A pool shared by several scans, e.g. of a batch of tenants, is used instead of starting one.
+    Returns (detected_frameworks, titles_list, invalid_filenames).
+    """
+    if workers is None:
+        workers = worker_count
+    
+    filenames = select_shard([filename for filename in os.listdir(input_folder) if filename.endswith(".json")], shard)
+    if workers > 1 and len(filenames) > 1:
+        chunks = pool_chunks(filenames, workers)
+        executor = pool or ProcessPoolExecutor(max_workers=workers)
+        results = (result for chunk_results in executor.map(_scan_chunk, [input_folder] * len(chunks), chunks)
+                   for result in chunk_results)
+    else:
+        executor = None
+        results = ((filename, scan_file(os.path.join(input_folder, filename))) for filename in filenames)
+    
+    try:
+        return _collect(results)
+    finally:
+        if executor and executor is not pool:
+            executor.shutdown()
+
+def _collect(results):
+    """Gather (source, scan result) pairs into (detected_frameworks, titles_list, invalid_sources)"""
     detected_frameworks = set()
+    titles_list = []
+    invalid_sources = []
+    for source, scanned in results:
+        if scanned is None:
+            print(f"Skipping invalid JSON: {source}")
+            invalid_sources.append(source)
+            continue
+        frameworks, title_row = scanned
+        detected_frameworks.update(frameworks)
+        titles_list.append(title_row)
+    return detected_frameworks, titles_list, invalid_sources
+
+def scan_corpus(workers=None, shard=None):
+    """Parse every Old CEI file once, collecting framework keys and title rows together
     
-    print("\nDetecting frameworks from Old CEIs...")
-    for filename in os.listdir(input_folder):
-        if filename.endswith(".json"):
-            with open(os.path.join(input_folder, filename), 'r', encoding='utf-8') as f:
-                try:
-                    original_data = json.load(f)
-                    framework_mapping = original_data.get("framework_mapping", {})
-                    if isinstance(framework_mapping, dict):
-                        detected_frameworks.update(framework_mapping.keys())
-                except json.JSONDecodeError:
-                    print(f"Skipping invalid JSON: {filename}")
-    
-    # Save detected frameworks to CSV file
+    Args:
+        workers: Optional number of worker processes. Defaults to worker_count; 1 runs serially.
+        shard: Optional (index, count) to scan only the files shard_of assigns to this shard.
+    
+    Returns (detected_frameworks, titles_list).
+    """
+    detected_frameworks, titles_list, _ = _scan(workers, shard)
+    return detected_frameworks, titles_list
+
+def scan_export(path):
+    """Collect framework keys and title rows from a JSON array export of Old CEIs
+    
+    The export is read one CEI at a time (see migrate_ccm.iter_array_records), so memory is
+    bounded by the largest CEI. Raises ValueError if the export is not a JSON array.
+    
+    Returns (detected_frameworks, titles_list), as scan_corpus does for a folder.
+    """
+    codec = get_codec(json_codec)
+    with open(path, 'rb') as f:
+        detected_frameworks, titles_list, _ = _collect((f"item {item_number}", scan_record(data))
+                                                       for item_number, data in iter_array_records(f, codec))
+    return detected_frameworks, titles_list
+
+def scan_shard(shard, workers=None, folder=None):
+    """Scan one shard of the Old CEI files and save its partial results for merge_shards
+    
+    Args:
+        shard: (index, count) of the shard.
+        workers: Optional number of worker processes. Defaults to worker_count; 1 runs serially.
+        folder: Optional folder for the partial results. Defaults to sharding.results_folder.
+    """
+    print(f"\nScanning Old CEIs, shard {shard[0]} of {shard[1]}...")
+    detected_frameworks, titles_list, invalid_filenames = _scan(workers, shard)
+    path = write_partial("scan", shard, {
+        "input_folder": input_folder,
+        "frameworks": sorted(detected_frameworks),
+        "titles": titles_list,
+        "invalid": invalid_filenames
+    }, folder)
+    print(f"\nScanned {len(titles_list) + len(invalid_filenames)} file(s): {len(detected_frameworks)} framework(s), "
+          f"{len(titles_list)} title(s). Saved to '{path}'")
+
+def merge_shards(folder=None):
+    """Combine the partial results of every scan_shard into the CSVs a single-node scan would save
+    
+    Args:
+        folder: Optional folder with the partial results. Defaults to sharding.results_folder.
+    """
+    try:
+        partials = read_partials("scan", folder)
+    except (OSError, ValueError) as e:
+        print(f"\nError: {e}")
+        return False
+    if any(partial["input_folder"] != input_folder for partial in partials):
+        print(f"\nError: the shard results were not all scanned from '{input_folder}'.")
+        return False
+    print(f"\nMerging the scans of {len(partials)} shard(s)...")
+    
+    detected_frameworks = set()
+    titles_list = []
+    for partial in partials:
+        detected_frameworks.update(partial["frameworks"])
+        titles_list.extend(partial["titles"])
+    for filename in sorted(filename for partial in partials for filename in partial["invalid"]):
+        print(f"Skipping invalid JSON: {filename}")
+    save_frameworks_csv(detected_frameworks)
+    save_titles_csv(titles_list)
+    return True
+
+def save_frameworks_csv(detected_frameworks):
+    """Save detected frameworks to CSV, preserving existing normalized_framework values"""
     if detected_frameworks:
-        frameworks_file = "detected_frameworks.csv"
-        # Check if file exists and read existing data
-        existing_data = {}
-        if os.path.exists(frameworks_file):
-            with open(frameworks_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    existing_data[row["framework"]] = row.get("normalized_framework", "")
+        context = MappingContext.load()
+        frameworks_file = context.frameworks_path
+        # Read existing data (empty if the file does not exist yet)
+        existing_data = dict(context.framework_rows)
         
         with open(frameworks_file, 'w', newline='', encoding='utf-8') as f:
             writer = csv.DictWriter(f, fieldnames=["framework", "normalized_framework"])
@@ -46,61 +189,103 @@ def detect_frameworks():
     else:
         print("\nNo frameworks detected in any CEI files.")
 
-def extract_titles():
-    """Extract all titles from Old CEIs and save to CSV"""
-    titles_list = []
-    
-    print("\nExtracting titles from Old CEIs...")
-    for filename in os.listdir(input_folder):
-        if filename.endswith(".json"):
-            with open(os.path.join(input_folder, filename), 'r', encoding='utf-8') as f:
-                try:
-                    original_data = json.load(f)
-                    transformed_data = transform_json(original_data)
-                    
-                    # Collect title for CSV export
-                    titles_list.append({
-                        "cei_id": transformed_data.get("id", ""),
-                        "assessment_id": "",
-                        "title": transformed_data.get("title", ""),
-                        "finding_title": ""
-                    })
-                except json.JSONDecodeError:
-                    print(f"Skipping invalid JSON: {filename}")
-    
-    # Save titles to CSV file
+def save_titles_csv(titles_list):
+    """Save title rows to CSV, preserving existing finding_title and assessment_id values"""
     if titles_list:
-        csv_file = "cei_titles.csv"
-        # Check if file exists and read existing finding_title and assessment_id data
-        existing_data = {}
-        if os.path.exists(csv_file):
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # Support both old "id" and new "cei_id" column names for backward compatibility
-                    cei_id = row.get("cei_id", row.get("id", ""))
-                    existing_data[cei_id] = {
-                        "finding_title": row.get("finding_title", ""),
-                        "assessment_id": row.get("assessment_id", "")
-                    }
+        context = MappingContext.load()
+        csv_file = context.cei_titles_path
+        # Existing finding_title and assessment_id data (empty if the file does not exist yet)
+        finding_title_map = context.finding_title_map
+        assessment_id_map = context.assessment_id_map
         
         with open(csv_file, 'w', newline='', encoding='utf-8') as f:
             # Column order: cei_id, assessment_id, title, finding_title
             writer = csv.DictWriter(f, fieldnames=["cei_id", "assessment_id", "title", "finding_title"])
             writer.writeheader()
-            # Sort by cei_id for consistent output
-            sorted_titles = sorted(titles_list, key=lambda x: x["cei_id"])
+            # Sort by cei_id for consistent output; rows sharing a cei_id by title, so the order
+            # does not depend on the order the files were scanned in
+            sorted_titles = sorted(titles_list, key=lambda x: (x["cei_id"], str(x["title"])))
             for title_row in sorted_titles:
                 # Preserve existing finding_title and assessment_id if they exist
                 cei_id = title_row["cei_id"]
-                if cei_id in existing_data:
-                    title_row["finding_title"] = existing_data[cei_id].get("finding_title", "")
-                    title_row["assessment_id"] = existing_data[cei_id].get("assessment_id", "")
+                if cei_id in finding_title_map:
+                    title_row["finding_title"] = finding_title_map[cei_id]
+                    title_row["assessment_id"] = assessment_id_map[cei_id]
                 writer.writerow(title_row)
         print(f"\nSaved {len(titles_list)} title(s) to '{csv_file}'")
     else:
         print("\nNo titles collected to save.")
 
+def detect_frameworks():
+    """Detect all distinct frameworks from Old CEIs and save to CSV"""
+    print("\nDetecting frameworks from Old CEIs...")
+    detected_frameworks, _ = scan_corpus()
+    save_frameworks_csv(detected_frameworks)
+
+def extract_titles():
+    """Extract all titles from Old CEIs and save to CSV"""
+    print("\nExtracting titles from Old CEIs...")
+    _, titles_list = scan_corpus()
+    save_titles_csv(titles_list)
+
+def generate_all():
+    """Detect frameworks and extract titles from Old CEIs in a single pass and save both CSVs"""
+    print("\nDetecting frameworks and extracting titles from Old CEIs...")
+    detected_frameworks, titles_list = scan_corpus()
+    save_frameworks_csv(detected_frameworks)
+    save_titles_csv(titles_list)
+
+def generate_from_export(path):
+    """Detect frameworks and extract titles from a JSON array export and save both CSVs"""
+    print(f"\nDetecting frameworks and extracting titles from '{path}'...")
+    try:
+        detected_frameworks, titles_list = scan_export(path)
+    except (OSError, ValueError) as e:
+        print(f"\nError: {path}: {e}")
+        return False
+    save_frameworks_csv(detected_frameworks)
+    save_titles_csv(titles_list)
+    return True
+
+def generate_tenants(tenants_path, workers=None):
+    """Detect frameworks and extract titles for every tenant of a tenant manifest in one run
+    
+    Each tenant's input folder is scanned into its own cei_titles_file and frameworks_file
+    (see tenants.load_tenants), with one worker pool shared by all tenants. A tenant that
+    fails is reported and the next tenant still runs.
+    
+    Returns True if the CSVs of every tenant were saved.
+    """
+    tenants = load_tenants(tenants_path)
+    if tenants is None:
+        return False
+    if workers is None:
+        workers = worker_count
+    
+    failed = []
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for tenant in tenants:
+            print("\n" + "="*50)
+            print(f"Tenant: {tenant['name']}")
+            print("="*50)
+            try:
+                with tenant_settings(tenant), override_settings(globals(), {"input_folder": tenant["input_folder"]}):
+                    print(f"\nDetecting frameworks and extracting titles from '{input_folder}'...")
+                    detected_frameworks, titles_list, _ = _scan(workers, pool=pool)
+                    save_frameworks_csv(detected_frameworks)
+                    save_titles_csv(titles_list)
+            except Exception as e:
+                print(f"\nError: tenant '{tenant['name']}' failed: {type(e).__name__}: {e}")
+                failed.append(tenant["name"])
+    finally:
+        if pool:
+            pool.shutdown()
+    
+    print(f"\nGenerated the CSVs of {len(tenants) - len(failed)} of {len(tenants)} tenant(s)."
+          + (f" Failed: {', '.join(failed)}" if failed else ""))
+    return not failed
+
 def show_menu():
     """Display menu and handle user selection"""
     while True:
@@ -109,21 +294,59 @@ def show_menu():
         print("="*50)
         print("1. Detect all frameworks")
         print("2. Extract all titles")
-        print("3. Exit")
+        print("3. Detect frameworks and extract titles (single pass)")
+        print("4. Exit")
         print("="*50)
         
-        choice = input("\nEnter your choice (1-3): ").strip()
+        choice = input("\nEnter your choice (1-4): ").strip()
         
         if choice == "1":
             detect_frameworks()
         elif choice == "2":
             extract_titles()
         elif choice == "3":
+            generate_all()
+        elif choice == "4":
             print("\nExiting...")
             break
         else:
-            print("\nInvalid choice. Please enter 1, 2, or 3.")
+            print("\nInvalid choice. Please enter 1, 2, 3, or 4.")
 
-if __name__ == "__main__":
-    show_menu()
+def main(argv=None):
+    """Run the interactive menu, or a single command when arguments are given"""
+    parser = argparse.ArgumentParser(description="CSV Generation Tool")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    scan_parser = subparsers.add_parser("scan", help="scan one shard of Old CEIs and save its partial results")
+    scan_parser.add_argument("--shard", type=shard_argument, required=True, metavar="INDEX/COUNT",
+                             help="shard to scan, e.g. 0/4")
+    scan_parser.add_argument("--workers", type=int, help="number of worker processes")
+    scan_parser.add_argument("--results", help="folder for the shard results (default: shard_results)")
+    
+    export_parser = subparsers.add_parser("export", help="generate both CSVs from a JSON array export of CEIs")
+    export_parser.add_argument("path", help="JSON file holding a single array of Old CEIs")
+    
+    batch_parser = subparsers.add_parser("batch", help="generate both CSVs for every tenant of a tenant manifest")
+    batch_parser.add_argument("tenants", help="tenant manifest JSON file")
+    batch_parser.add_argument("--workers", type=int, help="number of worker processes shared by all tenants")
+    
+    merge_parser = subparsers.add_parser("merge", help="save both CSVs from the results of every shard")
+    merge_parser.add_argument("--results", help="folder with the shard results (default: shard_results)")
+    
+    args = parser.parse_args(argv)
+    if args.command == "scan":
+        scan_shard(args.shard, args.workers, args.results)
+    elif args.command == "export":
+        if not generate_from_export(args.path):
+            sys.exit(1)
+    elif args.command == "batch":
+        if not generate_tenants(args.tenants, args.workers):
+            sys.exit(1)
+    elif args.command == "merge":
+        if not merge_shards(args.results):
+            sys.exit(1)
+    else:
+        show_menu()
 
+if __name__ == "__main__":
+    main()
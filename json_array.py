@@ -0,0 +1,145 @@
+import re
+
+# Reading settings
+read_chunk_size = 1 << 20     # bytes read from an export at a time
+
+WHITESPACE = b" \t\r\n"
+UTF8_BOM = b"\xef\xbb\xbf"
+QUOTE, BACKSLASH = ord('"'), ord('\\')
+
+# Bytes that start a string or open or close an object or array
+STRUCTURAL = re.compile(rb'["\[\]{}]')
+# Bytes that end a string or escape the next byte
+STRING_SPECIAL = re.compile(rb'["\\]')
+# Bytes that end a number, true, false or null
+SCALAR_END = re.compile(rb'[\s,\]]')
+
+def iter_array_items(f, chunk_size=None):
+    """Yield the raw JSON bytes of each item of the top-level array in binary file f, in order
+    
+    The file is read in chunks and only item boundaries are found here, by tracking strings
+    and nesting; decoding an item is left to the caller, e.g. a json_codec codec. Only the
+    current item and the chunk around it are held in memory, so memory is bounded by the
+    largest item, not by the size of the export. An item that is not valid JSON inside
+    balanced brackets is still yielded for the caller to reject.
+    
+    Args:
+        f: Binary file positioned at the start of the document.
+        chunk_size: Optional number of bytes to read at a time. Defaults to read_chunk_size.
+    
+    Raises ValueError if the document is not a JSON array or ends before the array is closed.
+    """
+    chunk_size = chunk_size or read_chunk_size
+    data = bytearray()
+    dropped = 0
+    eof = False
+    
+    def fill(keep_from):
+        """Drop the bytes before keep_from and append the next chunk; False at the end of the file
+        
+        Every index into data moves back by keep_from.
+        """
+        nonlocal dropped, eof
+        del data[:keep_from]
+        dropped += keep_from
+        chunk = b"" if eof else f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        data.extend(chunk)
+        return True
+    
+    def skip_whitespace(i):
+        """Index of the first byte from i on that is not whitespace, or len(data) at the end of the file"""
+        while True:
+            while i < len(data) and data[i] in WHITESPACE:
+                i += 1
+            if i < len(data):
+                return i
+            more = fill(i)
+            i = 0
+            if not more:
+                return i
+    
+    def truncated():
+        return ValueError(f"The JSON array ends unexpectedly at byte {dropped + len(data)}")
+    
+    def item_end(start):
+        """(start, end) of the item beginning at data[start]; start moves when more is read"""
+        if data[start] in b"{[\"":
+            depth = 0
+            in_string = False
+            i = start
+            while True:
+                match = (STRING_SPECIAL if in_string else STRUCTURAL).search(data, i)
+                # An escape needs the byte after the backslash too
+                if match is None or (data[match.start()] == BACKSLASH and match.start() + 1 >= len(data)):
+                    i = len(data) if match is None else match.start()
+                    more = fill(start)
+                    i -= start
+                    start = 0
+                    if not more:
+                        raise truncated()
+                    continue
+                j = match.start()
+                byte = data[j]
+                if byte == BACKSLASH:
+                    i = j + 2
+                    continue
+                i = j + 1
+                if byte == QUOTE:
+                    in_string = not in_string
+                    if in_string or depth:
+                        continue
+                elif byte in b"{[":
+                    depth += 1
+                    continue
+                else:
+                    depth -= 1
+                    if depth:
+                        continue
+                return start, i
+        while True:
+            match = SCALAR_END.search(data, start)
+            if match:
+                end = match.start()
+                break
+            end = len(data) - start
+            more = fill(start)
+            start = 0
+            if not more:
+                break
+        if end == start or data[start] in b"]}":
+            # e.g. a trailing comma
+            raise ValueError(f"Expected an item at byte {dropped + start}")
+        return start, end
+    
+    while len(data) < len(UTF8_BOM) and fill(0):
+        pass
+    i = len(UTF8_BOM) if data.startswith(UTF8_BOM) else 0
+    i = skip_whitespace(i)
+    if i >= len(data) or data[i] != ord('['):
+        raise ValueError("The document is not a JSON array")
+    i = skip_whitespace(i + 1)
+    if i < len(data) and data[i] == ord(']'):
+        i += 1
+    else:
+        count = 0
+        while True:
+            if i >= len(data):
+                raise truncated()
+            start, end = item_end(i)
+            count += 1
+            yield bytes(data[start:end])
+            i = skip_whitespace(end)
+            if i >= len(data):
+                raise truncated()
+            if data[i] == ord(']'):
+                i += 1
+                break
+            if data[i] != ord(','):
+                raise ValueError(f"Expected ',' or ']' after item {count} at byte {dropped + i}")
+            i = skip_whitespace(i + 1)
+    i = skip_whitespace(i)
+    if i < len(data):
+        raise ValueError(f"Unexpected data after the JSON array at byte {dropped + i}")
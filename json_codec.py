@@ -0,0 +1,167 @@
+import os
+import json
+import math
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Codec used when none is named: 'auto' picks the fastest installed codec
+default_codec = 'auto'
+
+# Maps every digit to b'0' so digit patterns can be found with plain substring searches,
+# which are much faster than a regular expression over a whole document
+DIGITS_TO_ZERO = bytes.maketrans(b'0123456789', b'0000000000')
+
+# orjson reads integers too long for 64 bits as floats
+LONG_INTEGER = b'0' * 19
+
+# orjson formats floats exactly like json.dumps for 1e-4 <= |x| < 1e16. Outside that range its
+# output always contains one of these (e.g. 0.00001 for 1e-05, 1e16 for 1e+16); they may
+# also appear inside strings, which only costs a fallback to the stdlib encoder.
+SMALL_FLOAT = b'0.0000'
+EXPONENT = b'0e'
+LARGE_NUMBER = b'0' * 17
+
+# Exponents of three or more digits can overflow a float; depending on the version orjson then
+# reads inf (written back as null) or rejects the document, so the stdlib parses these
+LONG_EXPONENT = re.compile(rb'[eE][+-]?000')
+
+# orjson writes DEL unescaped, which isascii() does not catch
+DEL = b'\x7f'
+
+def _has_non_finite(data):
+    """Whether data holds an infinite or NaN float anywhere, which orjson writes as null"""
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(_has_non_finite(value) for value in data.values())
+    if isinstance(data, list):
+        return any(_has_non_finite(value) for value in data)
+    return False
+
+class _JSONConstant(float):
+    """NaN or Infinity read by the stdlib fallback
+    
+    Fast encoders write these as null; being a float subclass makes them refuse the value,
+    so it is written as NaN/Infinity through the stdlib encoder like before.
+    """
+
+class StdlibCodec:
+    """The standard library json module; always available and the reference output format"""
+    name = "stdlib"
+    
+    def loads(self, raw):
+        """Parse a JSON document from bytes (UTF-8) or str"""
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        return json.loads(raw)
+    
+    def dumps(self, data, compact=False):
+        """Serialize data to ASCII JSON bytes, indented by 2 or, if compact, without whitespace"""
+        if compact:
+            return json.dumps(data, separators=(',', ':')).encode('ascii')
+        return json.dumps(data, indent=2).encode('ascii')
+
+class OrjsonCodec(StdlibCodec):
+    """orjson, producing exactly the bytes StdlibCodec would
+    
+    orjson writes non-ASCII characters and DEL unescaped, formats very small and very large
+    floats differently, writes infinite and NaN floats as null, rejects non-string keys and
+    reads big integers and overflowing exponents differently. Documents it cannot read or
+    write identically fall back to the stdlib parser or encoder.
+    """
+    name = "orjson"
+    
+    def loads(self, raw):
+        """Parse a JSON document from bytes (UTF-8) or str"""
+        data = raw.encode('utf-8', 'surrogatepass') if isinstance(raw, str) else raw
+        digits = data.translate(DIGITS_TO_ZERO)
+        if LONG_INTEGER not in digits and not LONG_EXPONENT.search(digits):
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                pass
+        # The stdlib parser accepts a few things orjson rejects (NaN, lone surrogates), keeps big ints
+        # exact and reads overflowing exponents as Infinity
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        return json.loads(raw, parse_constant=_JSONConstant)
+    
+    def dumps(self, data, compact=False):
+        """Serialize data to ASCII JSON bytes, indented by 2 or, if compact, without whitespace"""
+        try:
+            output = orjson.dumps(data) if compact else orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        except TypeError:
+            return super().dumps(data, compact)
+        if not output.isascii() or DEL in output or SMALL_FLOAT in output:
+            return super().dumps(data, compact)
+        if b'null' in output and _has_non_finite(data):
+            return super().dumps(data, compact)
+        digits = output.translate(DIGITS_TO_ZERO)
+        if EXPONENT in digits or LARGE_NUMBER in digits:
+            return super().dumps(data, compact)
+        return output
+
+# Codec classes by name, in order of preference for 'auto'
+CODECS = {}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec
+CODECS["stdlib"] = StdlibCodec
+
+_codec_instances = {}
+
+def register_codec(name, codec_class, preferred=False):
+    """Make a codec class available under name, optionally ahead of the existing ones for 'auto'
+    
+    A codec provides loads(raw) and dumps(data, compact=False) returning bytes, and must
+    produce the same bytes as StdlibCodec.
+    """
+    global CODECS
+    if preferred:
+        CODECS = {name: codec_class, **{key: value for key, value in CODECS.items() if key != name}}
+    else:
+        CODECS[name] = codec_class
+    _codec_instances.pop(name, None)
+    _codec_instances.pop("auto", None)
+
+def get_codec(name=None):
+    """Codec instance by name; None uses default_codec, and 'auto' the first installed codec"""
+    if name is None:
+        name = default_codec
+    codec = _codec_instances.get(name)
+    if codec is None:
+        if name == "auto":
+            codec = get_codec(next(iter(CODECS)))
+        elif name in CODECS:
+            codec = CODECS[name]()
+        else:
+            raise ValueError(f"Unknown JSON codec '{name}'. Available codecs: {', '.join(CODECS)}")
+        _codec_instances[name] = codec
+    return codec
+
+def loads(raw, codec=None):
+    """Parse a JSON document from bytes or str with the given or default codec"""
+    return get_codec(codec).loads(raw)
+
+def dumps(data, compact=False, codec=None):
+    """Serialize data to JSON bytes with the given or default codec"""
+    return get_codec(codec).dumps(data, compact)
+
+def load_file(path, codec=None):
+    """Read a JSON file as bytes and parse it"""
+    with open(path, 'rb') as f:
+        return get_codec(codec).loads(f.read())
+
+def dump_file(path, data, compact=False, codec=None):
+    """Serialize data to path atomically, through a temp file and a rename
+    
+    The temp file is named per process, so processes writing the same path side by side (e.g.
+    shards) never share one.
+    """
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(get_codec(codec).dumps(data, compact))
+    os.replace(temp_file, path)
@@ -1,10 +1,70 @@
 import os
+import sys
 import json
 import csv
+import copy
+import hashlib
+import time
+import zipfile
+import argparse
+import itertools
+import contextlib
+import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from migration_metrics import MigrationMetrics
+from sql_rewriter import ScopeQueryRewriter, extract_case_condition
+from json_codec import CODECS, get_codec, dump_file
+from output_writer import OutputWriter, write_staged
+from run_journal import RunJournal, read_journal
+from catalog import MigrationCatalog, catalog_entry, open_catalog
+from sharding import shard_argument, select_shard, shard_path, write_partial, read_partials
+from tenants import SETTING_KEYS as TENANT_SETTING_KEYS, load_tenants, override_settings
+from json_array import iter_array_items
 
 # Path settings
 input_folder = 'Old CEIs'     # folder with original JSON files
 output_folder = 'New CEIs'
+cei_titles_file = 'cei_titles.csv'
+frameworks_file = 'detected_frameworks.csv'
+
+# Parallel settings
+worker_count = 1              # worker processes used by migrate_ceis (1 = serial)
+chunks_per_worker = 4         # pool tasks per worker; a few each keeps workers busy when file sizes vary
+
+# Overlapped I/O settings (for input/output folders on high-latency network storage)
+io_threads = 0                # reader and writer threads overlapping file I/O with transforms (0 = off)
+io_queue_depth = 64           # files read ahead of, and written behind, the transform
+
+# Incremental settings
+incremental = False           # only migrate CEIs whose source or mapping rows changed
+manifest_file = 'migration_manifest.json'
+
+# Journal settings
+journaled = False             # checkpoint finished files in journal_file so an interrupted run can be resumed
+journal_file = 'migration_journal.jsonl'
+
+# Index settings
+index_file = 'cei_index.json'     # cei_code -> source filename index for targeted migrations
+catalog_file = 'cei_catalog.sqlite'   # SQLite catalog of New CEIs by framework, control and scope entity (None = off)
+
+# Output settings
+json_codec = 'auto'           # JSON library for reading and writing CEIs: 'auto' (fastest installed), 'orjson' or 'stdlib'
+compact_output = False        # write New CEIs without indentation instead of the default indent of 2
+publish_batch_size = 256      # staged outputs renamed into the output folder together
+fsync_outputs = True          # flush outputs to disk as they are staged and published, so a crash cannot lose or truncate them
+
+# Reporting settings
+verbose = True                # print a line per migrated file
+collect_metrics = False       # time each migration stage and print a summary at the end
+metrics_file = None           # optional path to also write the metrics as JSON
+
+# Watch settings
+watch_interval = 0.5          # seconds between polls of the input folder and mapping CSVs
+
+# Migration rules settings
+rules_file = 'migration_rules.json'   # optional override of DEFAULT_MIGRATION_RULES
 
 # Ensure output directory exists
 os.makedirs(output_folder, exist_ok=True)
@@ -27,203 +87,417 @@ def extract_condition_from_case(cei_condition):
     if not cei_condition:
         return ""
     
-    cei_condition = cei_condition.strip()
+    # Tokenized so nested CASE and THEN inside string literals are handled; memoized per condition
+    return extract_case_condition(cei_condition)
+
+# Declarative migration rules, compiled once per run into a MigrationPlan.
+# A JSON file at rules_file with the same shape replaces them without editing Python.
+#   fields: output fields in order; each copies "source" (first key present wins, else
+#       "default"), sets a constant "value", or applies a named built-in "rule"
+#   excluded_frameworks: framework_mapping keys dropped from control_mapping
+#   uppercase_controls: uppercase string control IDs in control_mapping
+#   table_rewrite: entity_inventory table replaced in scope_query ({entity} for single-entity
+#       scopes, {entities} for multi-entity scopes, which keep old_table when this is null)
+#       and <%...%> placeholders to rename (see sql_rewriter.ScopeQueryRewriter)
+#   finding_config: ui_config.mapping fields to skip and the template used when there are none
+#   finding_primary_key: key for single- and multi-entity scopes
+#   remove_fields: Old CEI fields that must never be copied into the output
+DEFAULT_MIGRATION_RULES = {
+    "fields": [
+        {"name": "id", "rule": "assessment_id"},
+        {"name": "title", "source": "cei_title", "default": ""},
+        {"name": "contributing_module", "value": ["Reporting"]},
+        {"name": "is_active", "source": "is_active", "default": True},
+        {"name": "description", "source": ["description", "cei_description"], "default": ""},
+        {"name": "scope_entity", "source": "entity", "default": []},
+        {"name": "scope_validation_steps", "source": "cei_description", "default": []},
+        {"name": "scope_query", "rule": "scope_query"},
+        {"name": "success_condition", "rule": "success_condition"},
+        {"name": "finding_primary_key", "rule": "finding_primary_key"},
+        {"name": "finding_title", "rule": "finding_title"},
+        {"name": "finding_config", "rule": "finding_config"},
+        {"name": "exposure_category", "value": "Control Gap"},
+        {"name": "control_mapping", "rule": "control_mapping"}
+    ],
+    "excluded_frameworks": ["nist_csf_v1", "scf_2023_2"],
+    "uppercase_controls": True,
+    "table_rewrite": {
+        "old_table": "<%EI_PUBLISH_SCHEMA_NAME%>.sds_ei__publish_transformer__entity_inventory",
+        "new_table": "<%EI_SCHEMA_NAME%>.sds_ei__{entity}__enrich",
+        "multi_entity_table": None,
+        "placeholders": {}
+    },
+    "finding_config": {
+        "skip_fields": ["cei_status"],
+        "default": [{"title": "", "expression": "", "finding_evidence": True}]
+    },
+    "finding_primary_key": {"single_entity": "p_id", "multi_entity": "relationship_id"},
+    "remove_fields": sorted(remove_fields)
+}
+
+def _constant_factory(value):
+    """Return a function producing value, copied when mutable so records never share it"""
+    if isinstance(value, list) and all(isinstance(item, (str, int, float, bool, type(None))) for item in value):
+        return lambda: list(value)
+    if isinstance(value, (list, dict)):
+        return lambda: copy.deepcopy(value)
+    return lambda: value
+
+def _compile_copy_step(field, rules):
+    """Step copying the first present source key, or the default"""
+    sources = field["source"] if isinstance(field["source"], list) else [field["source"]]
+    removed = set(sources) & set(rules.get("remove_fields", []))
+    if removed:
+        raise ValueError(f"Field '{field['name']}' copies removed field(s): {', '.join(sorted(removed))}")
+    make_default = _constant_factory(field.get("default"))
     
-    # Check if it's a CASE WHEN statement
-    if cei_condition.upper().startswith("CASE WHEN"):
-        # Find "THEN true" or "THEN TRUE" to extract the condition
-        # Handle both "THEN true" and "THEN TRUE"
-        then_index = cei_condition.upper().find(" THEN ")
-        if then_index > 0:
-            # Extract the part after "CASE WHEN" and before "THEN"
-            condition = cei_condition[9:then_index].strip()  # 9 is length of "CASE WHEN"
-            return condition
+    if len(sources) == 1:
+        source = sources[0]
+        return lambda data, transformed, lookups: data[source] if source in data else make_default()
     
-    # If it doesn't match the pattern, return as is
-    return cei_condition
+    def step(data, transformed, lookups):
+        for source in sources:
+            if source in data:
+                return data[source]
+        return make_default()
+    return step
 
-# Main transformation logic
-def transform_json(data, finding_title_map=None, framework_normalization_map=None, assessment_id_map=None):
-    transformed = {}
+def _compile_assessment_id_rule(rules):
+    """New id: assessment_id from cei_titles.csv, falling back to cei_code"""
+    def step(data, transformed, lookups):
+        cei_code = data.get("cei_code", "")
+        assessment_id_map = lookups[2]
+        if assessment_id_map and cei_code in assessment_id_map:
+            return assessment_id_map[cei_code]
+        return cei_code
+    return step
 
-    # Get cei_code from old CEI
-    cei_code = data.get("cei_code", "")
+def _compile_scope_query_rule(rules):
+    """scope_query with the entity_inventory table and schema placeholders rewritten"""
+    table_rewrite = rules["table_rewrite"]
+    rewriter = ScopeQueryRewriter(
+        table_rewrite["old_table"],
+        table_rewrite["new_table"],
+        table_rewrite.get("multi_entity_table"),
+        table_rewrite.get("placeholders"),
+    )
     
-    # Use assessment_id from CSV as the new id, fallback to cei_code if not found
-    if assessment_id_map and cei_code in assessment_id_map:
-        transformed["id"] = assessment_id_map[cei_code]
-    else:
-        transformed["id"] = cei_code
-    transformed["title"] = data.get("cei_title", "")
-    transformed["contributing_module"] = ["Reporting"]
-    transformed["is_active"] = data.get("is_active", True)
-    transformed["description"] = data.get("description", data.get("cei_description", ""))
-    transformed["scope_entity"] = data.get("entity", [])
-    transformed["scope_validation_steps"] = data.get("cei_description", [])
-    transformed["scope_query"] = data.get("sql_query", "")
-    
-    # Replace table name in scope_query if scope_entity has only single entry
-    scope_entity = transformed["scope_entity"]
-    if len(scope_entity) == 1 and transformed["scope_query"]:
-        entity_value = scope_entity[0].lower()
-        old_table = "<%EI_PUBLISH_SCHEMA_NAME%>.sds_ei__publish_transformer__entity_inventory"
-        new_table = f"<%EI_SCHEMA_NAME%>.sds_ei__{entity_value}__enrich"
-        transformed["scope_query"] = transformed["scope_query"].replace(old_table, new_table)
-    
-    # Extract condition from CASE WHEN statement
-    cei_condition = data.get("cei_condition", "")
-    transformed["success_condition"] = extract_condition_from_case(cei_condition)
-    
-    # Set finding_primary_key based on scope_entity count
-    scope_entity = transformed["scope_entity"]
-    if len(scope_entity) > 1:
-        transformed["finding_primary_key"] = "relationship_id"
-    else:
-        transformed["finding_primary_key"] = "p_id"
+    def step(data, transformed, lookups):
+        scope_query = data.get("sql_query", "")
+        if not scope_query:
+            return scope_query
+        return rewriter.rewrite(scope_query, tuple(transformed["scope_entity"]))
+    return step
+
+def _compile_success_condition_rule(rules):
+    """Condition extracted from the CASE WHEN cei_condition"""
+    return lambda data, transformed, lookups: extract_condition_from_case(data.get("cei_condition", ""))
+
+def _compile_finding_primary_key_rule(rules):
+    """Primary key chosen by the number of scope entities"""
+    single_entity = rules["finding_primary_key"]["single_entity"]
+    multi_entity = rules["finding_primary_key"]["multi_entity"]
+    return lambda data, transformed, lookups: multi_entity if len(transformed["scope_entity"]) > 1 else single_entity
+
+def _compile_finding_title_rule(rules):
+    """finding_title from cei_titles.csv (keyed by cei_code), else the original value"""
+    def step(data, transformed, lookups):
+        cei_code = data.get("cei_code", "")
+        finding_title_map = lookups[0]
+        if finding_title_map and cei_code in finding_title_map:
+            return finding_title_map[cei_code] or ""
+        return data.get("finding_title", "")
+    return step
+
+def _compile_finding_config_rule(rules):
+    """finding_config built from ui_config.mapping, or the default template"""
+    skip_fields = frozenset(rules["finding_config"]["skip_fields"])
+    make_default = _constant_factory(rules["finding_config"]["default"])
     
-    # Map finding_title from CSV if available, otherwise use original or empty string
-    # Use cei_code (not the new id) to look up finding_title since the map uses cei_code as key
-    if finding_title_map and cei_code in finding_title_map:
-        transformed["finding_title"] = finding_title_map[cei_code] if finding_title_map[cei_code] else ""
-    else:
-        transformed["finding_title"] = data.get("finding_title", "")
-
-    # Transform ui_config.mapping into finding_config
-    finding_config = []
-    ui_config = data.get("ui_config", {})
-    mappings = ui_config.get("mapping", []) or ui_config.get("mappings", [])
-    
-    if mappings:
-        for mapping_item in mappings:
-            # Skip cei_status field
-            data_field = mapping_item.get("data_field", "")
-            if data_field == "cei_status":
+    def step(data, transformed, lookups):
+        ui_config = data.get("ui_config", {})
+        mappings = ui_config.get("mapping", []) or ui_config.get("mappings", [])
+        if not mappings:
+            return make_default()
+        # A comprehension avoids a method call per item; data_field is read once through the inner loop
+        return [{"title": mapping_item.get("data_label", ""), "expression": data_field, "finding_evidence": True}
+                for mapping_item in mappings
+                for data_field in (mapping_item.get("data_field", ""),)
+                if data_field not in skip_fields]
+    return step
+
+def _compile_control_mapping_rule(rules):
+    """control_mapping with excluded frameworks dropped, names normalized and controls uppercased"""
+    excluded_frameworks = frozenset(rules["excluded_frameworks"])
+    uppercase_controls = rules.get("uppercase_controls", True)
+    
+    def step(data, transformed, lookups):
+        framework_normalization_map = lookups[1] or {}
+        control_mapping = {}
+        for framework, values in data.get("framework_mapping", {}).items():
+            if framework in excluded_frameworks:
                 continue
-            finding_config.append({
-                "title": mapping_item.get("data_label", ""),
-                "expression": data_field,
-                "finding_evidence": True
-            })
-    else:
-        # Add a default finding_config template if no mappings present
-        finding_config = [
-            {
-                "title": "",
-                "expression": "",
-                "finding_evidence": True
-            }
-        ]
-    
-    transformed["finding_config"] = finding_config
-
-    transformed["exposure_category"] = "Control Gap"
-    
-    # Transform control_mapping and uppercase all values
-    # Use normalized framework names if available
-    # Exclude nist_csf_v1 and scf_2023_2 from old CEIs
-    # Keep only scf_2023_4 from old CEIs
-    framework_mapping = data.get("framework_mapping", {})
-    control_mapping = {}
-    for framework, values in framework_mapping.items():
-        # Skip nist_csf_v1 from old CEIs
-        if framework == "nist_csf_v1":
-            continue
+            # Use normalized framework name if available, otherwise use original
+            normalized_framework = framework_normalization_map.get(framework) or framework
+            if isinstance(values, list) and uppercase_controls:
+                try:
+                    # Control IDs are almost always all strings, which str.upper maps in C
+                    control_mapping[normalized_framework] = list(map(str.upper, values))
+                except TypeError:
+                    control_mapping[normalized_framework] = [v.upper() if isinstance(v, str) else v for v in values]
+            else:
+                control_mapping[normalized_framework] = values
+        return control_mapping
+    return step
+
+# Built-in rules that fields can name with "rule"
+RULE_COMPILERS = {
+    "assessment_id": _compile_assessment_id_rule,
+    "scope_query": _compile_scope_query_rule,
+    "success_condition": _compile_success_condition_rule,
+    "finding_primary_key": _compile_finding_primary_key_rule,
+    "finding_title": _compile_finding_title_rule,
+    "finding_config": _compile_finding_config_rule,
+    "control_mapping": _compile_control_mapping_rule,
+}
+
+class MigrationPlan:
+    """Migration rules compiled into a flat sequence of (field name, step) pairs
+    
+    Everything that does not depend on the record (exclusions, table names, templates,
+    defaults) is worked out once here; each step is then a plain function of
+    (data, transformed, lookups). Plans pickle as their rules and recompile when loaded,
+    so they can be handed to worker processes.
+    """
+    
+    def __init__(self, rules):
+        self.rules = rules
+        self.excluded_frameworks = frozenset(rules.get("excluded_frameworks", []))
+        self.fingerprint = hashlib.sha256(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()
+        self.steps = []
+        for field in rules["fields"]:
+            if "rule" in field:
+                if field["rule"] not in RULE_COMPILERS:
+                    raise ValueError(f"Unknown migration rule '{field['rule']}' for field '{field['name']}'")
+                step = RULE_COMPILERS[field["rule"]](rules)
+            elif "source" in field:
+                step = _compile_copy_step(field, rules)
+            elif "value" in field:
+                make_value = _constant_factory(field["value"])
+                step = lambda data, transformed, lookups, make_value=make_value: make_value()
+            else:
+                raise ValueError(f"Field '{field['name']}' needs a source, value or rule")
+            self.steps.append((field["name"], step))
+    
+    def __getstate__(self):
+        return {"rules": self.rules}
+    
+    def __setstate__(self, state):
+        self.__init__(state["rules"])
+    
+    def apply(self, data, lookups):
+        """Run every step on one Old CEI; lookups is (finding_title_map, framework_normalization_map, assessment_id_map)"""
+        transformed = {}
+        for name, step in self.steps:
+            transformed[name] = step(data, transformed, lookups)
+        return transformed
+
+# Most recently loaded plan, used by transform_json when no plan is passed
+_current_plan = None
+_plan_key = None
+
+def load_migration_plan(path=None):
+    """Compile the rules in rules_file, or DEFAULT_MIGRATION_RULES if it does not exist
+    
+    The compiled plan is reused while the rules file is unchanged.
+    """
+    global _current_plan, _plan_key
+    path = path or rules_file
+    try:
+        stat = os.stat(path)
+        plan_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        plan_key = None
+    
+    if _current_plan is None or plan_key != _plan_key:
+        if plan_key:
+            with open(path, 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+        else:
+            rules = DEFAULT_MIGRATION_RULES
+        _current_plan = MigrationPlan(rules)
+        _plan_key = plan_key
+    return _current_plan
+
+# Main transformation logic
+def transform_json(data, finding_title_map=None, framework_normalization_map=None, assessment_id_map=None, context=None, plan=None):
+    # A MappingContext supplies all three lookups at once
+    if context is not None:
+        finding_title_map = context.finding_title_map
+        framework_normalization_map = context.framework_normalization_map
+        assessment_id_map = context.assessment_id_map
+    
+    if plan is None:
+        plan = _current_plan or load_migration_plan()
+    return plan.apply(data, (finding_title_map, framework_normalization_map, assessment_id_map))
+
+def _parse_cei_titles(reader):
+    """Index cei_titles.csv rows into finding_title, assessment_id and title lookups"""
+    finding_title_map = {}
+    assessment_id_map = {}
+    title_map = {}
+    for row in reader:
+        # Support both old "id" and new "cei_id" column names for backward compatibility
+        cei_id = row.get("cei_id", row.get("id", ""))
+        if cei_id:
+            finding_title_map[cei_id] = row.get("finding_title", "").strip()
+            assessment_id_map[cei_id] = row.get("assessment_id", "").strip()
+            title_map[cei_id] = row.get("title", "").strip()
+    return finding_title_map, assessment_id_map, title_map
+
+def _parse_frameworks(reader):
+    """Index detected_frameworks.csv rows into the raw row list and the normalization map"""
+    framework_rows = []
+    framework_normalization_map = {}
+    for row in reader:
+        framework = row.get("framework", "")
+        normalized_framework = row.get("normalized_framework", "")
+        framework_rows.append((framework, normalized_framework))
+        if framework and normalized_framework:
+            framework_normalization_map[framework] = normalized_framework
+    return framework_rows, framework_normalization_map
+
+# Parsed CSV lookups keyed by path, reused while the file's mtime and size are unchanged
+_csv_cache = {}
+
+def _load_csv_cached(csv_file, parse):
+    """Parse csv_file with parse, or return the cached result if the file is unchanged
+    
+    Returns None if the file does not exist.
+    """
+    try:
+        stat = os.stat(csv_file)
+    except FileNotFoundError:
+        return None
+    
+    cache_key = (os.path.abspath(csv_file), parse.__name__)
+    file_key = (stat.st_mtime_ns, stat.st_size)
+    cached = _csv_cache.get(cache_key)
+    if cached and cached[0] == file_key:
+        return cached[1]
+    
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        parsed = parse(csv.DictReader(f))
+    _csv_cache[cache_key] = (file_key, parsed)
+    return parsed
+
+class MappingContext:
+    """Lookups parsed from cei_titles.csv and detected_frameworks.csv
+    
+    Each CSV is read at most once per context, and MappingContext.load() reuses
+    the parsed lookups across calls while the files are unchanged on disk.
+    """
+    
+    def __init__(self, cei_titles=None, frameworks=None, cei_titles_path=None, frameworks_path=None):
+        self.cei_titles_path = cei_titles_path or cei_titles_file
+        self.frameworks_path = frameworks_path or frameworks_file
         
-        # Skip scf_2023_2 from old CEIs, but keep scf_2023_4
-        if framework == "scf_2023_2":
-            continue
+        # None means the CSV file does not exist
+        self.has_cei_titles = cei_titles is not None
+        self.has_frameworks = frameworks is not None
         
-        # Use normalized framework name if available, otherwise use original
-        normalized_framework = framework
-        if framework_normalization_map and framework in framework_normalization_map:
-            normalized_framework = framework_normalization_map[framework] if framework_normalization_map[framework] else framework
+        self.finding_title_map, self.assessment_id_map, self.title_map = cei_titles or ({}, {}, {})
+        self.framework_rows, self.framework_normalization_map = frameworks or ([], {})
+    
+    @classmethod
+    def load(cls, cei_titles_path=None, frameworks_path=None):
+        """Build a context from the mapping CSVs, reusing cached parses of unchanged files"""
+        cei_titles_path = cei_titles_path or cei_titles_file
+        frameworks_path = frameworks_path or frameworks_file
+        return cls(
+            _load_csv_cached(cei_titles_path, _parse_cei_titles),
+            _load_csv_cached(frameworks_path, _parse_frameworks),
+            cei_titles_path,
+            frameworks_path,
+        )
+    
+    @classmethod
+    def from_rows(cls, cei_title_rows=None, framework_rows=None):
+        """Build a context from in-memory rows instead of the CSV files
         
-        if isinstance(values, list):
-            control_mapping[normalized_framework] = [v.upper() if isinstance(v, str) else v for v in values]
-        else:
-            control_mapping[normalized_framework] = values
-    transformed["control_mapping"] = control_mapping
-
-    return transformed
+        Rows are dicts with the CSV columns (cei_id, finding_title, assessment_id, title and
+        framework, normalized_framework). None stands for a missing CSV.
+        """
+        return cls(
+            _parse_cei_titles(cei_title_rows) if cei_title_rows is not None else None,
+            _parse_frameworks(framework_rows) if framework_rows is not None else None,
+        )
 
 def load_cei_titles_data():
     """Load all CEI titles data from cei_titles.csv"""
+    context = MappingContext.load()
     cei_data = {}
-    csv_file = "cei_titles.csv"
-    if os.path.exists(csv_file):
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Support both old "id" and new "cei_id" column names for backward compatibility
-                cei_id = row.get("cei_id", row.get("id", ""))
-                if cei_id:
-                    cei_data[cei_id] = {
-                        "finding_title": row.get("finding_title", "").strip(),
-                        "assessment_id": row.get("assessment_id", "").strip(),
-                        "title": row.get("title", "").strip()
-                    }
+    for cei_id, finding_title in context.finding_title_map.items():
+        cei_data[cei_id] = {
+            "finding_title": finding_title,
+            "assessment_id": context.assessment_id_map[cei_id],
+            "title": context.title_map[cei_id]
+        }
     return cei_data
 
 def load_finding_title_map():
     """Load finding_title mappings from cei_titles.csv"""
-    finding_title_map = {}
-    cei_data = load_cei_titles_data()
-    for cei_id, data in cei_data.items():
-        finding_title_map[cei_id] = data["finding_title"]
-    return finding_title_map
+    return dict(MappingContext.load().finding_title_map)
 
 def load_assessment_id_map():
     """Load assessment_id mappings from cei_titles.csv"""
-    assessment_id_map = {}
-    cei_data = load_cei_titles_data()
-    for cei_id, data in cei_data.items():
-        assessment_id_map[cei_id] = data["assessment_id"]
-    return assessment_id_map
+    return dict(MappingContext.load().assessment_id_map)
+
+def normalize_cei_id(cei_id):
+    """Normalize a user-supplied CEI ID (remove .json, ensure CEI- prefix)"""
+    cei_id = cei_id.strip()
+    # Remove .json if present
+    if cei_id.endswith('.json'):
+        cei_id = cei_id[:-5]
+    # Ensure CEI- prefix
+    if not cei_id.startswith('CEI-'):
+        cei_id = f"CEI-{cei_id}"
+    return cei_id
 
-def validate_cei_titles(specific_cei_ids=None):
+def validate_cei_titles(specific_cei_ids=None, context=None):
     """Validate that all CEIs being migrated have finding_title and assessment_id values"""
-    csv_file = "cei_titles.csv"
+    if context is None:
+        context = MappingContext.load()
+    csv_file = context.cei_titles_path
     
-    if not os.path.exists(csv_file):
+    if not context.has_cei_titles:
         print(f"\nError: '{csv_file}' not found. Please run generate_csvs.py first to create it.")
         return False
     
-    # Load all CEI data
-    cei_data = load_cei_titles_data()
+    finding_title_map = context.finding_title_map
+    assessment_id_map = context.assessment_id_map
     
     # Determine which CEIs need to be validated
     if specific_cei_ids:
-        # Normalize specific CEI IDs for matching
-        ceis_to_check = set()
-        for cei_id in specific_cei_ids:
-            cei_id = cei_id.strip()
-            # Remove .json if present
-            if cei_id.endswith('.json'):
-                cei_id = cei_id[:-5]
-            # Ensure CEI- prefix
-            if not cei_id.startswith('CEI-'):
-                cei_id = f"CEI-{cei_id}"
-            ceis_to_check.add(cei_id)
+        ceis_to_check = {normalize_cei_id(cei_id) for cei_id in specific_cei_ids}
     else:
         # Check all CEIs in the CSV
-        ceis_to_check = set(cei_data.keys())
+        ceis_to_check = set(finding_title_map.keys())
     
     missing_finding_titles = []
     missing_assessment_ids = []
     
     for cei_id in ceis_to_check:
-        if cei_id not in cei_data:
+        if cei_id not in finding_title_map:
             print(f"\nError: CEI '{cei_id}' not found in '{csv_file}'. Please add it first.")
             return False
         
-        data = cei_data[cei_id]
-        
         # Check if finding_title is missing
-        if not data["finding_title"]:
+        if not finding_title_map[cei_id]:
             missing_finding_titles.append(cei_id)
         
         # Check if assessment_id is missing
-        if not data["assessment_id"]:
+        if not assessment_id_map[cei_id]:
             missing_assessment_ids.append(cei_id)
     
     # Report errors
@@ -242,35 +516,35 @@ def validate_cei_titles(specific_cei_ids=None):
     
     return True
 
-def validate_framework_normalization():
+def validate_framework_normalization(context=None):
     """Validate that all frameworks in detected_frameworks.csv have normalized_framework values"""
-    frameworks_file = "detected_frameworks.csv"
+    if context is None:
+        context = MappingContext.load()
+    frameworks_file = context.frameworks_path
     missing_normalizations = []
     
     # Frameworks that are excluded from migration and don't need normalized_framework values
-    excluded_frameworks = {"nist_csf_v1", "scf_2023_2"}
+    excluded_frameworks = load_migration_plan().excluded_frameworks
     
-    if not os.path.exists(frameworks_file):
+    if not context.has_frameworks:
         print(f"\nError: '{frameworks_file}' not found. Please run generate_csvs.py first to create it.")
         return False
     
-    with open(frameworks_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            framework = row.get("framework", "").strip()
-            normalized_framework = row.get("normalized_framework", "").strip()
-            
-            # Skip empty rows
-            if not framework:
-                continue
-            
-            # Skip excluded frameworks that don't need normalized_framework values
-            if framework in excluded_frameworks:
-                continue
-            
-            # Check if normalized_framework is missing or empty
-            if not normalized_framework:
-                missing_normalizations.append(framework)
+    for framework, normalized_framework in context.framework_rows:
+        framework = framework.strip()
+        normalized_framework = normalized_framework.strip()
+        
+        # Skip empty rows
+        if not framework:
+            continue
+        
+        # Skip excluded frameworks that don't need normalized_framework values
+        if framework in excluded_frameworks:
+            continue
+        
+        # Check if normalized_framework is missing or empty
+        if not normalized_framework:
+            missing_normalizations.append(framework)
     
     if missing_normalizations:
         print(f"\nError: The following frameworks in '{frameworks_file}' are missing normalized_framework values:")
@@ -283,99 +557,1328 @@ def validate_framework_normalization():
 
 def load_framework_normalization_map():
     """Load framework normalization mappings from detected_frameworks.csv"""
-    framework_normalization_map = {}
-    frameworks_file = "detected_frameworks.csv"
-    if os.path.exists(frameworks_file):
-        with open(frameworks_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                framework = row.get("framework", "")
-                normalized_framework = row.get("normalized_framework", "")
-                if framework and normalized_framework:
-                    framework_normalization_map[framework] = normalized_framework
-    return framework_normalization_map
-
-def migrate_ceis(specific_cei_ids=None):
+    return dict(MappingContext.load().framework_normalization_map)
+
+def mapping_fingerprint(context, cei_code, frameworks):
+    """Fingerprint the rules, cei_titles.csv row, framework normalizations and output style a CEI depends on"""
+    parts = [
+        (_current_plan or load_migration_plan()).fingerprint,
+        cei_code,
+        context.finding_title_map.get(cei_code),
+        context.assessment_id_map.get(cei_code),
+    ]
+    for framework in sorted(frameworks):
+        parts.append([framework, context.framework_normalization_map.get(framework)])
+    if compact_output:
+        # Switching output styles rewrites every output; pretty output keeps existing fingerprints
+        parts.append("compact")
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+def output_filename(transformed_data):
+    """Output filename for a transformed CEI
+    
+    Uses the new id (assessment_id) as the filename, but replaces hyphens with underscores.
+    The id field in JSON remains unchanged (e.g., TP-PR-01).
+    """
+    cei_id = transformed_data.get('id', 'unknown')
+    return f"{cei_id.replace('-', '_')}.json"
+
+def migrate_record(data, context, plan):
+    """Transform one parsed Old CEI in memory
+    
+    Returns a dict with the status ("processed", "invalid" for None, i.e. a source that was
+    not valid JSON, or "failed"), the transformed record, its output filename and, for a
+    failed record, the error. An unexpected error fails only this record.
+    """
+    if data is None:
+        return {"status": "invalid", "record": None, "output": None}
+    try:
+        transformed_data = plan.apply(data, (context.finding_title_map, context.framework_normalization_map,
+                                             context.assessment_id_map))
+        return {"status": "processed", "record": transformed_data, "output": output_filename(transformed_data)}
+    except Exception as error:
+        return {"status": "failed", "record": None, "output": None, "error": f"{type(error).__name__}: {error}"}
+
+def migrate_records(records, context=None, plan=None):
+    """Transform Old CEI dicts lazily, without touching the filesystem
+    
+    The library entry point for callers that already hold CEIs in memory; the folder, stream
+    and watch modes run every record through the same migrate_record. Nothing is read or
+    written: the caller decides what to do with each transformed record.
+    
+    Args:
+        records: Iterable of Old CEI dicts; None items are reported as invalid.
+        context: Optional MappingContext, e.g. from MappingContext.from_rows(). Defaults to
+            empty lookups, which keep cei_code as the id and frameworks unnormalized.
+        plan: Optional MigrationPlan. Defaults to the most recently loaded plan, or the
+            DEFAULT_MIGRATION_RULES if none was loaded.
+    
+    Yields one migrate_record result per record, with its position in records as "index".
+    """
+    if context is None:
+        context = MappingContext()
+    if plan is None:
+        plan = _current_plan or MigrationPlan(DEFAULT_MIGRATION_RULES)
+    for index, data in enumerate(records):
+        result = migrate_record(data, context, plan)
+        result["index"] = index
+        yield result
+
+def migrate_file(filename, context, previous=None, incremental=False, staging_folder=None):
+    """Transform a single CEI file from input_folder and write it to output_folder
+    
+    With a staging_folder, the output is written there instead, for an OutputWriter to publish
+    into output_folder. In incremental mode, previous is the file's manifest entry from the last run. The file is
+    not transformed again when its content and mapping rows are unchanged, and the output is
+    not rewritten when its bytes would be identical.
+    
+    Returns a dict with the filename, the output filename, a status ("processed", "identical",
+    "unchanged", "invalid" or "failed"), the error for a failed file, the file's new manifest
+    entry in incremental mode, the staged file's path, and the per-stage timings, source size
+    and bytes read and written for MigrationMetrics. An unexpected error fails only this file.
+    """
+    job = None
+    try:
+        job = read_stage(filename, context, previous, incremental)
+        transform_stage(job, context, incremental)
+        write_stage(job, incremental, staging_folder)
+    except Exception as error:
+        return failed_result(filename, error, job)
+    return job["result"]
+
+def failed_result(filename, error, job=None):
+    """Mark the result of a file whose migration raised error as failed"""
+    if job is None:
+        result = {"filename": filename, "output": None, "entry": None, "staged": None,
+                  "timings": {}, "size": 0, "bytes_read": 0, "bytes_written": 0}
+    else:
+        result = job["result"]
+    result["status"] = "failed"
+    result["error"] = f"{type(error).__name__}: {error}"
+    result["entry"] = None
+    result["staged"] = None
+    return result
+
+def read_stage(filename, context, previous=None, incremental=False):
+    """First, I/O-bound stage of migrate_file: stat and read the source file
+    
+    Returns the job dict the later stages work on. Its result already has status "unchanged"
+    when the incremental manifest shows there is nothing to do.
+    """
+    timings = {}
+    result = {"filename": filename, "output": None, "status": "invalid", "entry": None, "staged": None,
+              "timings": timings, "size": 0, "bytes_read": 0, "bytes_written": 0}
+    job = {"result": result, "raw": None, "stat": None, "source_hash": None, "output_bytes": None}
+    input_path = os.path.join(input_folder, filename)
+    
+    if incremental:
+        start = time.perf_counter()
+        stat = job["stat"] = os.stat(input_path)
+        result["size"] = stat.st_size
+        if previous and previous["mtime_ns"] == stat.st_mtime_ns and previous["size"] == stat.st_size:
+            source_hash = previous["source_hash"]
+        else:
+            with open(input_path, 'rb') as f:
+                job["raw"] = f.read()
+            source_hash = hashlib.sha256(job["raw"]).hexdigest()
+        job["source_hash"] = source_hash
+        timings["read"] = time.perf_counter() - start
+        
+        # Nothing to do if the source, its mapping rows and the output are all still in place
+        if (previous and previous["source_hash"] == source_hash
+                and previous["mapping_fingerprint"] == mapping_fingerprint(context, previous["cei_code"], previous["frameworks"])
+                and os.path.exists(os.path.join(output_folder, previous["output"]))):
+            result["output"] = previous["output"]
+            result["status"] = "unchanged"
+            result["entry"] = dict(previous, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            return job
+    
+    start = time.perf_counter()
+    if job["raw"] is None:
+        with open(input_path, 'rb') as f:
+            job["raw"] = f.read()
+    result["size"] = result["bytes_read"] = len(job["raw"])
+    timings["read"] = timings.get("read", 0.0) + time.perf_counter() - start
+    return job
+
+def transform_stage(job, context, incremental=False):
+    """Second, CPU-bound stage of migrate_file: parse, transform and serialize the CEI"""
+    result = job["result"]
+    if result["status"] == "unchanged":
+        return
+    timings = result["timings"]
+    raw = job.pop("raw")
+    
+    codec = get_codec(json_codec)
+    
+    parse_start = time.perf_counter()
+    try:
+        original_data = codec.loads(raw)
+    except json.JSONDecodeError:
+        timings["parse"] = time.perf_counter() - parse_start
+        return
+    
+    # Transform structure with mappings
+    transform_start = time.perf_counter()
+    timings["parse"] = transform_start - parse_start
+    record = migrate_record(original_data, context, _current_plan or load_migration_plan())
+    
+    serialize_start = time.perf_counter()
+    timings["transform"] = serialize_start - transform_start
+    if record["status"] == "failed":
+        result["status"] = "failed"
+        result["error"] = record["error"]
+        return
+    result["output"] = record["output"]
+    job["output_bytes"] = codec.dumps(record["record"], compact_output)
+    if catalog_file:
+        result["catalog"] = catalog_entry(record["record"])
+    result["status"] = "processed"
+    timings["serialize"] = time.perf_counter() - serialize_start
+    
+    if incremental:
+        stat = job["stat"]
+        cei_code = original_data.get("cei_code", "")
+        frameworks = list(original_data.get("framework_mapping", {}))
+        result["entry"] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "source_hash": job["source_hash"],
+            "cei_code": cei_code,
+            "frameworks": frameworks,
+            "mapping_fingerprint": mapping_fingerprint(context, cei_code, frameworks),
+            "output": result["output"]
+        }
+
+def write_stage(job, incremental=False, staging_folder=None):
+    """Last, I/O-bound stage of migrate_file: write the output unless it is already up to date
+    
+    The output goes to staging_folder, named after the source file, when one is given, and is
+    flushed to disk there when fsync_outputs is set.
+    """
+    output_bytes = job.pop("output_bytes")
+    if output_bytes is None:
+        return
+    result = job["result"]
+    output_path = os.path.join(output_folder, result["output"])
+    
+    write_start = time.perf_counter()
+    if incremental and _output_matches(output_path, output_bytes):
+        result["status"] = "identical"
+    else:
+        if staging_folder:
+            result["staged"] = os.path.join(staging_folder, result["filename"])
+            write_staged(result["staged"], output_bytes, fsync_outputs)
+        else:
+            with open(output_path, 'wb') as out_f:
+                out_f.write(output_bytes)
+        result["bytes_written"] = len(output_bytes)
+    result["timings"]["write"] = time.perf_counter() - write_start
+
+def _output_matches(output_path, output_bytes):
+    """Check whether output_path already holds exactly output_bytes"""
+    try:
+        if os.path.getsize(output_path) != len(output_bytes):
+            return False
+        with open(output_path, 'rb') as f:
+            return f.read() == output_bytes
+    except OSError:
+        return False
+
+def load_manifest(path=None):
+    """Load the incremental migration manifest, or start a new one
+    
+    A manifest written for different input or output folders is ignored.
+    
+    Args:
+        path: Optional manifest file. Defaults to manifest_file.
+    """
+    path = path or manifest_file
+    manifest = None
+    if os.path.exists(path):
+        try:
+            manifest = get_codec(json_codec).loads(_read_bytes(path))
+        except json.JSONDecodeError:
+            manifest = None
+        if not isinstance(manifest, dict):
+            print(f"Warning: '{path}' is not a valid manifest. Starting a new manifest.")
+            manifest = None
+    if (not manifest or manifest.get("input_folder") != input_folder
+            or manifest.get("output_folder") != output_folder):
+        manifest = {"input_folder": input_folder, "output_folder": output_folder, "files": {}}
+    return manifest
+
+def _read_bytes(path):
+    """Read a whole file as bytes"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+def save_manifest(manifest, path=None):
+    """Write the incremental migration manifest atomically, to manifest_file unless path is given"""
+    dump_file(path or manifest_file, manifest, compact=True, codec=json_codec)
+
+def _read_cei_code(path):
+    """Read the cei_code from a source file, or None if it is not a valid CEI JSON"""
+    try:
+        data = get_codec(json_codec).loads(_read_bytes(path))
+    except ValueError:
+        # Not valid JSON or not UTF-8
+        return None
+    if not isinstance(data, dict):
+        return None
+    return data.get("cei_code", "")
+
+def load_cei_index():
+    """Load the cei_code -> source filename index, or start a new one
+    
+    The index maps each filename in input_folder to [mtime_ns, size, cei_code], along with
+    the folder's own mtime, which changes whenever files are added, removed or renamed.
+    """
+    index = None
+    if os.path.exists(index_file):
+        try:
+            index = get_codec(json_codec).loads(_read_bytes(index_file))
+        except json.JSONDecodeError:
+            index = None
+        if not isinstance(index, dict):
+            index = None
+    if not index or index.get("input_folder") != input_folder:
+        index = {"input_folder": input_folder, "folder_mtime_ns": None, "files": {}}
+    return index
+
+def refresh_cei_index(index):
+    """Bring the index in line with input_folder, re-reading only new or modified files"""
+    # Take the folder mtime before listing so changes made during the scan trigger a later refresh
+    folder_mtime_ns = os.stat(input_folder).st_mtime_ns
+    previous_files = index["files"]
+    files = {}
+    with os.scandir(input_folder) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json"):
+                continue
+            stat = entry.stat()
+            cached = previous_files.get(entry.name)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                files[entry.name] = cached
+            else:
+                files[entry.name] = [stat.st_mtime_ns, stat.st_size, _read_cei_code(entry.path)]
+    index["files"] = files
+    index["folder_mtime_ns"] = folder_mtime_ns
+
+def _lookup_cei_files(index, cei_ids):
+    """Resolve cei_ids to filenames through the index, re-checking only the candidate files
+    
+    A file matches when its cei_code is the ID or, as before the index existed, when it is
+    named <ID>.json. Returns (filenames, missing_ids).
+    """
+    files = index["files"]
+    filenames_by_code = {}
+    for filename, (_, _, cei_code) in files.items():
+        filenames_by_code.setdefault(cei_code, []).append(filename)
+    
+    filenames = []
+    missing_ids = []
+    for cei_id in cei_ids:
+        candidates = list(filenames_by_code.get(cei_id, []))
+        if f"{cei_id}.json" in files and f"{cei_id}.json" not in candidates:
+            candidates.append(f"{cei_id}.json")
+        
+        matched = False
+        for filename in candidates:
+            path = os.path.join(input_folder, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entry = files[filename]
+            if entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+                entry[:] = [stat.st_mtime_ns, stat.st_size, _read_cei_code(path)]
+            if entry[2] == cei_id or filename == f"{cei_id}.json":
+                matched = True
+                if filename not in filenames:
+                    filenames.append(filename)
+        if not matched:
+            missing_ids.append(cei_id)
+    return filenames, missing_ids
+
+def find_cei_files(cei_ids):
+    """Locate the source files for cei_ids without scanning input_folder when possible
+    
+    The persistent index is refreshed only when the folder's mtime shows files were added,
+    removed or renamed, or when an ID cannot be found (its file may have been edited).
+    Returns (filenames, missing_ids).
+    """
+    index = load_cei_index()
+    refreshed = False
+    if index["folder_mtime_ns"] != os.stat(input_folder).st_mtime_ns:
+        refresh_cei_index(index)
+        refreshed = True
+    
+    filenames, missing_ids = _lookup_cei_files(index, cei_ids)
+    if missing_ids and not refreshed:
+        refresh_cei_index(index)
+        more_filenames, missing_ids = _lookup_cei_files(index, missing_ids)
+        filenames.extend(f for f in more_filenames if f not in filenames)
+    
+    save_cei_index(index)
+    return filenames, missing_ids
+
+def save_cei_index(index):
+    """Write the cei_code index atomically"""
+    dump_file(index_file, index, compact=True, codec=json_codec)
+
+def catalog_result(catalog, result):
+    """Bring the catalog in line with a migrate_file result whose output, if any, is in place"""
+    filename = result["filename"]
+    if result["status"] not in ("processed", "identical", "unchanged"):
+        # Invalid, failed and colliding sources produce nothing this run
+        catalog.remove(filename)
+    elif result.get("catalog"):
+        catalog.add(filename, result["output"], result["catalog"])
+    elif not catalog.contains(filename, result["output"]):
+        # Not transformed this run and missing from the catalog, e.g. migrated before it existed
+        with open(os.path.join(output_folder, result["output"]), 'rb') as f:
+            catalog.add(filename, result["output"], catalog_entry(get_codec(json_codec).loads(f.read())))
+
+# MappingContext and OutputWriter staging folder of each worker process, set once by _init_worker
+_worker_context = None
+_staging_folder = None
+# Tenant name -> MappingContext in the workers of a pool shared by a batch of tenants
+_worker_contexts = {}
+
+def _init_worker(context, settings, contexts=None):
+    """Receive the mapping context, or every tenant's, and module settings once per worker process"""
+    global _worker_context, _worker_contexts
+    _worker_context = context
+    _worker_contexts = contexts or {}
+    globals().update(settings)
+
+def _migrate_chunk(items, settings=None):
+    """Migrate a chunk of (filename, previous manifest entry) items inside a worker process
+    
+    In a pool shared by a batch of tenants, each task brings its tenant's module settings.
+    """
+    context = _worker_context
+    if settings is not None:
+        settings = dict(settings)
+        context = _worker_contexts[settings.pop("_tenant")]
+        globals().update(settings)
+    return [migrate_file(filename, context, previous, incremental, _staging_folder)
+            for filename, previous in items]
+
+def pool_chunks(items, workers):
+    """Split items into consecutive chunks, chunks_per_worker per worker, one pool task each"""
+    chunk_size = max(1, -(-len(items) // (workers * chunks_per_worker)))
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+def migrate_files_parallel(items, workers, context, incremental=False, staging_folder=None, pool=None):
+    """Migrate (filename, previous manifest entry) items across a pool of worker processes
+    
+    The item list is split into chunks so each task carries many files, and the mapping
+    context is handed to every worker once through the pool initializer. Results are
+    yielded in the same order as items, matching the serial path.
+    
+    Args:
+        pool: Optional (executor, tenant) of a worker pool shared by a batch of tenants, see
+            migrate_tenants. Its workers already hold every tenant's mapping context; the
+            module settings are sent with each task instead of through the initializer.
+    """
+    chunks = pool_chunks(items, workers)
+    settings = {"input_folder": input_folder, "output_folder": output_folder, "incremental": incremental,
+                "json_codec": json_codec, "compact_output": compact_output, "_current_plan": _current_plan,
+                "catalog_file": catalog_file, "fsync_outputs": fsync_outputs, "_staging_folder": staging_folder}
+    if pool:
+        executor, tenant = pool
+        settings["_tenant"] = tenant
+        for chunk_results in executor.map(_migrate_chunk, chunks, itertools.repeat(settings)):
+            yield from chunk_results
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(context, settings)) as executor:
+        for chunk_results in executor.map(_migrate_chunk, chunks):
+            yield from chunk_results
+
+def migrate_files_overlapped(items, context, incremental=False, threads=None, depth=None, staging_folder=None):
+    """Migrate (filename, previous manifest entry) items with file I/O overlapped with transforms
+    
+    Reader threads prefetch up to depth sources ahead of transform_json, which runs on the
+    calling thread, and writer threads drain up to depth outputs behind it, so at most
+    2 * depth files are held in memory. Results are yielded in the same order as items,
+    matching the serial path; outputs are staged for an OutputWriter to publish in that order.
+    """
+    if threads is None:
+        threads = io_threads
+    if depth is None:
+        depth = io_queue_depth
+    depth = max(1, depth)
+    items = iter(items)
+    reads = collections.deque()
+    writes = collections.deque()
+    
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="cei-read") as readers, \
+            ThreadPoolExecutor(max_workers=threads, thread_name_prefix="cei-write") as writers:
+        def prefetch():
+            while len(reads) < depth:
+                item = next(items, None)
+                if item is None:
+                    break
+                filename, previous = item
+                reads.append((filename, readers.submit(read_stage, filename, context, previous, incremental)))
+        
+        def finish(future, job):
+            """Result of a queued write; a file that already failed has no write future"""
+            if future is not None:
+                try:
+                    future.result()
+                except Exception as error:
+                    return failed_result(job["result"]["filename"], error, job)
+            return job["result"]
+        
+        prefetch()
+        while reads:
+            filename, read = reads.popleft()
+            prefetch()
+            job = None
+            try:
+                job = read.result()
+                transform_stage(job, context, incremental)
+            except Exception as error:
+                writes.append((None, {"result": failed_result(filename, error, job)}))
+            else:
+                writes.append((writers.submit(write_stage, job, incremental, staging_folder), job))
+            
+            # Hand back finished results in order, and block once depth writes are queued
+            while writes and (writes[0][0] is None or writes[0][0].done() or len(writes) >= depth):
+                yield finish(*writes.popleft())
+        
+        for future, job in writes:
+            yield finish(future, job)
+
+def migrate_ceis(specific_cei_ids=None, workers=None, incremental=None, verbose=None, metrics=None, io_threads=None,
+                 journal=None, resume=False, shard=None, pool=None):
     """Migrate CEIs from Old CEIs to New CEIs with CSV mappings
     
     Args:
         specific_cei_ids: Optional list of CEI IDs to migrate. If None, migrates all CEIs.
+        workers: Optional number of worker processes. Defaults to worker_count; 1 runs serially.
+        incremental: Optional flag to only migrate CEIs whose source or mapping rows changed
+            since the last run, as recorded in manifest_file. Defaults to the module setting.
+        verbose: Optional flag to print a line per migrated file. Defaults to the module setting.
+        metrics: Optional flag to collect stage timings and print a summary, or a path to also
+            write them to as JSON. Defaults to collect_metrics and metrics_file.
+        io_threads: Optional number of reader and writer threads that overlap file I/O with
+            transforms when running in a single process. Defaults to the module setting; 0 is off.
+        journal: Optional flag to checkpoint finished files in journal_file as outputs are
+            published. Defaults to the module setting journaled.
+        resume: Continue the interrupted run recorded in journal_file, skipping the files it
+            finished; the final counts cover the whole run. Implies journal.
+        shard: Optional (index, count) to migrate only the source files shard_of assigns to this
+            shard. The shard keeps its own manifest, journal and catalog and writes its partial
+            results for merge_shard_results; shards may run side by side on one output folder.
+        pool: Optional (executor, tenant) of the worker pool migrate_tenants shares between
+            tenants, used instead of starting a pool when workers > 1.
+    
+    Returns the number of source files per status, or None if the run did not start.
     """
+    if verbose is None:
+        verbose = globals()["verbose"]
+    if metrics is None:
+        metrics = collect_metrics
+    metrics_path = metrics if isinstance(metrics, str) else metrics_file
+    run_metrics = MigrationMetrics() if metrics else None
+    # Stage timer that does nothing when metrics are off
+    stage = run_metrics.stage if run_metrics else (lambda name: contextlib.nullcontext())
+    
     if specific_cei_ids:
         print(f"\nMigrating specific CEIs: {', '.join(specific_cei_ids)}")
     else:
         print("\nMigrating all CEIs from Old CEIs to New CEIs...")
+    if shard:
+        print(f"Shard {shard[0]} of {shard[1]}")
     
-    # Validate framework normalization before proceeding
-    if not validate_framework_normalization():
-        return
+    # Load mappings from CSV files once; validation and transformation share them
+    with stage("csv_load"):
+        context = MappingContext.load()
+        load_migration_plan()
     
-    # Validate CEI titles (finding_title and assessment_id) before proceeding
-    if not validate_cei_titles(specific_cei_ids):
-        return
+    with stage("validation"):
+        # Validate framework normalization before proceeding
+        if not validate_framework_normalization(context):
+            return
+        
+        # Validate CEI titles (finding_title and assessment_id) before proceeding
+        if not validate_cei_titles(specific_cei_ids, context):
+            return
+    
+    if context.finding_title_map:
+        print(f"Loaded {len(context.finding_title_map)} finding_title mappings from {context.cei_titles_path}")
+    if context.framework_normalization_map:
+        print(f"Loaded {len(context.framework_normalization_map)} framework normalizations from {context.frameworks_path}")
+    if context.assessment_id_map:
+        print(f"Loaded {len(context.assessment_id_map)} assessment_id mappings from {context.cei_titles_path}")
     
-    # Load mappings from CSV files
-    finding_title_map = load_finding_title_map()
-    framework_normalization_map = load_framework_normalization_map()
-    assessment_id_map = load_assessment_id_map()
+    if workers is None:
+        workers = worker_count
+    if incremental is None:
+        incremental = globals()["incremental"]
+    if io_threads is None:
+        io_threads = globals()["io_threads"]
+    journal_run = resume or (journaled if journal is None else journal)
+    # Each shard keeps its own state files
+    manifest_path = shard_path(manifest_file, shard)
+    journal_path = shard_path(journal_file, shard)
+    catalog_path = shard_path(catalog_file, shard) if catalog_file else None
     
-    if finding_title_map:
-        print(f"Loaded {len(finding_title_map)} finding_title mappings from cei_titles.csv")
-    if framework_normalization_map:
-        print(f"Loaded {len(framework_normalization_map)} framework normalizations from detected_frameworks.csv")
-    if assessment_id_map:
-        print(f"Loaded {len(assessment_id_map)} assessment_id mappings from cei_titles.csv")
+    with stage("manifest"):
+        manifest = load_manifest(manifest_path) if incremental else None
+        previous_entries = manifest["files"] if manifest else {}
+    
+    missing_ids = []
+    with stage("listing"):
+        if specific_cei_ids:
+            # Normalize specific CEI IDs for matching (remove .json, ensure CEI- prefix)
+            target_ids = []
+            for cei_id in specific_cei_ids:
+                cei_id = normalize_cei_id(cei_id)
+                if cei_id not in target_ids:
+                    target_ids.append(cei_id)
+            # Open only the requested files, located through the cei_code index
+            filenames, missing_ids = find_cei_files(target_ids)
+        else:
+            # Sorted like watch mode and the shard merge, so every mode keeps the same source on a collision
+            filenames = sorted(filename for filename in os.listdir(input_folder) if filename.endswith(".json"))
+        if shard:
+            filenames = select_shard(filenames, shard)
+    # Statuses of every file in the logical run, including those finished before a resume
+    counts = collections.Counter()
+    done = {}
+    journal = None
+    if journal_run:
+        run = {"input_folder": input_folder, "output_folder": output_folder, "incremental": incremental,
+               "cei_ids": target_ids if specific_cei_ids else None}
+        if shard:
+            run["shard"] = list(shard)
+        previous_run = read_journal(journal_path) if resume else None
+        if resume and previous_run is None:
+            print(f"No journal found at '{journal_path}'. Starting a new run.")
+            resume = False
+        elif resume:
+            journaled_run, done, complete = previous_run
+            if journaled_run != run:
+                print(f"\nError: '{journal_path}' records a different run ({journaled_run}). Run without --resume to start over.")
+                return
+            if complete:
+                print(f"\nThe run recorded in '{journal_path}' already completed. Nothing to resume.")
+                return
+            print(f"Resuming: {len(done)} CEI file(s) were already finished by the interrupted run.")
+            for filename, record in done.items():
+                counts[record["status"]] += 1
+                if manifest is not None:
+                    if record.get("entry"):
+                        previous_entries[filename] = record["entry"]
+                    else:
+                        previous_entries.pop(filename, None)
+        journal = RunJournal(journal_path, run, resume)
+    items = [(filename, previous_entries.get(filename)) for filename in filenames if filename not in done]
     
-    # Normalize specific CEI IDs for matching (remove .json, ensure CEI- prefix)
-    target_filenames = set()
+    claims = {}
     if specific_cei_ids:
-        for cei_id in specific_cei_ids:
-            cei_id = cei_id.strip()
-            # Remove .json if present
-            if cei_id.endswith('.json'):
-                cei_id = cei_id[:-5]
-            # Ensure CEI- prefix
-            if not cei_id.startswith('CEI-'):
-                cei_id = f"CEI-{cei_id}"
-            target_filenames.add(f"{cei_id}.json")
-    
-    processed_count = 0
-    skipped_count = 0
-    for filename in os.listdir(input_folder):
-        if filename.endswith(".json"):
-            # Skip if specific CEIs requested and this file is not in the list
-            if specific_cei_ids and filename not in target_filenames:
+        # Outputs of sources not migrated this time stay claimed, so a targeted run cannot overwrite them
+        targets = set(filenames)
+        claims = {entry["output"]: filename for filename, entry in previous_entries.items() if filename not in targets}
+    for filename, record in done.items():
+        if record["status"] in ("processed", "identical", "unchanged"):
+            claims[record["output"]] = filename
+    
+    catalog = MigrationCatalog(catalog_path, output_folder) if catalog_path else None
+    if catalog:
+        # The catalog is committed once per run, so an interrupted run may not have catalogued these
+        for filename, record in done.items():
+            catalog_result(catalog, {"filename": filename, "output": record["output"], "status": record["status"]})
+    # Source -> [output, status, error] of every file in the logical run, for the shard's partial results
+    shard_files = {filename: [record["output"], record["status"], record.get("error")] for filename, record in done.items()} \
+        if shard else None
+    
+    def published(batch):
+        """Catalog and checkpoint a batch of outputs right after it is published"""
+        if catalog:
+            for result in batch:
+                catalog_result(catalog, result)
+        if journal:
+            for result in batch:
+                journal.add(result)
+            journal.commit()
+    writer = OutputWriter(output_folder, publish_batch_size, fsync_outputs, claims,
+                          published if catalog or journal else None)
+    
+    if workers > 1 and len(items) > 1:
+        results = migrate_files_parallel(items, workers, context, incremental, writer.staging_folder, pool)
+    elif io_threads > 0 and len(items) > 1:
+        results = migrate_files_overlapped(items, context, incremental, io_threads, staging_folder=writer.staging_folder)
+    else:
+        results = (migrate_file(filename, context, previous, incremental, writer.staging_folder)
+                   for filename, previous in items)
+    
+    try:
+        with writer:
+            for result in results:
+                filename = result["filename"]
+                staged = result["staged"]
+                writer.publish(result)
+                status = result["status"]
+                counts[status] += 1
+                if not staged or status == "collision":
+                    # Nothing to publish; checkpointed with the next batch
+                    if catalog:
+                        catalog_result(catalog, result)
+                    if journal:
+                        journal.add(result)
+                if run_metrics:
+                    run_metrics.record_file(result)
+                if shard_files is not None:
+                    shard_files[filename] = [result["output"], status, result.get("error")]
+                if status == "invalid":
+                    print(f"Skipping invalid JSON: {filename}")
+                elif status == "failed":
+                    print(f"Failed: {filename}: {result['error']}")
+                elif status == "collision":
+                    print(f"Collision: {filename} -> {result['output']} is already produced by {writer.claims[result['output']]}; not written")
+                elif status != "unchanged" and verbose:
+                    print(f"Processed: {filename} -> {result['output']}")
+                
+                if manifest is not None:
+                    if result["entry"]:
+                        previous_entries[filename] = result["entry"]
+                    else:
+                        previous_entries.pop(filename, None)
+        if run_metrics:
+            run_metrics.add_stage("publish", writer.publish_seconds)
+        
+        removed = []
+        if manifest is not None:
+            with stage("manifest"):
+                if not specific_cei_ids:
+                    removed = drop_removed_sources(manifest, set(filenames))
+                    if not shard:
+                        # Other shards' outputs share the folder; the merge reports orphans instead
+                        report_stale_outputs(removed, {entry["output"] for entry in previous_entries.values()})
+                save_manifest(manifest, manifest_path)
+        if catalog and not specific_cei_ids:
+            # Removed sources no longer produce anything
+            catalog.retain(filenames)
+    except BaseException:
+        # Keep everything checkpointed so far for --resume
+        if catalog:
+            catalog.close()
+        if journal:
+            journal.close()
+        raise
+    if catalog:
+        catalog.close()
+    if journal:
+        journal.close(complete=True)
+    
+    print_migration_summary(counts, incremental, missing_ids, journal_path if journal else None)
+    if shard:
+        errors = []
+        outputs = {}
+        for filename, (output, status, error) in sorted(shard_files.items()):
+            if status in ("processed", "identical", "unchanged"):
+                outputs[filename] = [output, status]
+            elif status == "collision":
+                errors.append({"source": filename, "status": status, "output": output, "owner": writer.claims[output]})
+            else:
+                errors.append({"source": filename, "status": status, "error": error})
+        path = write_partial("migrate", shard, {
+            "run": {"input_folder": input_folder, "output_folder": output_folder, "incremental": incremental,
+                    "cei_ids": target_ids if specific_cei_ids else None},
+            "counts": dict(counts), "missing_ids": missing_ids, "outputs": outputs, "errors": errors,
+            "removed": removed, "catalog": catalog_path
+        })
+        print(f"Shard results saved to '{path}'")
+    
+    if run_metrics:
+        run_metrics.finish()
+        run_metrics.print_summary()
+        if metrics_path:
+            run_metrics.write_json(metrics_path)
+            print(f"\nMetrics saved to '{metrics_path}'")
+    return counts
+
+def print_migration_summary(counts, incremental, missing_ids=None, journal_path=None):
+    """Print the end-of-run summary of migrate_ceis from its status counts
+    
+    Args:
+        counts: Number of source files per migrate_file status.
+        incremental: Whether the run was incremental.
+        missing_ids: Optional requested CEI IDs that no source file has.
+        journal_path: Journal the failures are recorded in, if the run was journaled.
+    """
+    if missing_ids:
+        print(f"\nWarning: {len(missing_ids)} CEI(s) not found in '{input_folder}': {', '.join(missing_ids)}")
+    
+    print(f"\nMigration complete! Processed {counts['processed'] + counts['identical']} CEI file(s).")
+    if incremental:
+        print(f"Skipped {counts['unchanged']} unchanged CEI file(s); {counts['identical']} processed output(s) were already up to date.")
+    if counts["invalid"] > 0:
+        print(f"Skipped {counts['invalid']} invalid file(s).")
+    if counts["collision"] > 0:
+        print(f"Skipped {counts['collision']} CEI file(s) whose output filename another CEI already produces.")
+    if counts["failed"] > 0:
+        print(f"Failed to migrate {counts['failed']} CEI file(s)" + (f"; errors are recorded in '{journal_path}'." if journal_path else "."))
+
+def drop_removed_sources(manifest, current_filenames):
+    """Drop manifest entries for sources no longer in input_folder; returns [source, output] pairs, sorted"""
+    entries = manifest["files"]
+    return [[filename, entries.pop(filename)["output"]]
+            for filename in sorted(filename for filename in entries if filename not in current_filenames)]
+
+def report_stale_outputs(removed, expected_outputs):
+    """Report removed sources and the outputs in output_folder that no source produces
+    
+    Args:
+        removed: [source, output] pairs dropped by drop_removed_sources.
+        expected_outputs: Output filenames the remaining sources produce.
+    """
+    for filename, output in removed:
+        print(f"Removed source: {filename} (output {output} left in place)")
+    
+    orphaned = sorted(
+        filename for filename in os.listdir(output_folder)
+        if filename.endswith(".json") and filename not in expected_outputs
+    )
+    for filename in orphaned:
+        print(f"Orphaned output: {filename}")
+    
+    if removed or orphaned:
+        print(f"\n{len(removed)} removed source(s), {len(orphaned)} orphaned output(s) in {output_folder}.")
+
+def merge_shard_results(folder=None):
+    """Combine the partial results of a sharded migration into what a single-node run reports
+    
+    Every shard of the run must have finished. Two sources in different shards producing the
+    same output are a collision as in a single-node run: the source that sorts first keeps the
+    output, which is migrated again if the other source may have overwritten it, and the other
+    is counted and reported as a collision. The shard catalogs are merged into catalog_file.
+    
+    Args:
+        folder: Optional folder with the shards' partial results. Defaults to results_folder.
+    """
+    try:
+        partials = read_partials("migrate", folder)
+    except (OSError, ValueError) as e:
+        print(f"\nError: {e}")
+        return False
+    run = partials[0]["run"]
+    if any(partial["run"] != run for partial in partials):
+        print("\nError: the shard results describe different runs; run every shard with the same options.")
+        return False
+    print(f"\nMerging the results of {len(partials)} shard(s)...")
+    
+    counts = collections.Counter()
+    errors = []
+    missing_ids = []
+    removed = []
+    # Output filename -> sources producing it, in source order
+    producers = collections.defaultdict(list)
+    for partial in partials:
+        counts.update(partial["counts"])
+        errors.extend(partial["errors"])
+        missing_ids.extend(cei_id for cei_id in partial["missing_ids"] if cei_id not in missing_ids)
+        removed.extend(partial["removed"])
+        for source, (output, status) in partial["outputs"].items():
+            producers[output].append((source, status))
+    
+    losers = set()
+    stale_owners = []
+    for output, sources in producers.items():
+        if len(sources) < 2:
+            continue
+        sources.sort()
+        owner = sources[0][0]
+        for source, status in sources[1:]:
+            counts[status] -= 1
+            counts["collision"] += 1
+            losers.add(source)
+            errors.append({"source": source, "status": "collision", "output": output, "owner": owner})
+        if any(status == "processed" for _, status in sources[1:]):
+            # Shards publish independently, so the output may hold the other source's CEI
+            stale_owners.append(owner)
+    
+    for error in sorted(errors, key=lambda error: error["source"]):
+        if error["status"] == "invalid":
+            print(f"Skipping invalid JSON: {error['source']}")
+        elif error["status"] == "failed":
+            print(f"Failed: {error['source']}: {error['error']}")
+        else:
+            print(f"Collision: {error['source']} -> {error['output']} is already produced by {error['owner']}; not written")
+    
+    if stale_owners:
+        context = MappingContext.load()
+        load_migration_plan()
+        with OutputWriter(output_folder, publish_batch_size, fsync_outputs) as writer:
+            for filename in sorted(stale_owners):
+                result = migrate_file(filename, context, staging_folder=writer.staging_folder)
+                writer.publish(result)
+                if result["status"] == "failed":
+                    print(f"Failed: {filename}: {result['error']}")
+    
+    if run["incremental"] and not run["cei_ids"]:
+        report_stale_outputs(sorted(removed), set(producers))
+    
+    if catalog_file:
+        with MigrationCatalog(catalog_file, output_folder) as catalog:
+            sources = set()
+            for partial in partials:
+                shard_catalog = open_catalog(partial["catalog"]) if partial["catalog"] else None
+                if shard_catalog is None:
+                    continue
+                with shard_catalog:
+                    for source, output, entry in shard_catalog.entries():
+                        if source not in losers:
+                            catalog.add(source, output, entry)
+                            sources.add(source)
+            for error in errors:
+                catalog.remove(error["source"])
+            if not run["cei_ids"]:
+                catalog.retain(sources)
+    
+    print_migration_summary(counts, run["incremental"], missing_ids)
+    return True
+
+def tenant_settings(tenant):
+    """Context manager that points the module settings at a tenant's folders, CSVs, rules and state files"""
+    return override_settings(globals(), {key: tenant[key] for key in TENANT_SETTING_KEYS if key in tenant})
+
+def migrate_tenants(tenants_path, workers=None, incremental=None, verbose=None, io_threads=None, journal=None,
+                    resume=False):
+    """Migrate every tenant of a tenant manifest in one run
+    
+    Tenants have their own input and output folders, mapping CSVs and state files (see
+    tenants.load_tenants) and are migrated one after another by migrate_ceis, sharing one
+    worker pool and the parsed CSV and migration plan caches. A tenant whose mappings are
+    invalid or whose run fails is reported and the next tenant still runs.
+    
+    Args:
+        tenants_path: Tenant manifest JSON file.
+        workers, incremental, verbose, io_threads, journal, resume: As for migrate_ceis,
+            applied to every tenant.
+    
+    Returns True if every tenant was migrated.
+    """
+    tenants = load_tenants(tenants_path)
+    if tenants is None:
+        return False
+    if workers is None:
+        workers = worker_count
+    print(f"\nMigrating {len(tenants)} tenant(s) from '{tenants_path}'...")
+    
+    # Every worker of the shared pool gets each tenant's mapping context once
+    contexts = {}
+    outcomes = {}
+    for tenant in tenants:
+        try:
+            with tenant_settings(tenant):
+                contexts[tenant["name"]] = MappingContext.load()
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            outcomes[tenant["name"]] = f"failed: cannot read mapping CSVs: {e}"
+    
+    def start_pool():
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(None, {}, contexts)) if workers > 1 else None
+    executor = start_pool()
+    try:
+        for tenant in tenants:
+            name = tenant["name"]
+            print("\n" + "="*50)
+            print(f"Tenant: {name}")
+            print("="*50)
+            if name in outcomes:
+                print(f"\nError: tenant '{name}' {outcomes[name]}")
                 continue
-            
-            with open(os.path.join(input_folder, filename), 'r', encoding='utf-8') as f:
-                try:
-                    original_data = json.load(f)
+            try:
+                os.makedirs(tenant["output_folder"], exist_ok=True)
+                os.makedirs(tenant["state_folder"], exist_ok=True)
+                with tenant_settings(tenant):
+                    counts = migrate_ceis(workers=workers, incremental=incremental, verbose=verbose, io_threads=io_threads,
+                                          journal=journal, resume=resume, pool=(executor, name) if executor else None)
+                outcomes[name] = counts if counts is not None else "not migrated; see above"
+            except Exception as e:
+                print(f"\nError: tenant '{name}' failed: {type(e).__name__}: {e}")
+                outcomes[name] = f"failed: {type(e).__name__}: {e}"
+                if isinstance(e, BrokenProcessPool):
+                    # A worker died; the remaining tenants get a fresh pool
+                    executor.shutdown()
+                    executor = start_pool()
+    finally:
+        if executor:
+            executor.shutdown()
+    
+    print("\n" + "="*50)
+    print(f"Batch complete: {len(tenants)} tenant(s)")
+    print("="*50)
+    for tenant in tenants:
+        outcome = outcomes[tenant["name"]]
+        if isinstance(outcome, str):
+            print(f"{tenant['name']}: {outcome}")
+        else:
+            print(f"{tenant['name']}: {outcome['processed'] + outcome['identical']} processed, {outcome['unchanged']} unchanged, "
+                  f"{outcome['invalid']} invalid, {outcome['collision']} collision(s), {outcome['failed']} failed")
+    return not any(isinstance(outcome, str) for outcome in outcomes.values())
 
-                    # Transform structure with mappings
-                    transformed_data = transform_json(original_data, finding_title_map, framework_normalization_map, assessment_id_map)
+def _scan_input_folder():
+    """Map each .json file in input_folder to its (mtime_ns, size)"""
+    snapshot = {}
+    with os.scandir(input_folder) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
 
-                    # Use the new id (assessment_id) as the filename, but replace hyphens with underscores for filename
-                    # The id field in JSON remains unchanged (e.g., TP-PR-01)
-                    cei_id = transformed_data.get('id', 'unknown')
-                    new_filename = f"{cei_id.replace('-', '_')}.json"
-                    output_path = os.path.join(output_folder, new_filename)
-                    with open(output_path, 'w', encoding='utf-8') as out_f:
-                        json.dump(transformed_data, out_f, indent=2)
+def _csv_stats(context):
+    """(mtime_ns, size) of both mapping CSVs, or None for a missing file"""
+    stats = []
+    for path in (context.cei_titles_path, context.frameworks_path):
+        try:
+            stat = os.stat(path)
+            stats.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stats.append(None)
+    return stats
 
-                    print(f"Processed: {filename} -> {new_filename}")
-                    processed_count += 1
+def changed_mapping_keys(old_context, new_context):
+    """CEI IDs whose cei_titles.csv row and frameworks whose normalization differ between contexts"""
+    changed_ids = set()
+    for cei_id in old_context.finding_title_map.keys() | new_context.finding_title_map.keys():
+        if (old_context.finding_title_map.get(cei_id) != new_context.finding_title_map.get(cei_id)
+                or old_context.assessment_id_map.get(cei_id) != new_context.assessment_id_map.get(cei_id)):
+            changed_ids.add(cei_id)
+    
+    old_map = old_context.framework_normalization_map
+    new_map = new_context.framework_normalization_map
+    changed_frameworks = {framework for framework in old_map.keys() | new_map.keys()
+                          if old_map.get(framework) != new_map.get(framework)}
+    return changed_ids, changed_frameworks
 
-                except json.JSONDecodeError:
+def watch_ceis(interval=None):
+    """Keep mappings in memory and re-migrate CEIs as their sources or CSV rows change
+    
+    Polls input_folder and both CSVs every interval seconds. Added or modified sources are
+    migrated again, deleted sources are reported, and a CSV edit re-migrates only the CEIs
+    whose cei_titles.csv row or framework normalizations changed. State is kept in the
+    incremental manifest, so restarting the watcher does not reprocess unchanged CEIs.
+    Stop with Ctrl+C.
+    """
+    if interval is None:
+        interval = watch_interval
+    
+    print(f"\nWatching '{input_folder}' and the mapping CSVs for changes (Ctrl+C to stop)...")
+    context = MappingContext.load()
+    if not validate_framework_normalization(context) or not validate_cei_titles(context=context):
+        return
+    
+    manifest = load_manifest()
+    entries = manifest["files"]
+    catalog = MigrationCatalog(catalog_file, output_folder) if catalog_file else None
+    
+    def migrate_batch(filenames):
+        """Migrate filenames incrementally and record their new manifest entries"""
+        start = time.perf_counter()
+        processed_count = 0
+        batch = set(filenames)
+        claims = {entry["output"]: filename for filename, entry in entries.items() if filename not in batch}
+        results = []
+        with OutputWriter(output_folder, publish_batch_size, fsync_outputs, claims) as writer:
+            for filename in filenames:
+                result = migrate_file(filename, context, entries.get(filename), True, writer.staging_folder)
+                if result["status"] == "failed" and not os.path.exists(os.path.join(input_folder, filename)):
+                    # Deleted between the scan and the migration; the next poll reports it
+                    continue
+                writer.publish(result)
+                results.append(result)
+                if result["status"] == "invalid":
                     print(f"Skipping invalid JSON: {filename}")
+                    entries.pop(filename, None)
+                elif result["status"] == "failed":
+                    print(f"Failed: {filename}: {result['error']}")
+                    entries.pop(filename, None)
+                elif result["status"] == "collision":
+                    print(f"Collision: {filename} -> {result['output']} is already produced by {writer.claims[result['output']]}; not written")
+                    entries.pop(filename, None)
+                elif result["status"] != "unchanged":
+                    print(f"Processed: {filename} -> {result['output']}")
+                    processed_count += 1
+                if result["entry"]:
+                    entries[filename] = result["entry"]
+        if catalog:
+            # Every output of the batch is published once the writer is closed
+            for result in results:
+                catalog_result(catalog, result)
+            catalog.commit()
+        save_manifest(manifest)
+        if processed_count:
+            print(f"Re-migrated {processed_count} CEI file(s) in {(time.perf_counter() - start) * 1000:.0f} ms")
+    
+    # Catch up with anything that changed while the watcher was not running
+    snapshot = _scan_input_folder()
+    for filename in [filename for filename in entries if filename not in snapshot]:
+        print(f"Removed source: {filename} (output {entries.pop(filename)['output']} left in place)")
+    if catalog:
+        catalog.retain(snapshot)
+    migrate_batch(sorted(snapshot))
+    csv_stats = _csv_stats(context)
+    
+    try:
+        while True:
+            time.sleep(interval)
+            affected = set()
+            
+            current_csv_stats = _csv_stats(context)
+            if current_csv_stats != csv_stats:
+                csv_stats = current_csv_stats
+                new_context = MappingContext.load(context.cei_titles_path, context.frameworks_path)
+                if validate_framework_normalization(new_context) and validate_cei_titles(context=new_context):
+                    changed_ids, changed_frameworks = changed_mapping_keys(context, new_context)
+                    context = new_context
+                    for filename, entry in entries.items():
+                        if entry["cei_code"] in changed_ids or not changed_frameworks.isdisjoint(entry["frameworks"]):
+                            affected.add(filename)
+                    print(f"\nMapping CSVs changed: {len(changed_ids)} CEI row(s), "
+                          f"{len(changed_frameworks)} framework(s), {len(affected)} CEI file(s) affected")
+                else:
+                    print("Keeping the previous mappings until the CSVs are valid again.")
+            
+            current_snapshot = _scan_input_folder()
+            for filename in snapshot.keys() - current_snapshot.keys():
+                entry = entries.pop(filename, None)
+                affected.discard(filename)
+                if catalog:
+                    catalog.remove(filename)
+                if entry:
+                    print(f"Removed source: {filename} (output {entry['output']} left in place)")
+            for filename, stat in current_snapshot.items():
+                if snapshot.get(filename) != stat:
+                    affected.add(filename)
+            snapshot = current_snapshot
+            
+            if affected:
+                migrate_batch(sorted(affected))
+    except KeyboardInterrupt:
+        save_manifest(manifest)
+        if catalog:
+            catalog.close()
+        print("\nStopped watching.")
+
+def iter_jsonl_records(lines):
+    """Parse JSON Lines one record at a time
+    
+    lines are bytes, e.g. from a file opened in binary mode. Yields (line_number, data) for
+    every non-blank line; data is None if the line is not valid JSON or not UTF-8.
+    """
+    codec = get_codec(json_codec)
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, codec.loads(line)
+        except ValueError:
+            # Not valid JSON or not UTF-8
+            yield line_number, None
+
+def iter_array_records(f, codec=None):
+    """Parse a JSON array export, e.g. a single-document platform export, one CEI at a time
+    
+    Reads binary file f in chunks through json_array.iter_array_items, so memory is bounded by
+    the largest CEI rather than the export. Yields (item_number, data) for every item; data is
+    None if the item is not valid JSON. Raises ValueError if f does not hold a JSON array.
+    Items are parsed with codec, or the json_codec setting when it is None.
+    """
+    codec = codec or get_codec(json_codec)
+    for item_number, raw in enumerate(iter_array_items(f), 1):
+        try:
+            yield item_number, codec.loads(raw)
+        except ValueError:
+            # Not valid JSON or not UTF-8
+            yield item_number, None
+
+def migrate_stream(input_path='-', output_path='-', output_format='jsonl', input_format='jsonl'):
+    """Migrate CEIs from a JSON Lines bundle or a JSON array export, one record at a time
+    
+    Records are read, transformed and written one by one, so memory stays constant no matter
+    how large the bundle is. Status messages go to stderr when the output is stdout.
+    
+    Args:
+        input_path: JSON Lines file with one Old CEI per line, a JSON array of Old CEIs, or '-'
+            for stdin.
+        output_path: Destination file, or '-' for stdout. Not used for the 'folder' format.
+        output_format: 'jsonl' for one compact transformed record per line, 'archive' for a
+            zip of the same files migrate_ceis would write to the output folder, or 'folder'
+            to publish those files to output_folder and catalog them in catalog_file. In a
+            folder, the first record to produce an output filename keeps it, and outputs owned
+            by sources in the manifest or catalog are never overwritten.
+        input_format: 'jsonl' for JSON Lines or 'array' for a single top-level JSON array.
+    """
+    # Keep a handle on the real stdout before status messages are redirected away from it
+    stdout = sys.stdout
+    to_stdout = output_path == '-' and output_format != 'folder'
+    with contextlib.redirect_stdout(sys.stderr if to_stdout else sys.stdout):
+        print(f"\nMigrating CEIs from {'stdin' if input_path == '-' else input_path}...")
+        
+        # Same validation as a full migrate_ceis run
+        context = MappingContext.load()
+        if not validate_framework_normalization(context):
+            return False
+        if not validate_cei_titles(context=context):
+            return False
+        
+        # Both formats are read as bytes, so a record that is not UTF-8 is invalid on its own
+        in_f = sys.stdin.buffer if input_path == '-' else open(input_path, 'rb')
+        if input_format == 'array':
+            label = "item"
+            parsed_records = iter_array_records(in_f)
+        else:
+            label = "line"
+            parsed_records = iter_jsonl_records(in_f)
+        # Records are catalogued as e.g. "export.json item 3"
+        source_prefix = f"{'stdin' if input_path == '-' else input_path} {label} "
+        catalog = None
+        if output_format == 'folder':
+            out_f = None
+            os.makedirs(output_folder, exist_ok=True)
+            # Outputs of the input folder's sources and of other streams stay theirs; this input's
+            # own earlier outputs are replaced
+            claims = {entry["output"]: filename for filename, entry in load_manifest()["files"].items()}
+            if catalog_file:
+                catalog = MigrationCatalog(catalog_file, output_folder)
+                claims.update((output, source) for output, source in catalog.outputs().items()
+                              if not source.startswith(source_prefix))
+            
+            def published(batch):
+                """Catalog a batch of outputs right after it is published"""
+                for result in batch:
+                    catalog_result(catalog, result)
+            writer = OutputWriter(output_folder, publish_batch_size, fsync_outputs, claims,
+                                  published if catalog else None)
+        else:
+            out_f = stdout.buffer if output_path == '-' else open(output_path, 'wb')
+            writer = None
+        archive = zipfile.ZipFile(out_f, 'w', zipfile.ZIP_DEFLATED) if output_format == 'archive' else None
+        codec = get_codec(json_codec)
+        
+        processed_count = 0
+        skipped_count = 0
+        failed_count = 0
+        collision_count = 0
+        # Both copies advance in lockstep, so tee only ever holds the current record
+        parsed, positions = itertools.tee(parsed_records)
+        records = migrate_records((data for _, data in parsed), context, load_migration_plan())
+        try:
+            for (position, _), record in zip(positions, records):
+                if record["status"] == "invalid":
+                    print(f"Skipping invalid JSON: {label} {position}")
                     skipped_count += 1
+                    continue
+                if record["status"] == "failed":
+                    print(f"Failed: {label} {position}: {record['error']}")
+                    failed_count += 1
+                    continue
+                
+                if writer:
+                    staged = os.path.join(writer.staging_folder, f"{position}.json")
+                    write_staged(staged, codec.dumps(record["record"], compact_output), writer.fsync)
+                    result = {"filename": f"{source_prefix}{position}", "output": record["output"],
+                              "status": "processed", "entry": None, "staged": staged,
+                              "catalog": catalog_entry(record["record"]) if catalog else None}
+                    writer.publish(result)
+                    if result["status"] == "collision":
+                        print(f"Collision: {label} {position} -> {record['output']} is already produced by "
+                              f"{writer.claims[record['output']]}; not written")
+                        if catalog:
+                            catalog_result(catalog, result)
+                        collision_count += 1
+                        continue
+                elif archive:
+                    archive.writestr(record["output"], codec.dumps(record["record"], compact_output))
+                else:
+                    out_f.write(codec.dumps(record["record"], compact=True) + b"\n")
+                processed_count += 1
+        except ValueError as e:
+            # The export is not a well-formed JSON array
+            print(f"\nError: {input_path}: {e}")
+            return False
+        finally:
+            if writer:
+                writer.close()
+            if catalog:
+                catalog.close()
+            if archive:
+                archive.close()
+            if out_f and output_path == '-':
+                out_f.flush()
+            elif out_f:
+                out_f.close()
+            if input_path != '-':
+                in_f.close()
+        
+        print(f"\nMigration complete! Processed {processed_count} CEI record(s).")
+        if skipped_count > 0:
+            print(f"Skipped {skipped_count} invalid record(s).")
+        if collision_count > 0:
+            print(f"Skipped {collision_count} record(s) whose output filename another source already produces.")
+        if failed_count > 0:
+            print(f"Failed to migrate {failed_count} record(s).")
+    return True
+
+def query_catalog(framework=None, control=None, entity=None, assessment_id=None, as_json=False, path=None):
+    """Print the migrated CEIs matching every given filter, looked up in the catalog
     
-    if specific_cei_ids and processed_count < len(specific_cei_ids):
-        not_found = len(specific_cei_ids) - processed_count
-        print(f"\nWarning: {not_found} CEI(s) not found or could not be processed.")
+    Without filters, lists each catalogued framework with its number of controls and CEIs.
     
-    print(f"\nMigration complete! Processed {processed_count} CEI file(s).")
-    if skipped_count > 0:
-        print(f"Skipped {skipped_count} invalid file(s).")
+    Args:
+        framework: Normalized framework name from control_mapping.
+        control: Control ID, under framework if one is given.
+        entity: Scope entity, compared case-insensitively.
+        assessment_id: New CEI id.
+        as_json: Print the matches as JSON instead of one line per CEI.
+        path: Optional catalog file. Defaults to catalog_file.
+    """
+    path = path or catalog_file
+    catalog = open_catalog(path) if path else None
+    if catalog is None:
+        print(f"\nError: '{path}' not found. Run a migration first to build the catalog.")
+        return False
+    
+    with catalog:
+        if framework is None and control is None and entity is None and assessment_id is None:
+            frameworks = catalog.frameworks()
+            if as_json:
+                print(json.dumps([{"framework": name, "controls": controls, "ceis": ceis}
+                                  for name, controls, ceis in frameworks], indent=2))
+            else:
+                for name, controls, ceis in frameworks:
+                    print(f"{name}: {controls} control(s) in {ceis} CEI(s)")
+            return True
+        
+        # The text listing only shows the controls a framework or control filter matched
+        matches = catalog.query(framework, control, entity, assessment_id, with_controls=as_json or bool(framework or control))
+    if as_json:
+        print(json.dumps(matches, indent=2))
+        return True
+    for match in matches:
+        controls = ", ".join(f"{name} {control_id}" for name, control_id in match.get("controls", []))
+        print(f"{match['id']}  {match['title']}  [{', '.join(match['scope_entity'])}]  {match['output']}"
+              + (f"  ({controls})" if controls else ""))
+    print(f"\n{len(matches)} CEI(s) found.")
+    return True
+
+def set_output_options(codec=None, compact=None):
+    """Override the json_codec and compact_output settings; None keeps the current value"""
+    global json_codec, compact_output
+    if codec is not None:
+        json_codec = codec
+    if compact is not None:
+        compact_output = compact
 
 def show_menu():
     """Display menu and handle user selection"""
@@ -405,5 +1908,100 @@ def show_menu():
         else:
             print("\nInvalid choice. Please enter 1, 2, or 3.")
 
+def main(argv=None):
+    """Run the interactive menu, or a single command when arguments are given"""
+    parser = argparse.ArgumentParser(description="CEI Migration Tool")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    # Output options shared by every command that writes New CEIs
+    output_options = argparse.ArgumentParser(add_help=False)
+    output_options.add_argument("--codec", choices=["auto", *CODECS], help="JSON library to read and write CEIs with")
+    output_options.add_argument("--compact", action="store_true", default=None,
+                                help="write New CEIs without indentation")
+    
+    migrate_parser = subparsers.add_parser("migrate", parents=[output_options],
+                                           help="migrate CEIs from the input folder to the output folder")
+    migrate_parser.add_argument("cei_ids", nargs="*", help="CEI IDs to migrate (default: all)")
+    migrate_parser.add_argument("--workers", type=int, help="number of worker processes")
+    migrate_parser.add_argument("--io-threads", type=int,
+                                help="reader and writer threads overlapping file I/O with transforms")
+    migrate_parser.add_argument("--incremental", action="store_true", default=None,
+                                help="only migrate CEIs whose source or mapping rows changed")
+    migrate_parser.add_argument("--quiet", action="store_true", help="do not print a line per migrated file")
+    migrate_parser.add_argument("--journal", action="store_true", default=None,
+                                help="checkpoint finished files so the run can be resumed if it is interrupted")
+    migrate_parser.add_argument("--resume", action="store_true",
+                                help="finish the interrupted journaled run, skipping the files it already did")
+    migrate_parser.add_argument("--metrics", nargs="?", const=True, metavar="PATH",
+                                help="print stage timings at the end, and write them as JSON to PATH if given")
+    migrate_parser.add_argument("--shard", type=shard_argument, metavar="INDEX/COUNT",
+                                help="migrate only this shard's files, e.g. 0/4, and save its results for merge")
+    
+    batch_parser = subparsers.add_parser("batch", parents=[output_options],
+                                         help="migrate every tenant of a tenant manifest with one worker pool")
+    batch_parser.add_argument("tenants", help="tenant manifest JSON file")
+    batch_parser.add_argument("--workers", type=int, help="number of worker processes shared by all tenants")
+    batch_parser.add_argument("--io-threads", type=int,
+                              help="reader and writer threads overlapping file I/O with transforms")
+    batch_parser.add_argument("--incremental", action="store_true", default=None,
+                              help="only migrate CEIs whose source or mapping rows changed")
+    batch_parser.add_argument("--quiet", action="store_true", help="do not print a line per migrated file")
+    batch_parser.add_argument("--journal", action="store_true", default=None,
+                              help="checkpoint finished files so the run can be resumed if it is interrupted")
+    batch_parser.add_argument("--resume", action="store_true",
+                              help="finish each tenant's interrupted journaled run")
+    
+    merge_parser = subparsers.add_parser("merge", parents=[output_options],
+                                         help="combine the results of sharded migrations into one summary and catalog")
+    merge_parser.add_argument("--results", help="folder with the shard results (default: shard_results)")
+    
+    stream_parser = subparsers.add_parser("stream", parents=[output_options],
+                                          help="migrate a JSON Lines bundle or JSON array export of CEIs")
+    stream_parser.add_argument("--input", default="-", help="input file (default: stdin)")
+    stream_parser.add_argument("--input-format", choices=["jsonl", "array"], default="jsonl",
+                               help="one CEI per line, or a single JSON array of CEIs read one CEI at a time")
+    stream_parser.add_argument("--output", default="-", help="output file (default: stdout)")
+    stream_parser.add_argument("--format", choices=["jsonl", "archive", "folder"], default="jsonl",
+                               help="JSON Lines records, a zip archive of CEI files, or CEI files in the output folder")
+    
+    watch_parser = subparsers.add_parser("watch", parents=[output_options],
+                                         help="re-migrate CEIs as sources or mapping CSVs change")
+    watch_parser.add_argument("--interval", type=float, help="seconds between polls")
+    
+    query_parser = subparsers.add_parser("query", help="look up migrated CEIs by framework, control or scope entity")
+    query_parser.add_argument("--framework", help="normalized framework name, e.g. SCF_2023_4")
+    query_parser.add_argument("--control", help="control ID, under --framework if given")
+    query_parser.add_argument("--entity", help="scope entity")
+    query_parser.add_argument("--id", dest="assessment_id", help="New CEI id")
+    query_parser.add_argument("--json", action="store_true", help="print the matches as JSON")
+    query_parser.add_argument("--catalog", help=f"catalog file (default: {catalog_file})")
+    
+    args = parser.parse_args(argv)
+    if args.command == "query":
+        if not query_catalog(args.framework, args.control, args.entity, args.assessment_id, args.json, args.catalog):
+            sys.exit(1)
+        return
+    if args.command:
+        set_output_options(args.codec, args.compact)
+    if args.command == "migrate":
+        migrate_ceis(args.cei_ids or None, workers=args.workers, incremental=args.incremental,
+                     verbose=False if args.quiet else None, metrics=args.metrics, io_threads=args.io_threads,
+                     journal=args.journal, resume=args.resume, shard=args.shard)
+    elif args.command == "batch":
+        if not migrate_tenants(args.tenants, workers=args.workers, incremental=args.incremental,
+                               verbose=False if args.quiet else None, io_threads=args.io_threads,
+                               journal=args.journal, resume=args.resume):
+            sys.exit(1)
+    elif args.command == "merge":
+        if not merge_shard_results(args.results):
+            sys.exit(1)
+    elif args.command == "stream":
+        if not migrate_stream(args.input, args.output, args.format, args.input_format):
+            sys.exit(1)
+    elif args.command == "watch":
+        watch_ceis(args.interval)
+    else:
+        show_menu()
+
 if __name__ == "__main__":
-    show_menu()
+    main()
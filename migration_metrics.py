@@ -0,0 +1,119 @@
+import json
+import time
+import heapq
+import contextlib
+
+# Upper bounds (in milliseconds) of the per-file latency histogram buckets
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+class MigrationMetrics:
+    """Stage timings, per-file latency and I/O volume collected during a migration run
+    
+    Run-level stages (CSV loading, validation, directory listing) are timed with stage();
+    per-file stage timings come from the result dicts migrate_file returns.
+    """
+    
+    def __init__(self, slowest_count=10):
+        self.slowest_count = slowest_count
+        self.stage_seconds = {}
+        self.file_count = 0
+        self.file_seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self._slowest = []
+        self._started = time.perf_counter()
+        self.total_seconds = None
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a run-level stage and add it to the stage totals"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+    
+    def add_stage(self, name, seconds):
+        """Add seconds to the cumulative total for a stage"""
+        self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+    
+    def record_file(self, result):
+        """Fold one migrate_file result into the totals, histogram and slowest-file list"""
+        timings = result.get("timings", {})
+        for name, seconds in timings.items():
+            self.add_stage(name, seconds)
+        seconds = sum(timings.values())
+        
+        self.file_count += 1
+        self.file_seconds += seconds
+        self.bytes_read += result.get("bytes_read", 0)
+        self.bytes_written += result.get("bytes_written", 0)
+        
+        milliseconds = seconds * 1000
+        bucket = 0
+        while bucket < len(HISTOGRAM_BOUNDS_MS) and milliseconds > HISTOGRAM_BOUNDS_MS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+        
+        entry = (seconds, result["filename"], result.get("size", 0))
+        if len(self._slowest) < self.slowest_count:
+            heapq.heappush(self._slowest, entry)
+        elif entry > self._slowest[0]:
+            heapq.heapreplace(self._slowest, entry)
+    
+    def finish(self):
+        """Stop the run clock"""
+        self.total_seconds = time.perf_counter() - self._started
+    
+    def slowest_files(self):
+        """The slowest files as (seconds, filename, size), slowest first"""
+        return sorted(self._slowest, reverse=True)
+    
+    def to_dict(self):
+        """Machine-readable form of the metrics"""
+        histogram = {}
+        for bound, count in zip(HISTOGRAM_BOUNDS_MS + [None], self.histogram):
+            histogram[f"<={bound}ms" if bound is not None else f">{HISTOGRAM_BOUNDS_MS[-1]}ms"] = count
+        return {
+            "total_seconds": self.total_seconds,
+            "stage_seconds": self.stage_seconds,
+            "files": self.file_count,
+            "mean_file_ms": self.file_seconds / self.file_count * 1000 if self.file_count else 0,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "latency_histogram": histogram,
+            "slowest_files": [
+                {"filename": filename, "size": size, "ms": seconds * 1000}
+                for seconds, filename, size in self.slowest_files()
+            ]
+        }
+    
+    def write_json(self, path):
+        """Write the metrics to path as JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+    
+    def print_summary(self):
+        """Print a human-readable summary of the run"""
+        print("\nMigration metrics:")
+        if self.total_seconds is not None:
+            print(f"  Total time: {self.total_seconds:.3f}s")
+        print("  Stage times (cumulative):")
+        for name, seconds in self.stage_seconds.items():
+            print(f"    {name:<12} {seconds:10.3f}s")
+        if not self.file_count:
+            return
+        
+        print(f"  Files: {self.file_count}, mean {self.file_seconds / self.file_count * 1000:.2f} ms per file")
+        print(f"  Bytes read: {self.bytes_read}, bytes written: {self.bytes_written}")
+        print("  Per-file latency histogram:")
+        lower = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS_MS + [None], self.histogram):
+            if count:
+                label = f"{lower}-{bound} ms" if bound is not None else f">{lower} ms"
+                print(f"    {label:<14} {count}")
+            lower = bound
+        print(f"  Slowest {len(self._slowest)} file(s):")
+        for seconds, filename, size in self.slowest_files():
+            print(f"    {seconds * 1000:8.2f} ms  {filename} ({size} bytes)")
@@ -0,0 +1,158 @@
+import os
+import time
+import uuid
+import shutil
+import socket
+
+# Prefix of the per-run staging folders created inside the output folder, which are named
+# <prefix><host>-<pid>-<token> so runs on different nodes sharing the folder never collide
+STAGING_PREFIX = '.staging-'
+
+def _staging_name():
+    """Name of a new staging folder for this process"""
+    return f"{STAGING_PREFIX}{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+def _process_running(pid):
+    """Check whether a process with this pid is still alive"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to another user, or the platform cannot tell; leave it alone
+        return True
+    # A killed process nobody has reaped yet still exists as a zombie
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            return f.read().rpartition(")")[2].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+def remove_stale_staging(output_folder):
+    """Delete staging folders left in output_folder by runs that stopped before publishing
+    
+    Only folders created on this host are considered, since another node's processes cannot be
+    checked from here.
+    """
+    host = socket.gethostname()
+    for name in os.listdir(output_folder):
+        if not name.startswith(STAGING_PREFIX):
+            continue
+        host_and_pid = name[len(STAGING_PREFIX):].rpartition("-")[0]
+        folder_host, _, pid = host_and_pid.rpartition("-")
+        if folder_host != host or not pid.isdigit():
+            continue
+        if int(pid) != os.getpid() and not _process_running(int(pid)):
+            shutil.rmtree(os.path.join(output_folder, name), ignore_errors=True)
+
+def _fsync_path(path):
+    """Flush a file or folder to disk; folders cannot be opened for this on Windows"""
+    if os.name == 'nt' and os.path.isdir(path):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_staged(path, data, fsync=True):
+    """Write an output's bytes to its staged path, flushing them to disk when fsync is set
+    
+    Called by whoever produces the output (a worker process or writer thread), so the per-file
+    fsyncs run alongside other work instead of on OutputWriter's publish path.
+    """
+    with open(path, 'wb') as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+class OutputWriter:
+    """Publishes outputs staged by write_stage into the output folder with atomic renames
+    
+    Outputs are written to a staging folder inside the output folder first, so a crash never
+    leaves a half-written file among the real outputs, and are renamed into place in batches:
+    the staged files of a batch are renamed and the output folder is fsynced once. Staged files
+    are written with write_staged, which already flushed them to disk. Each output filename may
+    be claimed by only one source per run; a later source with the same output is a collision
+    and its output is not published.
+    
+    Args:
+        output_folder: Folder the outputs are published to.
+        batch_size: Number of staged outputs published together.
+        fsync: Whether to flush the output folder to disk after publishing a batch; staged
+            files should be written with write_staged using the same setting.
+        claims: Optional output filename -> source filename claims made before this run, e.g.
+            by sources that are not being migrated again.
+        on_publish: Optional callback given each batch of results right after it is published.
+    """
+    
+    def __init__(self, output_folder, batch_size=256, fsync=True, claims=None, on_publish=None):
+        self.output_folder = output_folder
+        self.on_publish = on_publish
+        self.batch_size = max(1, batch_size)
+        self.fsync = fsync
+        self.claims = dict(claims or {})
+        self.collisions = []
+        self.published_count = 0
+        self.publish_seconds = 0.0
+        self._batch = []
+        
+        remove_stale_staging(output_folder)
+        self.staging_folder = os.path.join(output_folder, _staging_name())
+        os.makedirs(self.staging_folder, exist_ok=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def publish(self, result):
+        """Claim a migrate_file result's output and queue its staged file for publishing
+        
+        A result whose output another source already claimed gets status "collision" and no
+        manifest entry, and its staged file is discarded. Returns the results published by the
+        batch this completed, if any.
+        """
+        output = result["output"]
+        if output is None:
+            return []
+        owner = self.claims.setdefault(output, result["filename"])
+        if owner != result["filename"]:
+            self.collisions.append((result["filename"], output, owner))
+            result["status"] = "collision"
+            result["entry"] = None
+            if result.get("staged"):
+                os.remove(result["staged"])
+            return []
+        
+        if result.get("staged"):
+            self._batch.append(result)
+            if len(self._batch) >= self.batch_size:
+                return self.flush()
+        return []
+    
+    def flush(self):
+        """Publish every queued output; returns the results published"""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return []
+        start = time.perf_counter()
+        for result in batch:
+            os.replace(result["staged"], os.path.join(self.output_folder, result["output"]))
+            result["staged"] = None
+        if self.fsync:
+            _fsync_path(self.output_folder)
+        self.published_count += len(batch)
+        self.publish_seconds += time.perf_counter() - start
+        if self.on_publish:
+            self.on_publish(batch)
+        return batch
+    
+    def close(self):
+        """Publish what is still queued and remove the staging folder"""
+        try:
+            self.flush()
+        finally:
+            shutil.rmtree(self.staging_folder, ignore_errors=True)
@@ -0,0 +1,366 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import migrate_ccm
+from migrate_ccm import MappingContext, load_migration_plan, output_filename, extract_condition_from_case
+from json_codec import get_codec, dump_file
+
+# Pre-flight settings
+worker_count = 1                        # worker processes used to check the corpus (1 = serial)
+report_file = 'preflight_report.json'
+cache_file = 'preflight_cache.json'     # per-file check results, reused while a file's hash is unchanged
+
+# Bumped whenever check_cei changes, so cached results from older checks are not reused
+CHECK_VERSION = 1
+
+# Old CEI fields transform_json copies as text
+STRING_FIELDS = ["cei_title", "description", "cei_description", "sql_query", "cei_condition", "finding_title"]
+
+def _issue(severity, code, message, field=None):
+    """One finding of the pre-flight checks; severity is "error" or "warning\""""
+    issue = {"severity": severity, "code": code, "message": message}
+    if field:
+        issue["field"] = field
+    return issue
+
+def _type_name(value):
+    """JSON name of a parsed value's type, with its article"""
+    if isinstance(value, dict):
+        return "an object"
+    if isinstance(value, list):
+        return "an array"
+    if isinstance(value, str):
+        return "a string"
+    if isinstance(value, bool):
+        return "a boolean"
+    if value is None:
+        return "null"
+    return "a number"
+
+def check_cei(data):
+    """Check a parsed Old CEI against the fields and shapes transform_json relies on
+    
+    Errors are problems that make the migration fail or silently produce a wrong output;
+    warnings are odd but survivable. Returns a list of issues.
+    """
+    if not isinstance(data, dict):
+        return [_issue("error", "not_an_object", f"Top-level JSON value is {_type_name(data)}, not an object")]
+    issues = []
+    
+    cei_code = data.get("cei_code")
+    if cei_code is None:
+        issues.append(_issue("error", "missing_field", "No cei_code; the output id and CSV mappings cannot be resolved", "cei_code"))
+    elif not isinstance(cei_code, str):
+        issues.append(_issue("error", "wrong_type", f"cei_code is {_type_name(cei_code)}, not a string", "cei_code"))
+    elif not cei_code.strip():
+        issues.append(_issue("error", "empty_field", "cei_code is empty", "cei_code"))
+    
+    for field in STRING_FIELDS:
+        if field in data and not isinstance(data[field], str):
+            issues.append(_issue("warning", "wrong_type", f"{field} is {_type_name(data[field])}, not a string", field))
+    if "is_active" in data and not isinstance(data["is_active"], bool):
+        issues.append(_issue("warning", "wrong_type", f"is_active is {_type_name(data['is_active'])}, not a boolean", "is_active"))
+    
+    entity = data.get("entity")
+    if entity is None:
+        issues.append(_issue("warning", "missing_field", "No entity; scope_entity will be empty", "entity"))
+    elif not isinstance(entity, list):
+        issues.append(_issue("error", "wrong_type", f"entity is {_type_name(entity)}, not an array", "entity"))
+    elif not all(isinstance(item, str) for item in entity):
+        issues.append(_issue("error", "wrong_type", "entity contains values that are not strings", "entity"))
+    elif not entity and data.get("sql_query"):
+        issues.append(_issue("warning", "empty_field", "entity is empty; scope_query will not be rewritten", "entity"))
+    
+    cei_condition = data.get("cei_condition")
+    if isinstance(cei_condition, str) and cei_condition.strip().upper().startswith("CASE"):
+        if extract_condition_from_case(cei_condition) == cei_condition.strip():
+            issues.append(_issue("warning", "unrecognized_condition",
+                                 "cei_condition is a CASE expression that is not CASE WHEN ... THEN true ELSE false END; "
+                                 "it will be copied unchanged", "cei_condition"))
+    
+    ui_config = data.get("ui_config", {})
+    if not isinstance(ui_config, dict):
+        issues.append(_issue("error", "wrong_type", f"ui_config is {_type_name(ui_config)}, not an object", "ui_config"))
+    else:
+        mappings = ui_config.get("mapping", []) or ui_config.get("mappings", [])
+        if not isinstance(mappings, list):
+            issues.append(_issue("error", "wrong_type", f"ui_config.mapping is {_type_name(mappings)}, not an array", "ui_config"))
+        elif not all(isinstance(item, dict) for item in mappings):
+            issues.append(_issue("error", "wrong_type", "ui_config.mapping contains entries that are not objects", "ui_config"))
+        elif not all(isinstance(item.get("data_field", ""), str) for item in mappings):
+            issues.append(_issue("warning", "wrong_type", "ui_config.mapping has a data_field that is not a string", "ui_config"))
+    
+    framework_mapping = data.get("framework_mapping")
+    if framework_mapping is None:
+        issues.append(_issue("warning", "missing_field", "No framework_mapping; control_mapping will be empty", "framework_mapping"))
+    elif not isinstance(framework_mapping, dict):
+        issues.append(_issue("error", "wrong_type", f"framework_mapping is {_type_name(framework_mapping)}, not an object",
+                             "framework_mapping"))
+    else:
+        for framework, controls in framework_mapping.items():
+            if not isinstance(controls, list):
+                issues.append(_issue("warning", "wrong_type",
+                                     f"Controls for {framework} are {_type_name(controls)}, not an array; they are copied unchanged",
+                                     "framework_mapping"))
+    return issues
+
+def check_file(path, known_hash=None):
+    """Read, hash and check one Old CEI file
+    
+    Returns (sha256, check), where check holds the cei_code, framework keys and structural
+    issues, or is None when the file's hash equals known_hash and the cached check still applies.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    sha256 = hashlib.sha256(raw).hexdigest()
+    if sha256 == known_hash:
+        return sha256, None
+    
+    check = {"cei_code": None, "frameworks": [], "issues": []}
+    try:
+        data = get_codec(migrate_ccm.json_codec).loads(raw)
+    except UnicodeDecodeError as error:
+        check["issues"].append(_issue("error", "invalid_encoding", f"Not UTF-8: {error}"))
+        return sha256, check
+    except json.JSONDecodeError as error:
+        check["issues"].append(_issue("error", "invalid_json", f"Not valid JSON: {error}"))
+        return sha256, check
+    
+    check["issues"] = check_cei(data)
+    if isinstance(data, dict):
+        if isinstance(data.get("cei_code"), str):
+            check["cei_code"] = data["cei_code"]
+        if isinstance(data.get("framework_mapping"), dict):
+            check["frameworks"] = list(data["framework_mapping"])
+    return sha256, check
+
+def _check_chunk(folder, items):
+    """Check a chunk of (filename, cached hash) items inside a worker process"""
+    results = []
+    for filename, known_hash in items:
+        path = os.path.join(folder, filename)
+        # Stat before reading, so a file modified during the check is checked again next time
+        stat = os.stat(path)
+        sha256, check = check_file(path, known_hash)
+        results.append((filename, stat.st_mtime_ns, stat.st_size, sha256, check))
+    return results
+
+def load_cache(plan_fingerprint):
+    """Load cached per-file checks made with the same checks, rules and input folder"""
+    cache = None
+    if os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            try:
+                cache = get_codec(migrate_ccm.json_codec).loads(f.read())
+            except json.JSONDecodeError:
+                cache = None
+    key = {"version": CHECK_VERSION, "plan_fingerprint": plan_fingerprint, "input_folder": migrate_ccm.input_folder}
+    if not cache or cache.get("key") != key:
+        cache = {"key": key, "files": {}}
+    return cache
+
+def save_cache(cache):
+    """Write the check cache atomically"""
+    dump_file(cache_file, cache, compact=True, codec=migrate_ccm.json_codec)
+
+def cross_check(checks, context, plan):
+    """Check every file's cei_code and frameworks against both CSVs, and the CSVs against the corpus
+    
+    Adds issues to the per-file checks in place and returns the issues that belong to CSV rows.
+    """
+    mapping_issues = []
+    if not context.has_cei_titles:
+        mapping_issues.append(_issue("error", "missing_csv", f"'{context.cei_titles_path}' not found"))
+    if not context.has_frameworks:
+        mapping_issues.append(_issue("error", "missing_csv", f"'{context.frameworks_path}' not found"))
+    
+    finding_title_map = context.finding_title_map
+    assessment_id_map = context.assessment_id_map
+    normalizations = {framework.strip(): normalized.strip() for framework, normalized in context.framework_rows if framework.strip()}
+    excluded_frameworks = plan.excluded_frameworks
+    
+    files_by_code = {}
+    files_by_output = {}
+    used_frameworks = set()
+    for filename, check in checks.items():
+        issues = check["issues"]
+        cei_code = check["cei_code"]
+        if cei_code:
+            files_by_code.setdefault(cei_code, []).append(filename)
+            new_id = assessment_id_map[cei_code] if cei_code in assessment_id_map else cei_code
+            files_by_output.setdefault(output_filename({"id": new_id}), []).append(filename)
+            if context.has_cei_titles:
+                if cei_code not in finding_title_map:
+                    issues.append(_issue("error", "unknown_cei_code",
+                                         f"cei_code {cei_code} is not in '{context.cei_titles_path}'", "cei_code"))
+                else:
+                    if not finding_title_map[cei_code]:
+                        issues.append(_issue("error", "missing_finding_title",
+                                             f"{cei_code} has no finding_title in '{context.cei_titles_path}'", "cei_code"))
+                    if not assessment_id_map[cei_code]:
+                        issues.append(_issue("error", "missing_assessment_id",
+                                             f"{cei_code} has no assessment_id in '{context.cei_titles_path}'", "cei_code"))
+        
+        for framework in check["frameworks"]:
+            used_frameworks.add(framework)
+            if framework in excluded_frameworks or not context.has_frameworks:
+                continue
+            if framework not in normalizations:
+                issues.append(_issue("error", "unknown_framework",
+                                     f"Framework {framework} is not in '{context.frameworks_path}'", "framework_mapping"))
+            elif not normalizations[framework]:
+                issues.append(_issue("error", "unnormalized_framework",
+                                     f"Framework {framework} has no normalized_framework in '{context.frameworks_path}'",
+                                     "framework_mapping"))
+    
+    for cei_code, filenames in files_by_code.items():
+        if len(filenames) > 1:
+            for filename in filenames:
+                others = ", ".join(other for other in filenames if other != filename)
+                checks[filename]["issues"].append(_issue("warning", "duplicate_cei_code",
+                                                         f"cei_code {cei_code} is also used by {others}", "cei_code"))
+    for output, filenames in files_by_output.items():
+        if len(filenames) > 1:
+            for filename in filenames:
+                others = ", ".join(other for other in filenames if other != filename)
+                checks[filename]["issues"].append(_issue("error", "output_collision",
+                                                         f"Output {output} would also be produced by {others}", "cei_code"))
+    
+    for cei_code in sorted(finding_title_map.keys() - files_by_code.keys()):
+        mapping_issues.append(_issue("warning", "unused_cei_row",
+                                     f"{cei_code} in '{context.cei_titles_path}' has no source file in '{migrate_ccm.input_folder}'"))
+    for framework in sorted(normalizations.keys() - used_frameworks):
+        mapping_issues.append(_issue("warning", "unused_framework_row",
+                                     f"Framework {framework} in '{context.frameworks_path}' is not used by any source file"))
+    return mapping_issues
+
+def build_report(checks, mapping_issues, context):
+    """Assemble the machine-readable report from the per-file checks and the CSV issues"""
+    issue_counts = {}
+    errors = 0
+    warnings = 0
+    files_with_errors = 0
+    files = {}
+    for filename in sorted(checks):
+        issues = checks[filename]["issues"]
+        if issues:
+            files[filename] = issues
+        if any(issue["severity"] == "error" for issue in issues):
+            files_with_errors += 1
+    for issue in [issue for issues in files.values() for issue in issues] + mapping_issues:
+        issue_counts[issue["code"]] = issue_counts.get(issue["code"], 0) + 1
+        if issue["severity"] == "error":
+            errors += 1
+        else:
+            warnings += 1
+    
+    return {
+        "valid": errors == 0,
+        "input_folder": migrate_ccm.input_folder,
+        "cei_titles_file": context.cei_titles_path,
+        "frameworks_file": context.frameworks_path,
+        "file_count": len(checks),
+        "files_with_errors": files_with_errors,
+        "errors": errors,
+        "warnings": warnings,
+        "issue_counts": dict(sorted(issue_counts.items())),
+        "files": files,
+        "mapping_issues": mapping_issues
+    }
+
+def run_preflight(workers=None, report_path=None, use_cache=True):
+    """Check every Old CEI and both mapping CSVs in one pass and write a JSON report
+    
+    Each file is parsed at most once, across worker processes when workers > 1. Structural
+    check results are cached per file: a file whose mtime and size are unchanged is not read
+    at all, and one whose content hash is unchanged is not parsed again. The CSV cross-checks
+    always run, since they are cheap and depend on both CSVs.
+    
+    Args:
+        workers: Optional number of worker processes. Defaults to worker_count; 1 runs serially.
+        report_path: Optional path of the report. Defaults to report_file.
+        use_cache: Whether to reuse and update cache_file.
+    
+    Returns the report dict.
+    """
+    if workers is None:
+        workers = worker_count
+    report_path = report_path or report_file
+    print(f"\nRunning pre-flight checks on '{migrate_ccm.input_folder}' and the mapping CSVs...")
+    
+    context = MappingContext.load()
+    plan = load_migration_plan()
+    cache = load_cache(plan.fingerprint) if use_cache else {"files": {}}
+    cached_files = cache["files"]
+    
+    filenames = sorted(filename for filename in os.listdir(migrate_ccm.input_folder) if filename.endswith(".json"))
+    checks = {}
+    pending = []
+    for filename in filenames:
+        cached = cached_files.get(filename)
+        if cached:
+            stat = os.stat(os.path.join(migrate_ccm.input_folder, filename))
+            if cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                checks[filename] = cached["check"]
+                continue
+        pending.append((filename, cached["sha256"] if cached else None))
+    reused_count = len(checks)
+    
+    if workers > 1 and len(pending) > 1:
+        chunks = migrate_ccm.pool_chunks(pending, workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = [result for chunk_results in executor.map(_check_chunk, [migrate_ccm.input_folder] * len(chunks), chunks)
+                       for result in chunk_results]
+    else:
+        results = _check_chunk(migrate_ccm.input_folder, pending)
+    
+    parsed_count = 0
+    for filename, mtime_ns, size, sha256, check in results:
+        if check is None:
+            check = cached_files[filename]["check"]
+            reused_count += 1
+        else:
+            parsed_count += 1
+        cached_files[filename] = {"mtime_ns": mtime_ns, "size": size, "sha256": sha256, "check": check}
+        checks[filename] = check
+    for filename in [filename for filename in cached_files if filename not in checks]:
+        del cached_files[filename]
+    if use_cache:
+        save_cache(cache)
+    
+    # Cross-checks add issues, so they work on copies of the cached structural checks
+    checks = {filename: dict(check, issues=list(check["issues"])) for filename, check in checks.items()}
+    mapping_issues = cross_check(checks, context, plan)
+    report = build_report(checks, mapping_issues, context)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"Checked {len(filenames)} CEI file(s): {parsed_count} parsed, {reused_count} unchanged since the last check.")
+    for code, count in report["issue_counts"].items():
+        print(f"  {code}: {count}")
+    if report["valid"]:
+        print(f"\nNo errors found ({report['warnings']} warning(s)).")
+    else:
+        print(f"\n{report['errors']} error(s) in {report['files_with_errors']} file(s) and the mapping CSVs, "
+              f"{report['warnings']} warning(s).")
+    print(f"Report saved to '{report_path}'")
+    return report
+
+def main(argv=None):
+    """Run the pre-flight checks from the command line; exits with status 1 when errors are found"""
+    parser = argparse.ArgumentParser(description="Check Old CEIs and the mapping CSVs before a migration")
+    parser.add_argument("--workers", type=int, help="worker processes")
+    parser.add_argument("--report", help=f"report file (default: {report_file})")
+    parser.add_argument("--no-cache", action="store_true", help="check every file again and leave the cache alone")
+    args = parser.parse_args(argv)
+    
+    report = run_preflight(args.workers, args.report, not args.no_cache)
+    if not report["valid"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import json
+
+def read_journal(path):
+    """Read a run journal written by RunJournal
+    
+    Returns (run, records, complete): the run parameters from the header line, the last
+    record for each source filename, and whether the run finished. Returns None if there is
+    no journal. A line cut short by a crash is ignored.
+    """
+    if not os.path.exists(path):
+        return None
+    run = None
+    records = {}
+    complete = False
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "run" in record:
+                run = record["run"]
+            elif "complete" in record:
+                complete = True
+            else:
+                records[record["source"]] = record
+    return run, records, complete
+
+def _ends_mid_line(path):
+    """Check whether a file's last line is missing its newline"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except FileNotFoundError:
+        return False
+
+class RunJournal:
+    """Append-only checkpoint of the source files a migration run has finished
+    
+    The first line holds the run's parameters, then one line per finished source with its
+    output filename, status, error and incremental manifest entry. Lines are buffered with
+    add() and written and fsynced together by commit(), which the caller runs whenever a batch
+    of outputs has been published, so the journal never lists an output that is not in place.
+    """
+    
+    def __init__(self, path, run, resume=False):
+        self.path = path
+        self._pending = []
+        if resume and _ends_mid_line(path):
+            # Finish the line a crash cut short, so the next record starts on its own line
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write("\n")
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if not resume:
+            self._pending.append({"run": run})
+            self.commit()
+    
+    def add(self, result):
+        """Buffer the record of a finished migrate_file result until the next commit"""
+        record = {"source": result["filename"], "output": result["output"], "status": result["status"]}
+        if result.get("error"):
+            record["error"] = result["error"]
+        if result.get("entry"):
+            record["entry"] = result["entry"]
+        self._pending.append(record)
+    
+    def commit(self):
+        """Append the buffered records and flush them to disk"""
+        if not self._pending:
+            return
+        self._file.write("".join(json.dumps(record, separators=(',', ':')) + "\n" for record in self._pending))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = []
+    
+    def close(self, complete=False):
+        """Commit what is buffered, mark the run finished if complete, and close the journal"""
+        if complete:
+            self._pending.append({"complete": True})
+        try:
+            self.commit()
+        finally:
+            self._file.close()
@@ -0,0 +1,97 @@
+import os
+import json
+import hashlib
+import argparse
+
+from json_codec import dump_file
+
+# Shard settings
+results_folder = 'shard_results'   # where each shard writes its partial results for the merge step
+
+def parse_shard(text):
+    """Parse an "index/count" shard spec such as "0/4" into (index, count)"""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{text}'. Expected INDEX/COUNT, e.g. 0/4") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{text}'. INDEX must be between 0 and COUNT - 1")
+    return index, count
+
+def shard_argument(text):
+    """argparse type for a --shard INDEX/COUNT option"""
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+def shard_of(filename, count):
+    """Shard a source file belongs to, from a hash of its name that is the same on every node"""
+    digest = hashlib.sha256(filename.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+def select_shard(filenames, shard):
+    """Filenames belonging to shard (index, count); every file when shard is None"""
+    if shard is None:
+        return list(filenames)
+    index, count = shard
+    return [filename for filename in filenames if shard_of(filename, count) == index]
+
+def shard_path(path, shard):
+    """Per-shard variant of a state file path, e.g. manifest.json -> manifest.shard-0-of-4.json"""
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{ext}"
+
+def _partial_path(kind, shard, folder):
+    return os.path.join(folder, f"{kind}.shard-{shard[0]}-of-{shard[1]}.json")
+
+def write_partial(kind, shard, results, folder=None):
+    """Write a shard's partial results for the merge step, atomically
+    
+    Args:
+        kind: Name of the sharded command, e.g. "migrate"; merges only combine one kind.
+        shard: (index, count) of the shard.
+        results: JSON-serializable partial results.
+        folder: Optional folder for the partial results. Defaults to results_folder.
+    
+    Returns the path written.
+    """
+    folder = folder or results_folder
+    os.makedirs(folder, exist_ok=True)
+    path = _partial_path(kind, shard, folder)
+    dump_file(path, {"kind": kind, "shard": list(shard), "results": results}, compact=True)
+    return path
+
+def read_partials(kind, folder=None):
+    """Read the partial results of every shard of the last sharded run of kind
+    
+    The shard count is taken from the files present. Raises ValueError when shards are
+    missing or the files describe different shard counts.
+    
+    Returns the results of shards 0 to count - 1, in shard order.
+    """
+    folder = folder or results_folder
+    prefix = f"{kind}.shard-"
+    names = sorted(name for name in os.listdir(folder) if name.startswith(prefix) and name.endswith(".json")) \
+        if os.path.isdir(folder) else []
+    if not names:
+        raise ValueError(f"No '{kind}' shard results found in '{folder}'")
+    
+    partials = {}
+    counts = set()
+    for name in names:
+        with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+            partial = json.load(f)
+        index, count = partial["shard"]
+        counts.add(count)
+        partials[index] = partial["results"]
+    if len(counts) > 1:
+        raise ValueError(f"'{folder}' holds '{kind}' results of runs with different shard counts "
+                         f"({', '.join(str(count) for count in sorted(counts))}); remove the stale ones")
+    count = counts.pop()
+    missing = [str(index) for index in range(count) if index not in partials]
+    if missing:
+        raise ValueError(f"Missing '{kind}' results for shard(s) {', '.join(missing)} of {count}")
+    return [partials[index] for index in range(count)]
@@ -0,0 +1,275 @@
+import re
+import functools
+
+# Cache sizes for the memoized rewrites; CEIs share a small set of conditions and query templates
+CACHE_SIZE = 65536
+
+TOKEN_RE = re.compile(r"""
+      (?P<ws>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<string>'(?:[^'\\]|''|\\.)*'?)
+    | (?P<quoted>"(?:[^"\\]|""|\\.)*"?|`(?:[^`]|``)*`?)
+    | (?P<placeholder><%.*?%>)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<number>\d+(?:\.\d+)?)
+    | (?P<punct>.)
+""", re.S | re.X)
+
+# Text the fast paths leave to the tokenizer: backslash escapes, comments, and quotes other than
+# plain single-quoted literals
+def _has_hard_markers(text):
+    """Check whether text has anything the fast paths leave to the tokenizer"""
+    return "\\" in text or "--" in text or "/*" in text or '"' in text or "`" in text or not text.isascii()
+
+# Words that must not appear anywhere in the condition of a single-branch CASE, even inside
+# longer words, for the fast path to be sure there is no nested CASE
+CASE_KEYWORDS = ("CASE", "WHEN", "THEN", "ELSE", "END")
+# Word chars of the tokenizer, uppercased
+WORD_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$")
+
+def _mask_literals(upper):
+    """upper with the contents of its single-quoted literals replaced by quotes
+    
+    Only valid for text without hard markers and with an even number of quotes; a doubled quote
+    reads as two adjacent literals, which covers the same text as the tokenizer's single token.
+    """
+    pieces = upper.split("'")
+    pieces[1::2] = ["'" * len(piece) for piece in pieces[1::2]]
+    return "'".join(pieces)
+
+def _fast_case_condition(cei_condition):
+    """extract_case_condition of a stripped condition using string operations only
+    
+    Handles plain conditions and single-branch CASE expressions without nesting; returns None
+    for anything else, which the tokenizer must decide.
+    """
+    upper = cei_condition.upper()
+    if not upper.startswith("CASE"):
+        # Without comments the first token starts the text, so this is not a CASE
+        return cei_condition if not upper.startswith(("--", "/*")) else None
+    # Without hard markers or placeholders, every quote belongs to a literal, and an even
+    # count means none is left unterminated
+    if _has_hard_markers(cei_condition) or "<%" in upper or upper.count("'") % 2:
+        return None
+    case_when, then, results = upper.partition("THEN")
+    # THEN can't be inside a literal here: the results after it have no quotes to close one
+    words = case_when.split(None, 2)
+    if (len(words) != 3 or words[0] != "CASE" or words[1] != "WHEN" or "THEN" in results
+            or not case_when[-1].isspace() or not results[:1].isspace()):
+        return None
+    condition = words[2]
+    if "CASE" in condition or "WHEN" in condition or "ELSE" in condition or "END" in condition:
+        # Only look inside literals, which costs a copy, when a keyword shows up at all
+        masked = _mask_literals(condition)
+        if any(keyword in masked for keyword in CASE_KEYWORDS):
+            return None
+    results = results.rstrip()
+    while results.endswith(";"):
+        results = results[:-1].rstrip()
+    results = results.split()
+    if (len(results) == 2 or len(results) == 4 and results[1] == "ELSE" and results[2] in ("FALSE", "0", "NULL")) \
+            and results[0] in ("TRUE", "1") and results[-1] == "END":
+        return cei_condition[len(case_when) - len(condition):len(case_when)].strip()
+    return None
+
+def tokenize(sql):
+    """Split SQL into (kind, text, start) tokens
+    
+    Kinds are ws, comment, string, quoted (identifiers), placeholder (<%...%>), word, number
+    and punct. String literals, quoted identifiers and comments are single tokens, so keywords
+    and table names inside them are never matched; quotes inside them may be doubled or, as in
+    Spark SQL, escaped with a backslash. Joining the token texts gives back sql.
+    """
+    return [(match.lastgroup, match.group(), match.start()) for match in TOKEN_RE.finditer(sql)]
+
+def _significant(tokens):
+    """Tokens other than whitespace and comments"""
+    return [token for token in tokens if token[0] not in ("ws", "comment")]
+
+def _is_keyword(token, keyword):
+    """Check whether token is the given SQL keyword, in any case"""
+    return token[0] == "word" and token[1].upper() == keyword
+
+# Spellings of the THEN and ELSE results of a CASE that only wraps a boolean condition
+TRUE_RESULTS = {("word", "TRUE"), ("string", "'TRUE'"), ("number", "1")}
+FALSE_RESULTS = {("word", "FALSE"), ("string", "'FALSE'"), ("number", "0"), ("word", "NULL")}
+
+def _result(token):
+    """(kind, text) of a THEN or ELSE result token, for comparing against TRUE_RESULTS/FALSE_RESULTS"""
+    return token[0], token[1].upper()
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def extract_case_condition(cei_condition):
+    """Extract <condition> from "CASE WHEN <condition> THEN true [ELSE false] END[;]"
+    
+    true may also be written 'true' or 1, and false 'false', 0 or NULL. CASE expressions
+    nested inside the condition and THEN inside string literals are handled. Anything that is
+    not a single-branch true/false CASE is returned stripped but otherwise unchanged, since it
+    is already the full boolean expression.
+    """
+    cei_condition = cei_condition.strip()
+    condition = _fast_case_condition(cei_condition)
+    if condition is not None:
+        return condition
+    return _extract_case_condition_tokens(cei_condition)
+
+def _extract_case_condition_tokens(cei_condition):
+    """extract_case_condition for a stripped condition, through the tokenizer"""
+    tokens = _significant(tokenize(cei_condition))
+    while tokens and tokens[-1][:2] == ("punct", ";"):
+        tokens.pop()
+    if len(tokens) < 2 or not _is_keyword(tokens[0], "CASE") or not _is_keyword(tokens[1], "WHEN"):
+        return cei_condition
+    
+    # Find the outer CASE's THEN and END, skipping over nested CASE ... END expressions
+    depth = 0
+    then_index = None
+    end_index = None
+    for index, token in enumerate(tokens):
+        if token[0] != "word":
+            continue
+        keyword = token[1].upper()
+        if keyword == "CASE":
+            depth += 1
+        elif keyword == "END":
+            depth -= 1
+            if depth == 0:
+                end_index = index
+                break
+        elif depth == 1:
+            if keyword == "THEN" and then_index is None:
+                then_index = index
+            elif keyword == "WHEN" and index != 1:
+                # More than one branch is not a plain boolean wrapper
+                return cei_condition
+    
+    if then_index is None or end_index != len(tokens) - 1:
+        return cei_condition
+    branches = tokens[then_index + 1:end_index]
+    if not branches or _result(branches[0]) not in TRUE_RESULTS:
+        return cei_condition
+    if len(branches) == 3 and _is_keyword(branches[1], "ELSE"):
+        if _result(branches[2]) not in FALSE_RESULTS:
+            return cei_condition
+    elif len(branches) != 1:
+        return cei_condition
+    
+    condition_start = tokens[1][2] + len(tokens[1][1])
+    return cei_condition[condition_start:tokens[then_index][2]].strip()
+
+class ScopeQueryRewriter:
+    """Rewrites schema placeholders and the entity_inventory table in scope queries
+    
+    Both rewrites happen in a single pass over the query's tokens:
+      - old_table (e.g. <%EI_PUBLISH_SCHEMA_NAME%>.sds_ei__publish_transformer__entity_inventory)
+        becomes new_table formatted with {entity} for single-entity scopes, or
+        multi_entity_table formatted with {entities} (lowercased, joined by "__") for
+        multi-entity scopes; a multi_entity_table of None leaves multi-entity queries on old_table
+      - every other <%...%> placeholder listed in placeholders is renamed
+    Matching ignores case and never touches string literals, quoted identifiers or comments.
+    Results are memoized on (query, entities).
+    """
+    
+    def __init__(self, old_table, new_table, multi_entity_table=None, placeholders=None):
+        self.new_table = new_table
+        self.multi_entity_table = multi_entity_table
+        self.placeholders = placeholders or {}
+        self._pattern = [(kind, text.upper()) for kind, text, _ in _significant(tokenize(old_table))]
+        # The last token (the table name) is a cheap pre-check before tokenizing
+        self._table_name = self._pattern[-1][1] if self._pattern else ""
+        # old_table as one string for the fast path, which only handles a leading placeholder
+        # followed by words and punctuation, never two words in a row
+        kinds = [kind for kind, _ in self._pattern]
+        simple = kinds[:1] == ["placeholder"] and set(kinds[1:]) <= {"word", "punct"} \
+            and ("word", "word") not in zip(kinds, kinds[1:])
+        self._table_text = "".join(text for _, text in self._pattern) if simple else None
+        self.rewrite = functools.lru_cache(maxsize=CACHE_SIZE)(self._rewrite)
+    
+    def _fast_rewrite(self, query, replacement):
+        """_rewrite with string operations only, or None when the tokenizer must decide"""
+        if self.placeholders or self._table_text is None or _has_hard_markers(query) or query.count("'") % 2:
+            return None
+        upper = query.upper()
+        length = len(self._table_text)
+        if upper.count("<%") == 1:
+            # The usual query: the one placeholder is old_table's, if it is outside literals
+            position = upper.find(self._table_text)
+            if position == -1 or upper.count("'", 0, position) % 2 \
+                    or upper[position + length:position + length + 1] in WORD_CHARS:
+                return query
+            return query[:position] + replacement + query[position + length:]
+        
+        # Where the tokenizer starts a placeholder: at each <% outside literals and earlier
+        # placeholders; an even count of quotes before it puts it outside literals
+        placeholder_starts = set()
+        start = upper.find("<%")
+        while start != -1:
+            if upper.count("'", 0, start) % 2:
+                start = upper.find("<%", start + 1)
+                continue
+            end = upper.find("%>", start + 2)
+            if end == -1:
+                break
+            if "'" in upper[start:end]:
+                # A placeholder spanning a literal
+                return None
+            placeholder_starts.add(start)
+            start = upper.find("<%", end + 2)
+        
+        parts = []
+        done = 0
+        position = upper.find(self._table_text)
+        while position != -1:
+            if position in placeholder_starts and upper[position + length:position + length + 1] not in WORD_CHARS:
+                parts.append(query[done:position])
+                parts.append(replacement)
+                done = position + length
+            position = upper.find(self._table_text, position + 1)
+        parts.append(query[done:])
+        return "".join(parts)
+    
+    def _replacement(self, entities):
+        """Table that replaces old_table for these scope entities, or None to keep it"""
+        if len(entities) == 1:
+            return self.new_table.format(entity=entities[0].lower())
+        if len(entities) > 1 and self.multi_entity_table:
+            return self.multi_entity_table.format(entities="__".join(entity.lower() for entity in entities))
+        return None
+    
+    def _matches(self, tokens, index):
+        """Check whether the old_table tokens start at tokens[index]"""
+        if index + len(self._pattern) > len(tokens):
+            return False
+        for offset, (kind, text) in enumerate(self._pattern):
+            token = tokens[index + offset]
+            if token[0] != kind or token[1].upper() != text:
+                return False
+        return True
+    
+    def _rewrite(self, query, entities):
+        replacement = self._replacement(entities) if self._pattern else None
+        if replacement is not None and self._table_name not in query.upper():
+            replacement = None
+        if replacement is None and not self.placeholders:
+            return query
+        
+        if replacement is not None:
+            rewritten = self._fast_rewrite(query, replacement)
+            if rewritten is not None:
+                return rewritten
+        
+        tokens = tokenize(query)
+        parts = []
+        index = 0
+        while index < len(tokens):
+            if replacement is not None and self._matches(tokens, index):
+                parts.append(replacement)
+                index += len(self._pattern)
+                continue
+            kind, text, _ = tokens[index]
+            if kind == "placeholder" and text in self.placeholders:
+                parts.append(self.placeholders[text])
+            else:
+                parts.append(text)
+            index += 1
+        return "".join(parts)
@@ -0,0 +1,105 @@
+import os
+import re
+import json
+import contextlib
+
+# Tenant settings
+state_folder = 'tenant_state'   # parent of each tenant's default state folder, relative to the tenant manifest
+
+# Paths every tenant must list
+REQUIRED_KEYS = ("name", "input_folder", "output_folder", "cei_titles_file", "frameworks_file")
+
+# Per-tenant state files and their default names inside the tenant's state folder
+STATE_FILES = {
+    "manifest_file": "migration_manifest.json",
+    "journal_file": "migration_journal.jsonl",
+    "index_file": "cei_index.json",
+    "catalog_file": "cei_catalog.sqlite"
+}
+
+# Module settings a tenant overrides while it runs
+SETTING_KEYS = ("input_folder", "output_folder", "cei_titles_file", "frameworks_file", "rules_file", *STATE_FILES)
+
+TENANT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+def load_tenants(path):
+    """Read and validate a tenant manifest
+    
+    The manifest is a JSON object whose "tenants" list holds one object per tenant with its
+    name, input_folder, output_folder, cei_titles_file and frameworks_file, and optionally a
+    rules_file, a state_folder (default: tenant_state/<name>) and any of the state files in
+    STATE_FILES; a catalog_file of null turns the catalog off. Relative paths are resolved
+    against the manifest's folder, so a tenant's state does not depend on the working directory.
+    
+    Returns the tenants with every path filled in, or None after printing what is wrong.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"\nError: cannot read tenant manifest '{path}': {e}")
+        return None
+    entries = manifest.get("tenants") if isinstance(manifest, dict) else None
+    if not isinstance(entries, list) or not entries:
+        print(f"\nError: '{path}' must be a JSON object with a non-empty \"tenants\" list.")
+        return None
+    
+    base = os.path.dirname(os.path.abspath(path))
+    allowed = set(REQUIRED_KEYS) | set(SETTING_KEYS) | {"state_folder"}
+    errors = []
+    tenants = []
+    for position, entry in enumerate(entries, 1):
+        label = f"tenant {position}"
+        if not isinstance(entry, dict):
+            errors.append(f"{label} is not an object")
+            continue
+        if isinstance(entry.get("name"), str):
+            label = f"tenant '{entry['name']}'"
+        missing = [key for key in REQUIRED_KEYS if not isinstance(entry.get(key), str) or not entry[key]]
+        unknown = sorted(set(entry) - allowed)
+        # Only the catalog can be turned off
+        invalid = [key for key, value in entry.items() if key in allowed and key not in REQUIRED_KEYS
+                   and not (isinstance(value, str) and value) and not (key == "catalog_file" and value is None)]
+        if missing:
+            errors.append(f"{label} is missing {', '.join(missing)}")
+        if unknown:
+            errors.append(f"{label} has unknown key(s) {', '.join(unknown)}")
+        if invalid:
+            errors.append(f"{label} needs a path for {', '.join(invalid)}")
+        if missing or unknown or invalid:
+            continue
+        if not TENANT_NAME.match(entry["name"]):
+            errors.append(f"{label} needs a name made of letters, digits, '.', '_' and '-'")
+            continue
+        
+        tenant = {key: value if key == "name" or value is None else os.path.join(base, value)
+                  for key, value in entry.items()}
+        tenant.setdefault("state_folder", os.path.join(base, state_folder, entry["name"]))
+        for key, filename in STATE_FILES.items():
+            tenant.setdefault(key, os.path.join(tenant["state_folder"], filename))
+        tenants.append(tenant)
+    
+    for key, what in (("name", "name"), ("output_folder", "output folder"), ("state_folder", "state folder")):
+        seen = {}
+        for tenant in tenants:
+            value = tenant[key] if key == "name" else os.path.abspath(tenant[key])
+            if value in seen:
+                errors.append(f"tenants '{seen[value]}' and '{tenant['name']}' share the {what} '{tenant[key]}'")
+            seen.setdefault(value, tenant["name"])
+    
+    if errors:
+        print(f"\nError: invalid tenant manifest '{path}':")
+        for error in errors:
+            print(f"  - {error}")
+        return None
+    return tenants
+
+@contextlib.contextmanager
+def override_settings(namespace, settings):
+    """Temporarily replace module settings in namespace, e.g. a module's globals(), restoring them on exit"""
+    saved = {key: namespace[key] for key in settings}
+    namespace.update(settings)
+    try:
+        yield
+    finally:
+        namespace.update(saved)
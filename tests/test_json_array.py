@@ -0,0 +1,62 @@
+import io
+import json
+
+import pytest
+
+from json_array import iter_array_items
+
+DOCUMENTS = [
+    [],
+    [{}],
+    [{"cei_code": "CEI-1", "framework_mapping": {"nist": ["ac-1", "ac-2"]}}, {"cei_code": "CEI-2"}],
+    [1, -2.5e-3, True, False, None, "text", [], [[]], {"a": {"b": [1, {"c": None}]}}],
+    # Quotes, backslashes and brackets inside strings
+    ["\"", "\\", "\\\"", "a\\\\", "]", "[", "}", "{", ",", "\"]\\\",{", "é€\U0001f600"],
+    [{"key \"with\" quotes": "value \\ with ] brackets ["}],
+]
+
+def items(raw, chunk_size):
+    return [json.loads(item) for item in iter_array_items(io.BytesIO(raw), chunk_size)]
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("indent", [None, 2])
+def test_items_match_json_loads_at_every_chunk_size(document, indent):
+    raw = json.dumps(document, indent=indent, ensure_ascii=False).encode('utf-8')
+    # Chunk sizes of a byte or two put a chunk boundary at every position, including right
+    # after a backslash and inside multi-byte characters
+    for chunk_size in (1, 2, 3, 5, 8, 1 << 20):
+        assert items(raw, chunk_size) == document
+
+def test_item_bytes_are_the_exact_source_text():
+    raw = b'[ {"a" : 1} ,\n"x\\"y", 12.50 ,null]'
+    assert list(iter_array_items(io.BytesIO(raw), 2)) == [b'{"a" : 1}', b'"x\\"y"', b'12.50', b'null']
+
+def test_byte_order_mark_and_surrounding_whitespace_are_allowed():
+    assert items(b'\xef\xbb\xbf \n[1, 2]\n ', 1) == [1, 2]
+
+def test_items_are_read_lazily():
+    stream = io.BytesIO(b'[' + b','.join([b'{"n": 1}'] * 10000) + b']')
+    next(iter_array_items(stream, 64))
+    assert stream.tell() == 64
+
+def test_invalid_json_inside_balanced_brackets_is_left_to_the_caller():
+    assert list(iter_array_items(io.BytesIO(b'[{"a": }, 1]'), 3)) == [b'{"a": }', b'1']
+
+@pytest.mark.parametrize("raw, message", [
+    (b'', "not a JSON array"),
+    (b'{"a": 1}', "not a JSON array"),
+    (b'[1, 2,]', "Expected an item"),
+    (b'[,]', "Expected an item"),
+    (b'[1 2]', "Expected ',' or ']'"),
+    (b'[1] [2]', "Unexpected data"),
+])
+def test_malformed_arrays_are_rejected(raw, message):
+    for chunk_size in (1, 1 << 20):
+        with pytest.raises(ValueError, match=message):
+            list(iter_array_items(io.BytesIO(raw), chunk_size))
+
+@pytest.mark.parametrize("raw", [b'[', b'[1', b'[1,', b'[{"a": 1}', b'["abc', b'["abc\\', b'[["a"]'])
+def test_truncated_arrays_are_rejected(raw):
+    for chunk_size in (1, 1 << 20):
+        with pytest.raises(ValueError, match="ends unexpectedly"):
+            list(iter_array_items(io.BytesIO(raw), chunk_size))
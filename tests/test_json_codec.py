@@ -0,0 +1,68 @@
+import json
+import random
+
+import pytest
+
+import json_codec
+
+pytest.importorskip("orjson")
+
+orjson_codec = json_codec.get_codec("orjson")
+stdlib_codec = json_codec.get_codec("stdlib")
+
+STRING_CHARACTERS = ['a', 'Z', ' ', '"', '\\', '/', '\n', '\t', '\x00', '\x1f', '\x7f', '\x80',
+                     'é', '€', ' ', '\U0001f600', 'e', 'E', '0', '9']
+
+def random_string(rng):
+    return ''.join(rng.choice(STRING_CHARACTERS) for _ in range(rng.randint(0, 12)))
+
+def random_number_literal(rng):
+    """A JSON number as text, including ones that round, overflow or need more than 64 bits"""
+    mantissa = rng.choice(["0", "1", "-1", "12.5", "0.0001", "0.00001", "123456789012345678",
+                           "1234567890123456789012", "9007199254740993", "3.141592653589793"])
+    exponent = rng.choice(["", "", "e5", "E-5", "e+16", "e15", "e308", "e309", "e400", "E-400",
+                           "e-324", "e0005"])
+    return mantissa + exponent
+
+def random_value(rng, depth=0):
+    kind = rng.randint(0, 7 if depth < 4 else 4)
+    if kind == 0:
+        return rng.choice(["null", "true", "false", "NaN", "Infinity", "-Infinity"])
+    if kind == 1:
+        return random_number_literal(rng)
+    if kind == 2:
+        return json.dumps(rng.uniform(-1e20, 1e20) * 10 ** rng.randint(-30, 30))
+    if kind in (3, 4):
+        return json.dumps(random_string(rng), ensure_ascii=rng.random() < 0.5)
+    if kind in (5, 6):
+        items = [f"{json.dumps(random_string(rng))}: {random_value(rng, depth + 1)}"
+                 for _ in range(rng.randint(0, 4))]
+        return "{" + ", ".join(items) + "}"
+    return "[" + ", ".join(random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))) + "]"
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_orjson_matches_stdlib_on_random_documents(compact):
+    rng = random.Random(compact)
+    for _ in range(20000):
+        raw = random_value(rng).encode('utf-8')
+        expected = stdlib_codec.dumps(stdlib_codec.loads(raw), compact)
+        assert orjson_codec.dumps(orjson_codec.loads(raw), compact) == expected, raw
+
+@pytest.mark.parametrize("raw", [
+    b'{"cei_title": "x\x7fy"}',
+    b'[1e400, -1E+400, 1e-400, 1.5e308]',
+    b'[NaN, Infinity, -Infinity, null]',
+    b'[12345678901234567890123, 0.00001, 1e16]',
+])
+def test_orjson_matches_stdlib_on_edge_cases(raw):
+    for compact in (False, True):
+        assert orjson_codec.dumps(orjson_codec.loads(raw), compact) == \
+            stdlib_codec.dumps(stdlib_codec.loads(raw), compact)
+
+def test_orjson_writes_non_finite_floats_like_stdlib():
+    data = {"a": [float('inf'), float('-inf'), None], "b": {"c": float('nan')}}
+    assert orjson_codec.dumps(data) == stdlib_codec.dumps(data)
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        json_codec.get_codec("missing")
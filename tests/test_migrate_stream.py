@@ -0,0 +1,63 @@
+import contextlib
+import glob
+import io
+import os
+import sqlite3
+
+import benchmark
+import migrate_ccm
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def test_array_stream_to_folder_matches_per_file_migration_and_keeps_the_catalog(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    benchmark.generate_corpus('.', 12)
+    sources = sorted(glob.glob(os.path.join('Old CEIs', '*.json')))
+    with open('export.json', 'w', encoding='utf-8') as f:
+        f.write('[\n' + ',\n'.join(open(path, encoding='utf-8').read() for path in sources) + '\n]')
+    
+    monkeypatch.setattr(migrate_ccm, 'output_folder', 'per file')
+    os.makedirs('per file')
+    with quiet():
+        migrate_ccm.migrate_ceis(incremental=False)
+    
+    # Two sources stay in the input folder and keep their outputs; the rest only come from the export
+    for path in sources[2:]:
+        os.remove(path)
+    monkeypatch.setattr(migrate_ccm, 'output_folder', 'streamed')
+    monkeypatch.setattr(migrate_ccm, 'catalog_file', 'streamed.sqlite')
+    os.makedirs('streamed')
+    with quiet():
+        migrate_ccm.migrate_ceis(incremental=True)
+        assert migrate_ccm.migrate_stream('export.json', '-', 'folder', 'array')
+    
+    outputs = sorted(name for name in os.listdir('per file') if name.endswith('.json'))
+    assert sorted(name for name in os.listdir('streamed') if name.endswith('.json')) == outputs
+    for name in outputs:
+        with open(os.path.join('per file', name), 'rb') as a, open(os.path.join('streamed', name), 'rb') as b:
+            assert a.read() == b.read()
+    
+    rows = dict(sqlite3.connect('streamed.sqlite').execute("SELECT source, output FROM assessments").fetchall())
+    assert sorted(rows.values()) == outputs
+    assert sum(source.startswith('export.json item ') for source in rows) == len(sources) - 2
+    assert sum(source.endswith('.json') and ' item ' not in source for source in rows) == 2
+
+def test_jsonl_line_that_is_not_utf8_is_one_invalid_record(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    benchmark.generate_corpus('.', 3)
+    sources = sorted(glob.glob(os.path.join('Old CEIs', '*.json')))
+    lines = [open(path, 'rb').read().replace(b'\n', b'') for path in sources]
+    with open('bundle.jsonl', 'wb') as f:
+        f.write(b'\n'.join(lines[:2] + [b'{"cei_code": "\xff"}'] + lines[2:]) + b'\n')
+    
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        assert migrate_ccm.migrate_stream('bundle.jsonl', 'out.jsonl')
+    
+    assert "Skipping invalid JSON: line 3" in printed.getvalue()
+    assert "Processed 3 CEI record(s)." in printed.getvalue()
+    with open('out.jsonl', 'rb') as f:
+        assert len(f.read().splitlines()) == 3
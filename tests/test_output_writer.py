@@ -0,0 +1,116 @@
+import os
+import socket
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import output_writer
+from output_writer import STAGING_PREFIX, OutputWriter, remove_stale_staging, write_staged
+
+def dead_pid():
+    """Pid of a process that has exited and been reaped"""
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def staged_result(writer, filename, output, data=b"{}"):
+    """A migrate_file-style result whose output is staged in writer's staging folder"""
+    staged = os.path.join(writer.staging_folder, filename)
+    write_staged(staged, data, writer.fsync)
+    return {"filename": filename, "output": output, "status": "processed", "entry": {}, "staged": staged}
+
+def test_writers_never_share_a_staging_folder(tmp_path):
+    with OutputWriter(str(tmp_path)) as first, OutputWriter(str(tmp_path)) as second:
+        assert first.staging_folder != second.staging_folder
+        assert os.path.basename(first.staging_folder).startswith(f"{STAGING_PREFIX}{socket.gethostname()}-{os.getpid()}-")
+        assert os.path.isdir(first.staging_folder) and os.path.isdir(second.staging_folder)
+    assert os.listdir(tmp_path) == []
+
+def test_only_stale_staging_folders_of_this_host_are_removed(tmp_path):
+    host = socket.gethostname()
+    names = {
+        "dead": f"{STAGING_PREFIX}{host}-{dead_pid()}-abc",
+        "alive": f"{STAGING_PREFIX}{host}-{os.getppid()}-abc",
+        "own": f"{STAGING_PREFIX}{host}-{os.getpid()}-abc",
+        # Another node's live run; its pid means nothing on this host
+        "other_host": f"{STAGING_PREFIX}other-node.example-{dead_pid()}-abc",
+        "unrecognized": f"{STAGING_PREFIX}something",
+    }
+    for name in names.values():
+        os.makedirs(tmp_path / name)
+    
+    remove_stale_staging(str(tmp_path))
+    
+    assert sorted(os.listdir(tmp_path)) == sorted(name for key, name in names.items() if key != "dead")
+
+def test_staged_outputs_are_published_in_batches(tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(output_writer.os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+    published = []
+    with OutputWriter(str(tmp_path), batch_size=2, on_publish=published.append) as writer:
+        first = staged_result(writer, "a.json", "A.json", b"a")
+        assert len(synced) == 1  # by the writer of the staged file, not on publish
+        assert writer.publish(first) == []
+        assert not (tmp_path / "A.json").exists()
+        
+        second = staged_result(writer, "b.json", "B.json", b"b")
+        synced.clear()
+        assert writer.publish(second) == [first, second]
+        # Publishing fsyncs the output folder once, never the staged files again
+        assert len(synced) == 1
+        assert published == [[first, second]]
+        assert first["staged"] is None and os.listdir(writer.staging_folder) == []
+        assert writer.publish(staged_result(writer, "c.json", "C.json", b"c")) == []
+    
+    assert sorted(os.listdir(tmp_path)) == ["A.json", "B.json", "C.json"]
+    assert (tmp_path / "B.json").read_bytes() == b"b"
+    assert writer.published_count == 3 and len(published) == 2
+
+def test_write_staged_skips_fsync_when_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(output_writer.os, "fsync", lambda fd: pytest.fail("fsync called"))
+    with OutputWriter(str(tmp_path), fsync=False) as writer:
+        writer.publish(staged_result(writer, "a.json", "A.json"))
+    assert os.listdir(tmp_path) == ["A.json"]
+
+def test_a_claimed_output_is_a_collision(tmp_path):
+    with OutputWriter(str(tmp_path), claims={"OLD.json": "old.json"}) as writer:
+        first = staged_result(writer, "a.json", "A.json", b"a")
+        second = staged_result(writer, "b.json", "A.json", b"b")
+        earlier = staged_result(writer, "c.json", "OLD.json", b"c")
+        for result in (first, second, earlier):
+            writer.publish(result)
+        
+        assert second["status"] == "collision" and second["entry"] is None
+        assert earlier["status"] == "collision"
+        # The losers' staged files are discarded at once
+        assert not os.path.exists(second["staged"]) and not os.path.exists(earlier["staged"])
+        assert writer.collisions == [("b.json", "A.json", "a.json"), ("c.json", "OLD.json", "old.json")]
+    
+    assert os.listdir(tmp_path) == ["A.json"]
+    assert (tmp_path / "A.json").read_bytes() == b"a"
+
+def test_a_crash_before_publishing_leaves_no_outputs(tmp_path):
+    crash = textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})
+        from output_writer import OutputWriter, write_staged
+        writer = OutputWriter({str(tmp_path)!r})
+        staged = os.path.join(writer.staging_folder, "a.json")
+        write_staged(staged, b"a")
+        writer.publish({{"filename": "a.json", "output": "A.json", "staged": staged}})
+        os._exit(1)
+    """)
+    assert subprocess.run([sys.executable, "-c", crash]).returncode == 1
+    
+    # Only the dead run's staging folder, holding its complete staged file, is left behind
+    (staging_folder,) = os.listdir(tmp_path)
+    assert staging_folder.startswith(STAGING_PREFIX)
+    assert (tmp_path / staging_folder / "a.json").read_bytes() == b"a"
+    
+    # and the next run clears it away
+    with OutputWriter(str(tmp_path)):
+        assert staging_folder not in os.listdir(tmp_path)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,94 @@
+import contextlib
+import io
+import json
+import os
+
+import benchmark
+import migrate_ccm
+from run_journal import read_journal
+
+def make_corpus(tmp_path, monkeypatch, count=10):
+    """A generated corpus plus one invalid file in tmp_path, made the working folder"""
+    monkeypatch.chdir(tmp_path)
+    benchmark.generate_corpus('.', count)
+    with open(os.path.join('Old CEIs', 'broken.json'), 'w', encoding='utf-8') as f:
+        f.write('{"cei_code": ')
+    os.makedirs('New CEIs')
+
+def migrate(**kwargs):
+    """Run migrate_ceis serially with a journal; returns what it printed"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        migrate_ccm.migrate_ceis(incremental=False, workers=1, io_threads=0, journal=True, **kwargs)
+    return output.getvalue()
+
+def summary(printed):
+    """The end-of-run summary lines of migrate_ceis output"""
+    return printed[printed.index("Migration complete!"):]
+
+def outputs():
+    return sorted(name for name in os.listdir('New CEIs') if name.endswith('.json'))
+
+def test_resume_after_a_crash_mid_line_counts_the_whole_run(tmp_path, monkeypatch):
+    make_corpus(tmp_path, monkeypatch)
+    full_summary = summary(migrate())
+    all_outputs = outputs()
+    with open(migrate_ccm.journal_file, 'r', encoding='utf-8') as f:
+        header, *records, complete = f.read().splitlines(keepends=True)
+    assert json.loads(complete) == {"complete": True}
+    
+    # Four files checkpointed, the fifth cut short by the crash
+    finished = [json.loads(record) for record in records[:4]]
+    with open(migrate_ccm.journal_file, 'w', encoding='utf-8') as f:
+        f.write(header + "".join(records[:4]) + records[4][:len(records[4]) // 2])
+    for name in all_outputs:
+        os.remove(os.path.join('New CEIs', name))
+    
+    printed = migrate(resume=True)
+    
+    assert "Resuming: 4 CEI file(s) were already finished" in printed
+    assert summary(printed) == full_summary
+    # Only the files the interrupted run had not finished were migrated again
+    assert outputs() == sorted(set(all_outputs) - {record["output"] for record in finished})
+    run, journaled, complete = read_journal(migrate_ccm.journal_file)
+    assert complete and sorted(journaled) == sorted(os.listdir('Old CEIs'))
+    assert journaled["broken.json"]["status"] == "invalid"
+
+def test_resume_rejects_a_journal_of_another_run(tmp_path, monkeypatch):
+    make_corpus(tmp_path, monkeypatch)
+    with open(migrate_ccm.journal_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"run": {"input_folder": "Other CEIs", "output_folder": "New CEIs",
+                                    "incremental": False, "cei_ids": None}}) + "\n")
+    with open(migrate_ccm.journal_file, 'rb') as f:
+        journal_bytes = f.read()
+    
+    printed = migrate(resume=True)
+    
+    assert f"Error: '{migrate_ccm.journal_file}' records a different run" in printed
+    assert "Migration complete!" not in printed
+    assert outputs() == []
+    with open(migrate_ccm.journal_file, 'rb') as f:
+        assert f.read() == journal_bytes
+
+def test_an_unexpected_error_fails_only_its_file(tmp_path, monkeypatch):
+    make_corpus(tmp_path, monkeypatch)
+    transform_stage = migrate_ccm.transform_stage
+    
+    def failing_transform_stage(job, context, incremental=False):
+        if job["result"]["filename"] == "CEI-3.json":
+            raise RuntimeError("disk on fire")
+        transform_stage(job, context, incremental)
+    monkeypatch.setattr(migrate_ccm, "transform_stage", failing_transform_stage)
+    
+    printed = migrate()
+    
+    assert "Failed: CEI-3.json: RuntimeError: disk on fire" in printed
+    assert f"Failed to migrate 1 CEI file(s); errors are recorded in '{migrate_ccm.journal_file}'." in printed
+    assert "Processed 9 CEI file(s)." in printed
+    assert len(outputs()) == 9
+    run, journaled, complete = read_journal(migrate_ccm.journal_file)
+    assert complete
+    assert journaled["CEI-3.json"] == {"source": "CEI-3.json", "output": None, "status": "failed",
+                                       "error": "RuntimeError: disk on fire"}
+    assert [record["status"] for name, record in sorted(journaled.items()) if name not in ("CEI-3.json", "broken.json")] \
+        == ["processed"] * 9
@@ -0,0 +1,91 @@
+import csv
+import os
+import shutil
+import subprocess
+import sys
+
+import benchmark
+from catalog import open_catalog
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARDS = 3
+
+def run(folder, script, *args):
+    """Run one of the repo's scripts in folder; returns its stdout"""
+    completed = subprocess.run([sys.executable, os.path.join(REPO, script), *args], cwd=folder,
+                               capture_output=True, text=True, check=True)
+    return completed.stdout
+
+def run_code(folder, code):
+    """Run Python code in folder with the repo importable"""
+    subprocess.run([sys.executable, "-c", code], cwd=folder, check=True, capture_output=True,
+                   env={**os.environ, "PYTHONPATH": REPO})
+
+def run_shards(folder, script, command):
+    """Run every shard of a command as concurrent processes in folder"""
+    processes = [subprocess.Popen([sys.executable, os.path.join(REPO, script), command, "--shard", f"{index}/{SHARDS}"],
+                                  cwd=folder, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+                 for index in range(SHARDS)]
+    for process in processes:
+        _, stderr = process.communicate()
+        assert process.returncode == 0, stderr
+
+def make_corpus(folder):
+    """Benchmark corpus with an invalid file and two CEIs sharing an assessment_id"""
+    benchmark.generate_corpus(folder, 30)
+    with open(os.path.join(folder, 'Old CEIs', 'broken.json'), 'w', encoding='utf-8') as f:
+        f.write('{"cei_code": ')
+    path = os.path.join(folder, 'cei_titles.csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    # CEI-10 and CEI-11 fall in different shards, so the merge has to resolve the collision
+    rows[11]["assessment_id"] = rows[10]["assessment_id"]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def summary(output):
+    """The end-of-run summary lines of a migration's output"""
+    lines = [line for line in output.splitlines() if line]
+    start = next(index for index, line in enumerate(lines) if line.startswith("Migration complete!"))
+    return lines[start:]
+
+def folder_contents(folder):
+    contents = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), 'rb') as f:
+            contents[name] = f.read()
+    return contents
+
+def test_sharded_migration_and_merge_match_a_single_node_run(tmp_path):
+    single, sharded = tmp_path / "single", tmp_path / "sharded"
+    make_corpus(str(single))
+    shutil.copytree(single, sharded)
+    for folder in (single, sharded):
+        os.makedirs(folder / "New CEIs")
+    
+    single_output = run(single, "migrate_ccm.py", "migrate", "--quiet")
+    run_shards(sharded, "migrate_ccm.py", "migrate")
+    merged_output = run(sharded, "migrate_ccm.py", "merge")
+    
+    assert summary(merged_output) == summary(single_output)
+    assert "Skipped 1 invalid file(s)." in summary(single_output)
+    assert "Skipped 1 CEI file(s) whose output filename another CEI already produces." in summary(single_output)
+    assert folder_contents(sharded / "New CEIs") == folder_contents(single / "New CEIs")
+    with open_catalog(str(single / "cei_catalog.sqlite")) as expected, \
+            open_catalog(str(sharded / "cei_catalog.sqlite")) as merged:
+        assert list(merged.entries()) == list(expected.entries())
+
+def test_sharded_scan_and_merge_match_a_single_node_scan(tmp_path):
+    single, sharded = tmp_path / "single", tmp_path / "sharded"
+    make_corpus(str(single))
+    shutil.copytree(single, sharded)
+    
+    run_code(single, "import generate_csvs; generate_csvs.generate_all()")
+    run_shards(sharded, "generate_csvs.py", "scan")
+    run(sharded, "generate_csvs.py", "merge")
+    
+    for name in ("detected_frameworks.csv", "cei_titles.csv"):
+        with open(single / name, 'rb') as expected, open(sharded / name, 'rb') as merged:
+            assert merged.read() == expected.read()
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+import sql_rewriter
+from sql_rewriter import ScopeQueryRewriter, extract_case_condition, tokenize
+
+OLD_TABLE = "<%EI_PUBLISH_SCHEMA_NAME%>.sds_ei__publish_transformer__entity_inventory"
+NEW_TABLE = "<%EI_SCHEMA_NAME%>.sds_ei__{entity}__enrich"
+
+@pytest.mark.parametrize("sql", [
+    "select 'it''s', \"a\"\"b\", `c``d` -- note\nfrom t /* x */",
+    "where n='O\\'Brien' and m=\"say \\\"hi\\\"\"",
+    "'unterminated",
+])
+def test_tokens_join_back_to_the_input(sql):
+    assert "".join(text for _, text, _ in tokenize(sql)) == sql
+
+def test_backslash_escaped_quote_stays_inside_the_string():
+    kinds = [(kind, text) for kind, text, _ in tokenize("n='O\\'Brien' THEN")]
+    assert ("string", "'O\\'Brien'") in kinds
+    assert ("word", "THEN") in kinds
+
+@pytest.mark.parametrize("cei_condition, expected", [
+    ("CASE WHEN a=1 THEN true ELSE false END", "a=1"),
+    ("case when a=1 then TRUE end", "a=1"),
+    ("  CASE WHEN a=1 THEN true ELSE false END  ", "a=1"),
+    ("CASE WHEN a=1 THEN 'true' ELSE 'false' END", "a=1"),
+    ("CASE WHEN a=1 THEN 1 ELSE 0 END", "a=1"),
+    ("CASE WHEN a=1 THEN true ELSE FALSE END;", "a=1"),
+    ("CASE WHEN a=1 THEN true ELSE NULL END", "a=1"),
+    # Nested CASE inside the condition
+    ("CASE WHEN (CASE WHEN b THEN 1 ELSE 2 END) = 1 THEN true ELSE false END",
+     "(CASE WHEN b THEN 1 ELSE 2 END) = 1"),
+    # THEN inside string literals, with either kind of quote escape
+    ("CASE WHEN name = 'WHEN x THEN y' THEN true ELSE false END", "name = 'WHEN x THEN y'"),
+    ("CASE WHEN n='O\\'Brien' THEN true ELSE false END", "n='O\\'Brien'"),
+    ("CASE WHEN n='it''s THEN' THEN true END", "n='it''s THEN'"),
+])
+def test_extract_case_condition(cei_condition, expected):
+    assert extract_case_condition(cei_condition) == expected
+
+@pytest.mark.parametrize("cei_condition", [
+    "a = 1 AND b = 2",
+    "CASE WHEN a=1 THEN 'x' ELSE 'y' END",
+    "CASE WHEN a=1 THEN true WHEN b=1 THEN true ELSE false END",
+    "CASE WHEN a=1 THEN false ELSE true END",
+    "CASE WHEN a=1 THEN true ELSE false END + 1",
+])
+def test_other_conditions_are_returned_unchanged(cei_condition):
+    assert extract_case_condition(cei_condition) == cei_condition
+
+def test_scope_query_rewrites_every_table_reference():
+    rewriter = ScopeQueryRewriter(OLD_TABLE, NEW_TABLE)
+    query = f"select * from {OLD_TABLE} where n='it\\'s' union select * from {OLD_TABLE}"
+    expected = query.replace(OLD_TABLE, NEW_TABLE.format(entity="host"))
+    assert rewriter.rewrite(query, ("Host",)) == expected
+
+def test_scope_query_ignores_table_inside_literals_and_comments():
+    rewriter = ScopeQueryRewriter(OLD_TABLE, NEW_TABLE)
+    query = f"select '{OLD_TABLE}' -- {OLD_TABLE}\nfrom {OLD_TABLE}"
+    assert rewriter.rewrite(query, ("host",)) == \
+        f"select '{OLD_TABLE}' -- {OLD_TABLE}\nfrom {NEW_TABLE.format(entity='host')}"
+
+def test_scope_query_multi_entity_and_placeholders():
+    rewriter = ScopeQueryRewriter(OLD_TABLE, NEW_TABLE, "<%EI_SCHEMA_NAME%>.sds_ei__{entities}__enrich",
+                                  {"<%OLD%>": "<%NEW%>"})
+    assert rewriter.rewrite(f"select <%OLD%> from {OLD_TABLE}", ("Host", "Person")) == \
+        "select <%NEW%> from <%EI_SCHEMA_NAME%>.sds_ei__host__person__enrich"
+    assert ScopeQueryRewriter(OLD_TABLE, NEW_TABLE).rewrite(OLD_TABLE, ("a", "b")) == OLD_TABLE
+
+FUZZ_PIECES = ["CASE", "case", "WHEN", "when", "THEN", "then", "ELSE", "END", "end", "TRUE", "true", "FALSE", "NULL",
+               "1", "0", "1.5", "a", "x1", "1a", "_b", "$", "a$then", "SPEND", "=", "(", ")", ";", ".", ",",
+               "'x'", "'THEN'", "'it''s'", "'", "''", "'true'", "\"q\"", "`c`", "\\'", "--c\n", "/*c*/",
+               "<%P%>", "<%", "%>", " ", "  ", "\n", "\t", "\x1f", "é", "ſ",
+               OLD_TABLE, OLD_TABLE.lower(), OLD_TABLE + "x", "<%EI_PUBLISH_SCHEMA_NAME%>", "sds_ei__publish_transformer__entity_inventory"]
+
+def random_sql(rng, prefix=()):
+    pieces = list(prefix) + [rng.choice(FUZZ_PIECES) for _ in range(rng.randint(0, 12))]
+    separators = [rng.choice(["", " ", " ", "\n"]) for _ in pieces]
+    return "".join(piece + separator for piece, separator in zip(pieces, separators))
+
+def test_fast_paths_agree_with_the_tokenizer():
+    rng = random.Random(0)
+    rewriter = ScopeQueryRewriter(OLD_TABLE, NEW_TABLE)
+    reference = ScopeQueryRewriter(OLD_TABLE, NEW_TABLE)
+    reference._table_text = None  # always through the tokenizer
+    fast_conditions = fast_queries = 0
+    for _ in range(100000):
+        condition = random_sql(rng, rng.choice([(), ("CASE", "WHEN"), ("CASE WHEN a = 'x' AND",)])).strip()
+        suffix = rng.choice(["", " THEN true ELSE false END", " THEN 1 END;", " THEN true ELSE NULL END ;"])
+        condition = (condition + suffix).strip()
+        fast = sql_rewriter._fast_case_condition(condition)
+        if fast is not None:
+            fast_conditions += 1
+            assert fast == sql_rewriter._extract_case_condition_tokens(condition), condition
+        
+        query = random_sql(rng, rng.choice([(), ("SELECT * FROM", OLD_TABLE)]))
+        fast = rewriter._fast_rewrite(query, NEW_TABLE.format(entity="host"))
+        if fast is not None:
+            fast_queries += 1
+            assert fast == reference._rewrite(query, ("Host",)), query
+    # Both fast paths must actually be exercised
+    assert fast_conditions > 10000 and fast_queries > 10000
@@ -0,0 +1,19 @@
+import contextlib
+import io
+import os
+
+import benchmark
+import migrate_ccm
+
+def test_targeted_run_ignores_an_undecodable_neighbour_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    benchmark.generate_corpus('.', 10)
+    with open(os.path.join('Old CEIs', 'bad.json'), 'wb') as f:
+        f.write(b'{"cei_code": "\xff"}')
+    
+    os.makedirs('New CEIs')
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate_ccm.migrate_ceis(['CEI-5'], incremental=False)
+    
+    assert [name for name in os.listdir('New CEIs') if name.endswith('.json')] == ['TP_BM_0000005.json']
+    assert migrate_ccm.load_cei_index()["files"]["bad.json"][2] is None